@@ -1,10 +1,60 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
 import numpy as np
+import importlib
+import os
+import re
+import json
+import hashlib
+import zipfile
+import warnings
+import time
+import io
+import contextlib
+import traceback
+import threading
+import weakref
+import tempfile
+from dataclasses import dataclass, field
+import difflib
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Mapping
+import xml.etree.ElementTree as ET
 
-print('[][*][][*][][*][][*][]][*][][*][][*][][*][][*][][*]')
-print('PubPy - Tracking your "progress" better than your administrators are.')
+
+class LazyModule:
+    '''
+    Stand-in for a module that is imported only when one of its attributes is first used. pandas, matplotlib 
+    and pyplot take far longer to import than everything else in PubPy together. Compute-only callers (the 
+    h-index kernels from an API worker or a CLI) never draw anything, and the excel reader is only needed by 
+    the loading functions, so none of them are imported with PubPy.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
+
+    def __repr__(self):
+        return '<lazy module '+repr(self.name)+(' (loaded)>' if self.module else ' (not loaded)>')
+
+pd = LazyModule('pandas')
+matplotlib = LazyModule('matplotlib')
+plt = LazyModule('matplotlib.pyplot')
+
+def banner():
+    '''
+    Prints the PubPy banner. It is no longer printed on import; set the environment variable PUBPY_BANNER=1 
+    (or true or yes) to print it on import anyway.
+    '''
+    print('[][*][][*][][*][][*][]][*][][*][][*][][*][][*][][*]')
+    print('PubPy - Tracking your "progress" better than your administrators are.')
+
+if os.environ.get('PUBPY_BANNER', '').strip().lower() in ['1', 'true', 'yes']:
+    banner()
 
 #Font dictionaries to set up different output styles 
 axis_label_dict = {
@@ -27,132 +77,2237 @@ def debug(*args):
     if DEBUG == True:
         print(args)
 
+#Instrumentation: named timing spans and counters, sent to pluggable sinks. With no sink registered, span()
+#returns a shared do-nothing context manager and count() returns at once, so instrumented code runs at full
+#speed. A sink is any callable that takes one event dictionary:
+#   {'type':'span', 'name':..., 'path':'outer/inner', 'seconds':..., 'start':..., 'thread':..., 'error':..., **fields}
+#   {'type':'counter', 'name':..., 'path':..., 'value':..., 'thread':..., **fields}
+sinks = []
+null_span = contextlib.nullcontext()
+span_stack = threading.local()
+
+def add_sink(sink):
+    '''
+    Starts sending instrumentation events to sink. Returns the sink.
+    '''
+    sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    if sink in sinks:
+        sinks.remove(sink)
+
+@contextlib.contextmanager
+def instrument(*new_sinks):
+    '''
+    Sends instrumentation events to the given sinks inside a with block, e.g.
+        with PubPy.instrument(PubPy.MemorySink()) as (memory,):
+            PubPy.Hirsch_panels_auto(pubs_dict)
+        print(memory.summary())
+    '''
+    for sink in new_sinks:
+        add_sink(sink)
+    try:
+        yield new_sinks
+    finally:
+        for sink in new_sinks:
+            remove_sink(sink)
+
+def emit(event):
+    for sink in list(sinks):
+        sink(event)
+
+class Span:
+    '''
+    Times a with block and sends a span event when it ends, also when it ends with an exception.
+    '''
+    __slots__ = ('name', 'fields', 'start', 'path')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        stack = span_stack.__dict__.setdefault('names', [])
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, trace):
+        seconds = time.perf_counter() - self.start
+        span_stack.names.pop()
+        emit({'type':'span', 'name':self.name, 'path':self.path, 'seconds':seconds, 'start':self.start,
+              'thread':threading.current_thread().name, 'error':kind.__name__ if kind else None} | self.fields)
+        return False
+
+def span(name, **fields):
+    '''
+    Context manager that times a named stage, e.g. with span('read_excel', file=file): ... Extra keyword fields
+    are added to the event.
+    '''
+    if not sinks:
+        return null_span
+    return Span(name, fields)
+
+def count(name, value=1, **fields):
+    '''
+    Adds value to a named counter, e.g. rows processed or figures rendered.
+    '''
+    if not sinks:
+        return
+    stack = getattr(span_stack, 'names', [])
+    emit({'type':'counter', 'name':name, 'path':'/'.join(stack + [name]), 'value':value,
+          'thread':threading.current_thread().name} | fields)
+
+class MemorySink:
+    '''
+    Aggregates events in memory: number of calls, total, mean, min and max seconds of every span path, and the
+    total of every counter. Thread-safe.
+    '''
+    def __init__(self, keep_events=False):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.events = [] if keep_events else None
+
+    def __call__(self, event):
+        with self.lock:
+            if self.events is not None:
+                self.events.append(event)
+            if event['type'] == 'span':
+                stats = self.spans.setdefault(event['path'], [0, 0.0, np.inf, 0.0])
+                stats[0] += 1
+                stats[1] += event['seconds']
+                stats[2] = min(stats[2], event['seconds'])
+                stats[3] = max(stats[3], event['seconds'])
+            elif event['type'] == 'counter':
+                self.counters[event['name']] = self.counters.get(event['name'], 0) + event['value']
+
+    def summary(self):
+        '''
+        Returns the span statistics as a DataFrame, slowest total first.
+        '''
+        with self.lock:
+            rows = [{'path':path, 'calls':calls, 'total_s':total, 'mean_s':total/calls, 'min_s':low, 'max_s':high}
+                    for path, (calls, total, low, high) in self.spans.items()]
+        return pd.DataFrame(rows, columns=['path', 'calls', 'total_s', 'mean_s', 'min_s', 'max_s']).sort_values('total_s', ascending=False, ignore_index=True)
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+            self.counters.clear()
+            if self.events is not None:
+                self.events.clear()
+
+class JSONLinesSink:
+    '''
+    Appends every event to a file as one json object per line, e.g. for a nightly batch to be compared later.
+    '''
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.Lock()
+        self.handle = open(file, 'a')
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.handle.write(line+'\n')
+            self.handle.flush()
+
+    def close(self):
+        self.handle.close()
+
+class LoggingSink:
+    '''
+    Sends events to a logging logger ('PubPy' by default), spans at the given level and counters at DEBUG.
+    '''
+    def __init__(self, logger='PubPy', level=20):
+        import logging
+
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+        self.debug_level = logging.DEBUG
+
+    def __call__(self, event):
+        if event['type'] == 'span':
+            self.logger.log(self.level, '%s took %.4f s', event['path'], event['seconds'], extra={'pubpy_event':event})
+        else:
+            self.logger.log(self.debug_level, '%s += %s', event['path'], event['value'], extra={'pubpy_event':event})
+
+
+@dataclass
+class RenderConfig:
+    '''
+    Settings of one rendering call, for the object-oriented rendering functions (Hirsch_panels_figure and
+    time_series_figure). Each call gets its own copy of the fonts and its own debug switch instead of the module
+    level dictionaries and DEBUG flag, so figures rendered at the same time in different threads do not 
+    interfere with each other.
+
+    Attributes:
+        color_map (string): colormap of the Hirsch plots.
+        width, height (floats): figure size in inches.
+        dpi (integer): figure resolution.
+        debug (boolean): print debug messages of this call.
+        axis_label, date_annotation, h_index_annotation (dictionaries): font dictionaries, copies of 
+            axis_label_dict, date_annotation_dict and h_index_annotation_dict by default.
+        max_bubbles (integer): level of detail of the Hirsch plots, see plot_Hirsch; None draws every paper.
+    '''
+    color_map: str = 'plasma'
+    width: float = 6
+    height: float = 6
+    dpi: int = 100
+    debug: bool = False
+    axis_label: dict = field(default_factory=lambda: dict(axis_label_dict))
+    date_annotation: dict = field(default_factory=lambda: dict(date_annotation_dict))
+    h_index_annotation: dict = field(default_factory=lambda: dict(h_index_annotation_dict))
+    max_bubbles: int = None
+
+    def log(self, *args):
+        if self.debug:
+            print(args)
+
+def new_figure(config=None):
+    '''
+    Creates a matplotlib Figure with its own Agg canvas, without going through pyplot. The figure is not 
+    registered with pyplot, so it needs no closing and is freed as soon as it is no longer referenced.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    config = config or RenderConfig()
+    fig = Figure(figsize=(config.width, config.height), dpi=config.dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+def figure_bytes(fig, format='png', dpi=None):
+    '''
+    Encodes a figure as an image and returns the bytes of the file, e.g. to send from a web service.
+    '''
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format, dpi=dpi)
+    return buffer.getvalue()
+
+
+#Namespaces used to find the worksheets inside an .xlsx workbook
+xlsx_namespaces = {
+    'main':'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel':'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'pkg':'http://schemas.openxmlformats.org/package/2006/relationships'
+}
+
+def workbook_sheet_fingerprints(file):
+    '''
+    Computes a content hash for every sheet of an .xlsx workbook without parsing it into DataFrames. The workbook
+    is a zip archive, so each hash is taken over the cell references and values of the sheet, with shared strings
+    replaced by their text. Editing one tab therefore changes only the hash of that tab, while clicking around or 
+    resizing columns in Excel changes none of them.
+
+    Inputs:
+        file (string): file name (including directory) of the excel workbook.
+    Outputs:
+        fingerprints (dictionary or None): keys are sheet names in workbook order and values are hex digests. None
+            is returned if the file is not a zipped workbook (e.g. an old .xls file), in which case the caller
+            has to fall back to hashing the whole file.
+    '''
+    if not zipfile.is_zipfile(file):
+        return None
+    with zipfile.ZipFile(file) as archive:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'):rel.get('Target') for rel in rels.findall('pkg:Relationship', xlsx_namespaces)}
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            shared_strings = re.findall(rb'<si>.*?</si>', archive.read('xl/sharedStrings.xml'), flags=re.DOTALL)
+        else:
+            shared_strings = []
+
+        fingerprints = {}
+        for sheet in workbook.findall('main:sheets/main:sheet', xlsx_namespaces):
+            target = targets[sheet.get('{'+xlsx_namespaces['rel']+'}id')]
+            target = target.lstrip('/') if target.startswith('/') else 'xl/'+target
+            sheet_xml = archive.read(target)
+            #Only the cell values matter for the DataFrame, not styles or view settings, and shared strings are
+            #hashed by content because their indices shift whenever a string is added anywhere in the workbook.
+            digest = hashlib.sha1()
+            for ref, attributes, content in re.findall(rb'<c r="(\w+)"([^>]*?)(?:/>|>(.*?)</c>)', sheet_xml, flags=re.DOTALL):
+                value = re.search(rb'<v>(.*?)</v>', content, flags=re.DOTALL)
+                value = value.group(1) if value else content
+                if b't="s"' in attributes:
+                    value = shared_strings[int(value)]
+                digest.update(ref + b'\x00' + value + b'\x01')
+            fingerprints[sheet.get('name')] = digest.hexdigest()
+
+    return fingerprints
+
+def workbook_sheet_names(file):
+    '''
+    Lists the sheet names of a workbook in order from the workbook metadata, without loading any sheet.
+
+    Inputs:
+        file (string): file name (including directory) of the excel workbook.
+    Outputs:
+        sheet_names (list of strings): the names of the tabs, i.e. the snapshot date codes.
+    '''
+    if zipfile.is_zipfile(file):
+        with zipfile.ZipFile(file) as archive:
+            workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        return [sheet.get('name') for sheet in workbook.findall('main:sheets/main:sheet', xlsx_namespaces)]
+    with pd.ExcelFile(file) as excel_file:
+        return list(excel_file.sheet_names)
+
+def file_fingerprint(file):
+    '''
+    Hashes the full contents of a file in blocks. Used as the cache key of every sheet when a workbook cannot be
+    fingerprinted sheet by sheet.
+    '''
+    digest = hashlib.sha1()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_format():
+    '''
+    Returns 'parquet' if a parquet engine (pyarrow or fastparquet) is installed and 'npz' otherwise.
+    '''
+    for engine in ['pyarrow', 'fastparquet']:
+        try:
+            __import__(engine)
+            return 'parquet'
+        except ImportError:
+            pass
+    return 'npz'
+
+def save_cached_sheet(df, path):
+    '''
+    Writes one snapshot DataFrame to a columnar file. Parquet is used if the path ends in .parquet, otherwise
+    each column is stored as its own numpy array in an .npz file. Text columns are stored as fixed-width unicode
+    arrays together with a mask of missing values, so no pickling is needed to read them back.
+    '''
+    if path.endswith('.parquet'):
+        df.to_parquet(path)
+        return
+    arrays = {}
+    meta = {'columns':[], 'dtypes':[]}
+    for j, column in enumerate(df.columns):
+        series = df[column]
+        meta['columns'].append(str(column))
+        meta['dtypes'].append(str(series.dtype))
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            arrays['col'+str(j)] = series.to_numpy()
+        else:
+            missing = series.isna().to_numpy()
+            arrays['col'+str(j)] = np.where(missing, '', series.astype(object).to_numpy()).astype(str)
+            arrays['mask'+str(j)] = missing
+    arrays['meta'] = np.array(json.dumps(meta))
+    np.savez(path, **arrays)
+
+def load_cached_sheet(path):
+    '''
+    Reads one snapshot DataFrame written by save_cached_sheet.
+    '''
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+        columns = {}
+        for j, (column, dtype) in enumerate(zip(meta['columns'], meta['dtypes'])):
+            values = arrays['col'+str(j)]
+            if 'mask'+str(j) in arrays:
+                values = values.astype(object)
+                values[arrays['mask'+str(j)]] = np.nan
+                columns[column] = pd.Series(values, dtype=object).astype(dtype)
+            else:
+                columns[column] = pd.Series(values, dtype=dtype)
+    return pd.DataFrame(columns)
+
+def load_sheets_with_cache(file, cache_dir):
+    '''
+    Loads every sheet of a workbook through an on-disk cache of columnar files. The cache of each workbook lives
+    in its own folder of cache_dir (named from the absolute path of the workbook) with a manifest that records 
+    the modification time and size of the workbook and a content hash of each sheet. 
+    
+    If the workbook has not been modified since the last load, all sheets are read from the cache without 
+    opening the workbook. Otherwise each sheet is hashed, and only sheets that are new or whose content hash
+    changed are parsed from Excel and written back to the cache.
+
+    Inputs:
+        file (string): file name (including directory) of the excel workbook.
+        cache_dir (string): directory in which the cache is stored. It is created if it does not exist.
+    Outputs:
+        pubs_dict (dictionary of dataframes): same as pd.read_excel(file, sheet_name=None).
+    '''
+    workbook_path = os.path.abspath(file)
+    folder = os.path.join(cache_dir, hashlib.sha1(workbook_path.encode()).hexdigest()[:16])
+    manifest_file = os.path.join(folder, 'manifest.json')
+    os.makedirs(folder, exist_ok=True)
+    stat = os.stat(workbook_path)
+
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    cached_sheets = manifest.get('sheets', {})
+
+    #Fast path: workbook untouched since the cache was written.
+    if (manifest.get('mtime') == stat.st_mtime) and (manifest.get('size') == stat.st_size):
+        debug('Loading all sheets of ', workbook_path, ' from cache ', folder)
+        with span('read_cached_sheets'):
+            return {name:load_cached_sheet(os.path.join(folder, cached_sheets[name]['file'])) for name in manifest['order']}
+
+    with span('fingerprint_sheets'):
+        fingerprints = workbook_sheet_fingerprints(workbook_path)
+    if fingerprints is None:
+        whole_file = file_fingerprint(workbook_path)
+        sheet_names = manifest.get('order') if manifest.get('file_hash') == whole_file else None
+        if sheet_names is None:
+            sheet_names = list(pd.ExcelFile(workbook_path).sheet_names)
+        fingerprints = {name:whole_file for name in sheet_names}
+        manifest['file_hash'] = whole_file
+
+    extension = '.parquet' if cache_format() == 'parquet' else '.npz'
+    stale = [name for name, digest in fingerprints.items()
+             if (name not in cached_sheets) or (cached_sheets[name]['hash'] != digest)
+             or not os.path.exists(os.path.join(folder, cached_sheets[name]['file']))]
+    debug('Sheets to (re)load from Excel: ', stale)
+    with span('read_excel', sheets=len(stale)):
+        fresh = pd.read_excel(workbook_path, sheet_name=stale) if stale else {}
+    count('sheets_parsed', len(stale))
+
+    pubs_dict = {}
+    new_sheets = {}
+    for name, digest in fingerprints.items():
+        if name in fresh:
+            sheet_file = hashlib.sha1(name.encode()).hexdigest()[:16]+extension
+            old = cached_sheets.get(name)
+            if old and (old['file'] != sheet_file) and os.path.exists(os.path.join(folder, old['file'])):
+                os.remove(os.path.join(folder, old['file']))
+            save_cached_sheet(fresh[name], os.path.join(folder, sheet_file))
+            pubs_dict[name] = fresh[name]
+        else:
+            sheet_file = cached_sheets[name]['file']
+            pubs_dict[name] = load_cached_sheet(os.path.join(folder, sheet_file))
+        new_sheets[name] = {'hash':digest, 'file':sheet_file}
+
+    #Remove cached sheets for tabs that were deleted from the workbook.
+    for name, entry in cached_sheets.items():
+        if (name not in new_sheets) and os.path.exists(os.path.join(folder, entry['file'])):
+            os.remove(os.path.join(folder, entry['file']))
+
+    manifest |= {'workbook':workbook_path, 'mtime':stat.st_mtime, 'size':stat.st_size,
+                 'order':list(fingerprints.keys()), 'sheets':new_sheets}
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    return pubs_dict
+
+class LazyPubsDict(Mapping):
+    '''
+    Read-only dictionary of snapshot DataFrames that parses a sheet of the workbook only when its key is first
+    accessed. It can be passed to every function that takes a pubs_dict. The keys are available straight away
+    from the workbook metadata, so listing snapshots, checking membership, and picking a few panels do not
+    load the rest of the workbook's history.
+
+    Inputs:
+        file (string): file name (including directory) of the excel workbook.
+        max_sheets (integer, default None): if given, at most this many parsed sheets are kept in memory. The
+            least recently used sheet is dropped when another one is parsed, and parsed again if it is needed
+            later. With None, every sheet stays in memory once it has been parsed.
+    '''
+
+    def __init__(self, file, max_sheets=None):
+        self.file = file
+        self.max_sheets = max_sheets
+        self.sheet_names = workbook_sheet_names(file)
+        self.sheets = OrderedDict()
+        self.excel_file = None
+        self.loads = 0
+
+    def __getitem__(self, key):
+        if key in self.sheets:
+            self.sheets.move_to_end(key)
+            return self.sheets[key]
+        if key not in self.sheet_names:
+            raise KeyError(key)
+        #Keep the workbook open between sheets, so it is only opened once however many sheets are used.
+        if self.excel_file is None:
+            self.excel_file = pd.ExcelFile(self.file)
+        debug('Parsing sheet ', key, ' of ', self.file)
+        sheet = self.excel_file.parse(sheet_name=key)
+        self.loads += 1
+        self.sheets[key] = sheet
+        if self.max_sheets is not None:
+            while len(self.sheets) > max(self.max_sheets, 1):
+                self.sheets.popitem(last=False)
+        return sheet
+
+    def __iter__(self):
+        return iter(self.sheet_names)
+
+    def __len__(self):
+        return len(self.sheet_names)
+
+    def __contains__(self, key):
+        return key in self.sheet_names
+
+    def __repr__(self):
+        return 'LazyPubsDict('+repr(self.file)+', loaded='+repr(list(self.sheets.keys()))+')'
+
+    def close(self):
+        '''
+        Closes the workbook and drops every parsed sheet.
+        '''
+        if self.excel_file is not None:
+            self.excel_file.close()
+            self.excel_file = None
+        self.sheets.clear()
+
+
+class SnapshotStore(Mapping):
+    '''
+    Append-only store of an author's snapshots that keeps each publication once instead of once per tab. The
+    store is a folder with a manifest and one columnar file (npz or parquet, see cache_format) per snapshot. 
+    Most snapshots are deltas that hold only what changed since the previous snapshot: new citation counts, 
+    new papers, edited papers, and removed papers. Every checkpoint_every-th snapshot (and any snapshot that 
+    differs in more than half of its rows) is a checkpoint that holds the full table, so rebuilding a snapshot
+    replays at most checkpoint_every-1 deltas.
+
+    Papers are matched between snapshots on their normalized title and year (see normalize_title). The store 
+    is a read-only dictionary of snapshot DataFrames, rebuilt on demand, and can be passed to every function 
+    that takes a pubs_dict. Rebuilt sheets are sorted on citations, like the workbook tabs.
+
+    Inputs:
+        folder (string): folder of the store. It is created if it does not exist.
+        checkpoint_every (integer, default 12): snapshots between checkpoints of a new store.
+        max_sheets (integer, default 8): rebuilt snapshots kept in memory.
+    '''
+
+    def __init__(self, folder, checkpoint_every=12, max_sheets=8):
+        self.folder = folder
+        self.manifest_file = os.path.join(folder, 'manifest.json')
+        self.max_sheets = max_sheets
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as f:
+                self.manifest = json.load(f)
+        else:
+            os.makedirs(folder, exist_ok=True)
+            self.manifest = {'version':1, 'checkpoint_every':checkpoint_every, 'format':cache_format(), 'next_paper':0, 'snapshots':[]}
+        self.entries = {entry['snapshot']:j for j, entry in enumerate(self.manifest['snapshots'])}
+        self.states = OrderedDict()   #Recently rebuilt snapshots, indexed by paper id
+        self.loads = 0
+
+    @staticmethod
+    def paper_keys(data):
+        '''
+        Matching key of each row: normalized title, year, and a running count so duplicate titles stay apart.
+        '''
+        keys = data['Title'].map(normalize_title) + '|' + data['Year'].astype(str)
+        return keys + '|' + keys.groupby(keys).cumcount().astype(str)
+
+    def _state(self, key):
+        j = self.entries[key]
+        if key in self.states:
+            self.states.move_to_end(key)
+            return self.states[key]
+        entries = self.manifest['snapshots']
+        start = max(k for k in range(j+1) if entries[k]['kind'] == 'checkpoint')
+        #Replay from the latest snapshot already in memory, if there is one after the checkpoint.
+        cached = [k for k in range(start, j) if entries[k]['snapshot'] in self.states]
+        if cached:
+            start = cached[-1]
+            state = self.states[entries[start]['snapshot']]
+        else:
+            state = load_cached_sheet(os.path.join(self.folder, entries[start]['file'])).set_index('Paper')
+            self.loads += 1
+        for entry in entries[start+1:j+1]:
+            state = self.apply_delta(state, load_cached_sheet(os.path.join(self.folder, entry['file'])), entry['columns'])
+            self.loads += 1
+        self.states[key] = state
+        while len(self.states) > max(self.max_sheets, 1):
+            self.states.popitem(last=False)
+        return state
+
+    @staticmethod
+    def apply_delta(state, delta, columns):
+        change = delta['Change'].to_numpy()
+        state = state.drop(index=delta.loc[change == 'removed', 'Paper'])
+        state = state.reindex(columns=columns)
+        cited = delta[change == 'citations']
+        state.loc[cited['Paper'].to_numpy(), 'Citations'] = cited['Citations'].to_numpy()
+        updated = delta[change == 'updated'].set_index('Paper')[columns]
+        state.loc[updated.index, columns] = updated
+        added = delta[change == 'new'].set_index('Paper')[columns]
+        return pd.concat([state, added]) if len(added) else state
+
+    def __getitem__(self, key):
+        if key not in self.entries:
+            raise KeyError(key)
+        entry = self.manifest['snapshots'][self.entries[key]]
+        state = self._state(key)
+        sheet = state[entry['columns']].sort_values('Citations', ascending=False, kind='stable', ignore_index=True)
+        return sheet.astype(dict(zip(entry['columns'], entry['dtypes'])))
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __repr__(self):
+        kinds = [entry['kind'] for entry in self.manifest['snapshots']]
+        return 'SnapshotStore('+repr(self.folder)+', '+str(len(kinds))+' snapshots, '+str(kinds.count('checkpoint'))+' checkpoints)'
+
+    def append(self, snapshot, data):
+        '''
+        Adds a snapshot after the last one, writing only its differences from the previous snapshot (or a 
+        checkpoint, see above). Snapshots are date codes, YYYYMMDD, and must be added in date order.
+        '''
+        entries = self.manifest['snapshots']
+        if entries and snapshot <= entries[-1]['snapshot']:
+            raise ValueError('Snapshots are append-only: '+snapshot+' is not after '+entries[-1]['snapshot'])
+        data = data.reset_index(drop=True)
+        columns = [str(column) for column in data.columns]
+        keys = self.paper_keys(data)
+
+        since_checkpoint = next((j for j, entry in enumerate(reversed(entries)) if entry['kind'] == 'checkpoint'), None)
+        if since_checkpoint is None or since_checkpoint + 1 >= self.manifest['checkpoint_every']:
+            delta = None
+        else:
+            previous = self._state(entries[-1]['snapshot'])
+            paper_ids = pd.Series(previous.index, index=self.paper_keys(previous).to_numpy())
+            matched = keys.map(paper_ids)
+            new = matched.isna().to_numpy()
+            ids = matched.to_numpy(dtype=np.float64, copy=True)
+            ids[new] = self.manifest['next_paper'] + np.arange(new.sum())
+            ids = ids.astype(np.int64)
+
+            old = previous.reindex(index=ids[~new], columns=columns).reset_index(drop=True)
+            current = data.loc[~new].reset_index(drop=True)
+            differs = pd.DataFrame({column:(old[column] != current[column]) & ~(old[column].isna() & current[column].isna())
+                                    for column in columns})
+            other = [column for column in columns if column != 'Citations']
+            edited = differs[other].any(axis=1).to_numpy() if other else np.zeros(len(current), dtype=bool)
+            cited = differs['Citations'].to_numpy() & ~edited
+            removed = np.setdiff1d(previous.index.to_numpy(), ids[~new])
+            delta = pd.concat([
+                data.loc[new].assign(Paper=ids[new], Change='new'),
+                current.loc[edited].assign(Paper=ids[~new][edited], Change='updated'),
+                current.loc[cited, ['Citations']].assign(Paper=ids[~new][cited], Change='citations'),
+                pd.DataFrame({'Paper':removed, 'Change':'removed'})
+            ], ignore_index=True)
+            if len(delta) > len(data)/2:
+                delta = None   #A full table is about as small, and rebuilds faster
+        if delta is None:
+            kind = 'checkpoint'
+            matched = None
+            if entries:
+                previous = self._state(entries[-1]['snapshot'])
+                matched = keys.map(pd.Series(previous.index, index=self.paper_keys(previous).to_numpy()))
+            ids = matched.to_numpy(dtype=np.float64, copy=True) if matched is not None else np.full(len(data), np.nan)
+            new = np.isnan(ids)
+            ids[new] = self.manifest['next_paper'] + np.arange(new.sum())
+            ids = ids.astype(np.int64)
+            table = data.assign(Paper=ids)
+        else:
+            kind = 'delta'
+            table = delta[['Paper', 'Change'] + columns]
+
+        file = 'snapshot_'+snapshot+('.parquet' if self.manifest['format'] == 'parquet' else '.npz')
+        save_cached_sheet(table, os.path.join(self.folder, file))
+        entries.append({'snapshot':snapshot, 'kind':kind, 'file':file, 'columns':columns,
+                        'dtypes':[str(dtype) for dtype in data.dtypes], 'rows':len(data), 'stored_rows':len(table)})
+        self.manifest['next_paper'] += int(new.sum())
+        temporary = self.manifest_file+'.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(temporary, self.manifest_file)   #The snapshot only exists once the manifest says so
+        self.entries[snapshot] = len(entries) - 1
+        state = data.set_index(pd.Index(ids, name='Paper'))
+        self.states[snapshot] = state
+        while len(self.states) > max(self.max_sheets, 1):
+            self.states.popitem(last=False)
+        debug('Stored snapshot', snapshot, 'as', kind, 'with', len(table), 'of', len(data), 'rows')
+
+    @classmethod
+    def from_workbook(cls, file, folder, checkpoint_every=12, log=debug):
+        '''
+        Converts a workbook with one tab per snapshot (the get_publication_data layout) into a new store, adding
+        the tabs in date order. A summary of the rows stored is passed to log (pass log=print to see it).
+        '''
+        store = cls(folder, checkpoint_every=checkpoint_every)
+        for snapshot, data in sorted(pd.read_excel(file, sheet_name=None).items()):
+            store.append(snapshot, data)
+        count('snapshots_stored', len(store))
+        log('Stored', len(store), 'snapshots of', file, 'in', folder, '('+str(sum(entry['stored_rows'] for entry in store.manifest['snapshots'])),
+              'of', sum(entry['rows'] for entry in store.manifest['snapshots']), 'rows)')
+        return store
+
+
+def get_publication_data(file, cache_dir=None, lazy=False, max_sheets=None, log=print):
+    '''
+    Loads every sheet (snapshot) of the excel workbook into a dictionary of DataFrames.
+
+    Inputs:
+        file (string): file name (including directory) of the excel workbook. Each tab is one snapshot and is
+            named with its date code, YYYYMMDD. A SnapshotStore folder can be given instead.
+        cache_dir (string, default None): if given, the sheets are stored in this directory as columnar files
+            (parquet if available, npz otherwise) and later loads read them from there instead of from Excel.
+            Only tabs whose content changed in the workbook are parsed again. See load_sheets_with_cache.
+        lazy (boolean, default False): if True, pubs_dict is a LazyPubsDict that parses each sheet only when it 
+            is first used. It cannot be combined with cache_dir (a ValueError is raised), since the cache already
+            reads only the sheets that changed.
+        max_sheets (integer, default None): with lazy=True, the maximum number of parsed sheets kept in memory.
+        log (function, default print): shows the available snapshot dates; batch code passes debug instead.
+    Outputs:
+        pubs_dict (dictionary of dataframes): keys are the date codes and values are the DataFrames of each sheet.
+        pubs_snapshot_list (list): the date codes, in workbook order.
+    '''
+    if lazy and cache_dir:
+        raise ValueError('lazy=True cannot be combined with cache_dir; pass one or the other')
+    with span('get_publication_data', file=str(file)):
+        if isinstance(file, (str, os.PathLike)) and os.path.isdir(file):
+            pubs_dict = SnapshotStore(file, max_sheets=max_sheets or 8)
+        elif lazy:
+            with span('read_sheet_names'):
+                pubs_dict = LazyPubsDict(file, max_sheets=max_sheets)
+        elif cache_dir:
+            pubs_dict = load_sheets_with_cache(file, cache_dir)
+        else:
+            with span('read_excel'):
+                pubs_dict = pd.read_excel(file, sheet_name=None)
+            count('sheets_parsed', len(pubs_dict))
+        if sinks and isinstance(pubs_dict, dict):   #Lazy and store loads read their sheets later
+            count('rows_loaded', sum(len(sheet) for sheet in pubs_dict.values()))
+    pubs_snapshot_list = list(pubs_dict.keys())
+    log('Your available publication snapshot dates are: ', pubs_snapshot_list)
+
+    return pubs_dict, pubs_snapshot_list
+
+
+def h_index_kernel(citations):
+    '''
+    Calculates the H-index from a plain array of citation counts without sorting it. Each citation count is
+    clipped to the number of publications and counted into bins, so that a reversed cumulative sum gives the
+    number of publications with at least k citations for every k. The h-index is the largest k for which that
+    number is at least k. This is the same h as calculate_H_index, but works on numpy arrays directly.
+
+    Inputs:
+        citations (array-like of numbers)
+            Citation counts of each publication in one snapshot, in any order. NaN entries count as uncited.
+
+    Outputs:
+        h (integer)
+            The H-index of the citation counts.
+    '''
+    citations = np.asarray(citations, dtype=np.float64).ravel()
+    n = citations.size
+    if n == 0:
+        return 0
+    #Fractional citations round down, NaN and negative values count as zero citations.
+    clipped = np.clip(np.nan_to_num(citations, nan=0.0), 0, n).astype(np.int64)
+    counts = np.bincount(clipped, minlength=n+1)
+    at_least = np.cumsum(counts[::-1])[::-1]
+    return int(np.flatnonzero(at_least >= np.arange(n+1))[-1])
+
+def h_index_batch(citations, offsets=None):
+    '''
+    Calculates the H-index of many snapshots in one call. Snapshots can either be given as a 2-D array padded
+    with NaN (or zeros), one row per snapshot, or as one flat array of all citation counts together with an
+    array of offsets marking where each snapshot starts and ends (ragged layout).
+
+    Inputs:
+        citations (array-like)
+            Either a 2-D array (snapshots x publications) padded with NaN or 0, or a 1-D array of the citation
+            counts of all snapshots concatenated together.
+        offsets (array-like of integers, default None)
+            Only for the ragged layout. Snapshot i is citations[offsets[i]:offsets[i+1]], so offsets has one more
+            entry than there are snapshots, starting with 0 and ending with len(citations).
+
+    Outputs:
+        h (numpy array of integers)
+            The H-index of each snapshot, in the order they were given.
+    '''
+    citations = np.asarray(citations, dtype=np.float64)
+    citations = np.nan_to_num(citations, nan=0.0)
+    if offsets is None:
+        if citations.ndim == 1:
+            citations = citations[np.newaxis, :]
+        #Sort each row in descending order and compare against the rank of each publication
+        sorted_citations = -np.sort(-citations, axis=1)
+        ranks = np.arange(1, sorted_citations.shape[1]+1)
+        return np.count_nonzero(sorted_citations >= ranks, axis=1)
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    snapshot_ids = np.repeat(np.arange(lengths.size), lengths)
+    #Sort on snapshot first and on descending citations second, so each snapshot stays in its own segment
+    order = np.lexsort((-citations, snapshot_ids))
+    ranks = np.arange(citations.size) - np.repeat(offsets[:-1], lengths) + 1
+    hits = citations[order] >= ranks
+    return np.bincount(snapshot_ids, weights=hits, minlength=lengths.size).astype(np.int64)
+
+
+def calculate_H_index(data):
+    '''
+    Calculates the H-index as defined by the intersection of the 1:1 line between citations and number of publications
+    and the rank of publicaitons ordered in decreasing number of citations. That means that publication 1 has 
+    the most citations and publication n has the least. 
+
+    Inputs:
+        data (dataframe)
+            One sheet from the excel spreadsheet containing the historical Google scholar Hirsch plot data.
+    
+    Outputs:
+        h (integer)
+            This is the H-index calculated using the standard method.
+        sorted_data (dataframe)
+            Same as data input, however it is sorted on 'Citations' in descending order. It is useful to return
+            this variable for use in the plot_Hirsch function.
+    '''
+    #Sort data - spreadsheet should contain sorted data, but this is just in case.
+    sorted_data = data.sort_values(by='Citations', ascending=False, ignore_index=True)
+    h = h_index_kernel(sorted_data['Citations'].to_numpy())
+
+    return h, sorted_data
+
+#Columns of the metrics record, in the order they are added to the time series DataFrame
+metric_columns = ['h-index', 'g-index', 'i10-index', 'm-quotient', 'e-index', 'h-core']
+
+def metrics_kernel(sorted_citations, first_year=None, snapshot_year=None):
+    '''
+    Computes several publication metrics from one array of citation counts that is already sorted in descending
+    order. Everything is derived from the rank of each publication and the cumulative sum of citations, so no
+    further sorting is needed.
+
+    Inputs:
+        sorted_citations (array-like of numbers)
+            Citation counts of one snapshot sorted from most to least cited.
+        first_year (integer, default None)
+            Year of the first publication, used for the m-quotient.
+        snapshot_year (integer, default None)
+            Year the snapshot was taken, used for the m-quotient.
+
+    Outputs:
+        metrics (dictionary)
+            Keys are the entries of metric_columns:
+            h-index - largest h with h publications cited at least h times.
+            g-index - largest g with the top g publications cited at least g**2 times in total.
+            i10-index - number of publications with at least 10 citations.
+            m-quotient - h divided by the number of years since the first publication (NaN if the years are unknown).
+            e-index - square root of the citations in the h-core in excess of h**2.
+            h-core - number of publications with at least h citations, including ties at h.
+    '''
+    citations = np.nan_to_num(np.asarray(sorted_citations, dtype=np.float64).ravel(), nan=0.0)
+    ranks = np.arange(1, citations.size+1)
+    cumulative = np.cumsum(citations)
+
+    h = int(np.count_nonzero(citations >= ranks))
+    g = int(np.count_nonzero(cumulative >= ranks**2))
+    i10 = int(np.count_nonzero(citations >= 10))
+    if h > 0:
+        e = float(np.sqrt(cumulative[h-1] - h**2))
+        h_core = int(np.count_nonzero(citations >= h))
+    else:
+        e = 0.0
+        h_core = 0
+    if (first_year is not None) and (snapshot_year is not None):
+        m = h/(snapshot_year - first_year + 1)
+    else:
+        m = np.nan
+
+    return {'h-index':h, 'g-index':g, 'i10-index':i10, 'm-quotient':m, 'e-index':e, 'h-core':h_core}
+
+def metrics_batch(citations, offsets, first_years=None, snapshot_years=None):
+    '''
+    Computes every metric of metrics_kernel for many snapshots in one call, from a flat array of citation counts
+    and the offsets of each snapshot in it (the ragged layout of h_index_batch). The citations are sorted once,
+    segment by segment, and every metric comes from grouped counts and cumulative sums over that sorted array.
+
+    Inputs:
+        citations (array-like of numbers): citation counts of all snapshots concatenated together.
+        offsets (array-like of integers): snapshot i is citations[offsets[i]:offsets[i+1]].
+        first_years (array-like, default None): year of the first publication of each snapshot, for the m-quotient.
+        snapshot_years (array-like, default None): year each snapshot was taken, for the m-quotient.
+
+    Outputs:
+        metrics (dictionary of numpy arrays): keys are the entries of metric_columns, with one value per snapshot.
+    '''
+    citations = np.nan_to_num(np.asarray(citations, dtype=np.float64).ravel(), nan=0.0)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n_snapshots = lengths.size
+    snapshot_ids = np.repeat(np.arange(n_snapshots), lengths)
+    starts = np.repeat(offsets[:-1], lengths)
+
+    order = np.lexsort((-citations, snapshot_ids))
+    sorted_citations = citations[order]
+    ranks = np.arange(citations.size) - starts + 1
+    #Cumulative sum restarted at the beginning of every snapshot
+    cumulative = np.cumsum(sorted_citations)
+    cumulative -= np.repeat(np.concatenate([[0.0], cumulative])[offsets[:-1]], lengths)
+
+    def segment_count(mask):
+        return np.bincount(snapshot_ids, weights=mask, minlength=n_snapshots).astype(np.int64)
+
+    h = segment_count(sorted_citations >= ranks)
+    g = segment_count(cumulative >= ranks**2)
+    i10 = segment_count(sorted_citations >= 10)
+    h_core = segment_count((sorted_citations >= h[snapshot_ids]) & (h[snapshot_ids] > 0))
+    e = np.zeros(n_snapshots)
+    has_core = h > 0
+    e[has_core] = np.sqrt(cumulative[offsets[:-1][has_core] + h[has_core] - 1] - h[has_core]**2)
+    if (first_years is not None) and (snapshot_years is not None):
+        career = np.asarray(snapshot_years, dtype=np.float64) - np.asarray(first_years, dtype=np.float64) + 1
+        m = h/career
+    else:
+        m = np.full(n_snapshots, np.nan)
+
+    return {'h-index':h, 'g-index':g, 'i10-index':i10, 'm-quotient':m, 'e-index':e, 'h-core':h_core}
+
+def calculate_metrics(data, snapshot=None):
+    '''
+    Calculates the h-index along with the g-index, i10-index, m-quotient, e-index and h-core size of one
+    snapshot, sorting its citations only once. See metrics_kernel for the definition of each metric.
+
+    Inputs:
+        data (dataframe)
+            One sheet from the excel spreadsheet containing the historical Google scholar Hirsch plot data.
+        snapshot (string, YYYYMMDD, default None)
+            Date code of the snapshot. Its first 4 characters give the career length for the m-quotient. If it
+            is not given, the latest publication year in the sheet is used instead.
+
+    Outputs:
+        metrics (dictionary)
+            One compact record of all metrics for the snapshot, keyed by the entries of metric_columns.
+    '''
+    sorted_citations = np.sort(np.nan_to_num(data['Citations'].to_numpy(dtype=np.float64), nan=0.0))[::-1]
+    years = data['Year'].dropna()
+    if years.empty:
+        first_year, snapshot_year = None, None
+    else:
+        first_year = int(years.min())
+        snapshot_year = int(snapshot[:4]) if snapshot else int(years.max())
+
+    return metrics_kernel(sorted_citations, first_year=first_year, snapshot_year=snapshot_year)
+
+def sheet_fingerprint(data, columns=('Citations', 'Year')):
+    '''
+    Content hash of one snapshot DataFrame, used to tell whether a snapshot changed between runs. Only the 
+    columns the metrics and the Hirsch plots are computed from are hashed, as raw numeric arrays, so the 
+    fingerprint costs far less than the metrics themselves (hashing every title and journal string did not).
+
+    Inputs:
+        data (dataframe): one sheet from pubs_dict.
+        columns (tuple of strings): columns that are hashed.
+    Outputs:
+        fingerprint (string): hex digest of the values of those columns.
+    '''
+    digest = hashlib.sha1()
+    for column in columns:
+        values = data[column].to_numpy(dtype=np.float64) if column in data else np.zeros(0)
+        digest.update(column.encode() + np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+def pubs_dict_fingerprints(pubs_dict):
+    '''
+    Fingerprints every snapshot in pubs_dict. For a LazyPubsDict the fingerprints are taken from the workbook
+    itself (see workbook_sheet_fingerprints), so no sheet has to be parsed to find out that it has not changed.
+
+    Outputs:
+        fingerprints (dictionary): keys are the date codes and values are hex digests.
+    '''
+    if isinstance(pubs_dict, LazyPubsDict):
+        fingerprints = workbook_sheet_fingerprints(pubs_dict.file)
+        if fingerprints is not None:
+            return {key:'xlsx:'+fingerprints[key] for key in pubs_dict.keys()}
+    return {key:sheet_fingerprint(pubs_dict[key]) for key in pubs_dict.keys()}
+
+def snapshot_time_series(pubs_dict, previous=None, metrics=False):
+    '''
+    Computes the h-index time series (and optionally the other metrics) without plotting it, reusing the rows
+    of a previous run for every snapshot that has not changed since. Each row carries the date code and the 
+    fingerprint of its snapshot, so the output of one run is the previous argument of the next. Only new or 
+    changed snapshots are recomputed; snapshots that are no longer in pubs_dict are dropped.
+
+    Inputs:
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        previous (dataframe, default None): output of an earlier call of this function, for example read back 
+            from a csv file (the Snapshot column must then be read as strings). With None, every snapshot is
+            computed.
+        metrics (boolean, default False): if True, all of metric_columns are computed, not just the h-index.
+
+    Outputs:
+        ts_df (dataframe): columns Date, Snapshot, Fingerprint, and h-index (or all of metric_columns), one row 
+            per snapshot in the order of pubs_dict.
+    '''
+    value_columns = metric_columns if metrics else ['h-index']
+    columns = ['Date', 'Snapshot', 'Fingerprint'] + value_columns
+    fingerprints = pubs_dict_fingerprints(pubs_dict)
+
+    reusable = {}
+    if (previous is not None) and set(columns).issubset(previous.columns):
+        for row in previous[columns].itertuples(index=False):
+            snapshot, fingerprint = str(row[1]), row[2]
+            if fingerprints.get(snapshot) == fingerprint:
+                reusable[snapshot] = row
+
+    rows = []
+    for key, fingerprint in fingerprints.items():
+        if key in reusable:
+            rows.append(tuple(reusable[key]))
+            continue
+        debug('Computing snapshot ', key)
+        if metrics:
+            record = calculate_metrics(pubs_dict[key], snapshot=key)
+        else:
+            record = {'h-index':calculate_H_index(pubs_dict[key])[0]}
+        rows.append((pd.to_datetime(key), key, fingerprint) + tuple(record[column] for column in value_columns))
+    debug('Reused ', len(reusable), ' of ', len(fingerprints), ' snapshots from the previous time series.')
+
+    ts_df = pd.DataFrame.from_records(rows, columns=columns)
+    ts_df['Date'] = pd.to_datetime(ts_df['Date'])
+    return ts_df
+
+def compute_time_series(pubs_dict, metrics=False, previous=None):
+    '''
+    Computes the time series DataFrame of h_index_time_series without plotting it. See h_index_time_series for 
+    the inputs and the output.
+    '''
+    #Create time series dataframe with dates and h-indices from each date, start with empty lists 
+    #for each column. With a previous time series, only new or changed snapshots are computed.
+    if previous is not None:
+        return snapshot_time_series(pubs_dict, previous=previous, metrics=metrics)
+    date_list = []
+    h_list = []
+    records = []
+    rows = 0
+    with span('h_index_per_snapshot', snapshots=len(pubs_dict)):
+        for k,v in pubs_dict.items():
+            rows += len(v)
+            if metrics:
+                records.append(calculate_metrics(v, snapshot=k))
+                h_temp = records[-1]['h-index']
+            else:
+                h_temp, _ = calculate_H_index(v)
+            date_temp = pd.to_datetime(k)
+            date_list.append(date_temp)
+            h_list.append(h_temp)
+
+    ts_df = pd.DataFrame({'Date':date_list, 'h-index':h_list})
+    if metrics:
+        ts_df = pd.concat([ts_df[['Date']], pd.DataFrame.from_records(records, columns=metric_columns)], axis=1)
+    count('rows_processed', rows)
+    return ts_df
+
+def draw_time_series(ax, ts_df, prediction_data=None, cohort=None, config=None):
+    '''
+    Draws the h-index time series (and optionally a prediction and cohort bands) into the given axes. Only the
+    axes and its figure are used, never pyplot's current figure.
+
+    Inputs:
+        ax (matplotlib axes): the axes to draw into.
+        ts_df (dataframe): output of compute_time_series.
+        prediction_data (dataframe, default None): Year | h-index prediction, see h_index_time_series.
+        cohort (dataframe, default None): output of cohort_bands.
+        config (RenderConfig, default None): fonts of this call, the module font dictionaries if None.
+    '''
+    fonts = config.axis_label if config else axis_label_dict
+    if prediction_data is not None:
+        line_style = 'None'
+        legend_list = ['Google scholar data', 'Prediction']
+    else:
+        line_style = '-'
+        legend_list = ['Google scholar data']
+
+    ax.figure.patch.set_facecolor('white')
+    ax.plot(
+        ts_df['Date'],
+        ts_df['h-index'],
+        linestyle=line_style,
+        mfc='lightblue',
+        marker='d',
+        mec='k',
+        color='k',
+        markersize=15
+    )
+
+    #Add prediction if present:
+    if prediction_data is not None:
+        ax.plot(
+            pd.to_datetime(prediction_data['Year'], format='%Y'),
+            prediction_data['h-index'],
+            linestyle='-',
+            color='k'            
+        )
+
+    #Add cohort bands if present:
+    if cohort is not None:
+        legend_list = legend_list + plot_cohort_band(ax, cohort, metric='h-index')
+
+    ax.set(xlabel='Date', ylabel='h-index')
+    ax.xaxis.get_label().set_fontsize(fonts['fontsize'])
+    ax.yaxis.get_label().set_fontsize(fonts['fontsize'])
+    font = importlib.import_module('matplotlib.font_manager').FontProperties(
+        family=fonts['fontfamily'],
+        size=14        
+    )
+    
+    ax.legend(legend_list, prop=font)
+
+def time_series_figure(pubs_dict, prediction=None, metrics=False, previous=None, cohort=None, config=None):
+    '''
+    Thread-safe version of h_index_time_series: computes the time series and draws it on a new Figure with its
+    own canvas (see new_figure), without pyplot and without printing.
+
+    Outputs:
+        fig (matplotlib figure): the time series figure.
+        ts_df (dataframe): the time series, as in h_index_time_series.
+    '''
+    config = config or RenderConfig()
+    prediction_data = pd.read_csv(prediction) if isinstance(prediction, str) else prediction
+    with span('compute_time_series'):
+        ts_df = compute_time_series(pubs_dict, metrics=metrics, previous=previous)
+    with span('draw_time_series'):
+        fig = new_figure(config)
+        draw_time_series(fig.add_subplot(1, 1, 1), ts_df, prediction_data=prediction_data, cohort=cohort, config=config)
+    count('figures_rendered')
+    return fig, ts_df
+
+def h_index_time_series(pubs_dict, prediction=None, metrics=False, previous=None, cohort=None):
+    '''
+    This function generates a time series by calculating the h-index from every dataframe in the pubs_dict, a dictionary
+    in which each value is a dataframe of publication information from your publication snapshot. 
+
+    Inputs:
+        pubs_dict (dictionary of dataframes)
+            The dictionary output from get_publication_data. Each key is the date code (str, YYYYMMDD) of the publication and 
+            citation snapshot from each sheet in your excel workbook, and the values are the DataFrames loaded from those
+            corresponding sheets.
+        prediction (string or dataframe)
+            file name (including directory) of any file that you have h-index predictive data in, or a
+            DataFrame of the same shape, such as the output of forecast_h_index. The
+            prediction calculator I used in 2013, Acuna, Allesino, and Kording 2012 (Nature) no longer
+            seems to exist except in someone's R code. I may try to reproduce it here in the future, 
+            but there may be other ways to find a predictor and hence I leave this option as a keyword
+            argument. You need not enter this argument - the routine will still work. Columns must be
+            Year | h-index spelled as such, and file must be .csv. Extra columns simply won't be analyzed.
+            Obviously, the best way to use this feature is to rename my example file and enter your data.
+            Also, data can be fictitious - i.e. based on your hopes and goals. 
+        metrics (boolean, default False)
+            If True, the time series also contains the g-index, i10-index, m-quotient, e-index and h-core
+            columns from calculate_metrics. They come from the same sort as the h-index.
+        previous (dataframe, default None)
+            ts_df returned by an earlier call. If given, only snapshots that are new or changed since then are
+            recomputed (see snapshot_time_series), and ts_df also carries the Snapshot and Fingerprint columns
+            so it can be passed back in on the next run. Pass an empty DataFrame to start the first such run.
+        cohort (dataframe, default None)
+            Output of cohort_bands. If given, the h-index of this author is drawn against the cohort median and
+            percentile bands.
+
+    Outputs:
+        ts_df (dataframe) 
+            This is the DataFrame of the time series. It contains two columns, Date and h-index.
+            Date is in pandas datetime format, converted from the datecode (YYYYMMDD) from each
+            tab in your snapshot spreadsheet. With metrics=True, there is one more column per metric.
+
+    '''
+
+    #Determine how plotting will work depending on the inclusion of a prediciton or not. Default is 
+    #`Rosenheim_AAK_forecast_2013.csv` which works for my example data.
+    if prediction is not None:
+        print('Including predictive data for comparison to snapshot data. Leave keyword argument out of function call if you do not want predictive data shown.')
+        prediction_data = pd.read_csv(prediction) if isinstance(prediction, str) else prediction
+    else:
+        print('No predictive data entered, plotting only snapshot data.')
+        prediction_data = None
+    with span('h_index_time_series'):
+        with span('compute_time_series'):
+            ts_df = compute_time_series(pubs_dict, metrics=metrics, previous=previous)
+
+        with span('draw_time_series'):
+            fig, ax = plt.subplots(nrows=1, ncols=1)
+            draw_time_series(ax, ts_df, prediction_data=prediction_data, cohort=cohort)
+    count('figures_rendered')
+
+    return ts_df, ax
+
+
+class AuthorView(Mapping):
+    '''
+    The snapshots of one author in a PublicationDataset, seen as a pubs_dict. Keys are the date codes and each
+    value is a DataFrame with the same columns as a sheet of the author's workbook, sliced out of the long table
+    on access. It can be passed unchanged to calculate_H_index (one value), plot_Hirsch, h_index_time_series, 
+    Hirsch_panels_auto and h_index_panels.
+    '''
+
+    def __init__(self, dataset, author):
+        self.dataset = dataset
+        self.author = author
+        first, last = dataset.author_index[author]
+        self.groups = dataset.groups.iloc[first:last]
+        self.rows = dict(zip(self.groups['Snapshot'], zip(self.groups['start'], self.groups['stop'])))
+
+    def __getitem__(self, key):
+        start, stop = self.rows[key]
+        return self.dataset.table.iloc[start:stop][self.dataset.data_columns].reset_index(drop=True)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __repr__(self):
+        return 'AuthorView('+repr(self.author)+', snapshots='+repr(list(self.rows))+')'
+
+
+class PublicationDataset:
+    '''
+    Snapshots of many authors held in one long-format table, with one row per publication per snapshot per
+    author. The table is sorted on Author and Snapshot, so every (author, snapshot) pair is a contiguous block
+    of rows. Two indexes point into those blocks:
+        groups (dataframe): one row per (author, snapshot) with the start and stop row of its block.
+        author_index (dictionary): author -> (first, last) rows of groups that belong to that author.
+        snapshot_index (dictionary): date code -> array of the rows of groups taken on that date.
+    Department-wide metrics are then grouped array operations over the whole table (see metrics_table) instead
+    of loops over dictionaries of DataFrames, while author() still gives each author a pubs_dict-like view.
+
+    Inputs:
+        table (dataframe): long-format table with an Author column, a Snapshot column (date code, YYYYMMDD) and
+            the sheet columns Year, Title and Citations (Journal and any other column are kept as they are).
+    '''
+
+    def __init__(self, table):
+        table = table.copy()
+        table['Author'] = table['Author'].astype(str)
+        table['Snapshot'] = table['Snapshot'].astype(str)
+        self.table = table.sort_values(['Author', 'Snapshot'], kind='stable', ignore_index=True)
+        self.data_columns = [column for column in self.table.columns if column not in ['Author', 'Snapshot']]
+
+        #Block boundaries: a new group starts wherever the author or the snapshot changes.
+        authors = self.table['Author'].to_numpy()
+        snapshots = self.table['Snapshot'].to_numpy()
+        changes = np.flatnonzero((authors[1:] != authors[:-1]) | (snapshots[1:] != snapshots[:-1])) + 1
+        if len(self.table):
+            starts = np.concatenate([[0], changes]).astype(np.int64)
+            stops = np.append(starts[1:], len(self.table)).astype(np.int64)
+        else:
+            starts, stops = np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        self.groups = pd.DataFrame({
+            'Author':authors[starts],
+            'Snapshot':snapshots[starts],
+            'start':starts,
+            'stop':stops
+        })
+
+        group_authors = self.groups['Author'].to_numpy()
+        author_starts = np.flatnonzero(np.concatenate([[len(self.groups) > 0], group_authors[1:] != group_authors[:-1]]))
+        author_stops = np.append(author_starts[1:], len(self.groups))[:len(author_starts)]
+        self.author_index = {group_authors[first]:(int(first), int(last)) for first, last in zip(author_starts, author_stops)}
+        self.snapshot_index = {snap:np.asarray(rows) for snap, rows in self.groups.groupby('Snapshot').indices.items()}
+
+    @classmethod
+    def from_pubs_dicts(cls, pubs_dicts):
+        '''
+        Builds a dataset from a dictionary of pubs_dict, keyed by author name.
+        '''
+        frames = []
+        for author, pubs_dict in pubs_dicts.items():
+            for snap, data in pubs_dict.items():
+                frames.append(data.assign(Author=author, Snapshot=snap))
+        if not frames:
+            return cls(pd.DataFrame(columns=['Author', 'Snapshot', 'Year', 'Title', 'Citations']))
+        return cls(pd.concat(frames, ignore_index=True))
+
+    @classmethod
+    def from_workbooks(cls, files, cache_dir=None):
+        '''
+        Builds a dataset from excel workbooks, one per author. files is either a dictionary of author name -> file
+        name, or a list of file names, in which case the file name without extension is the author name.
+        '''
+        if not isinstance(files, dict):
+            files = {os.path.splitext(os.path.basename(file))[0]:file for file in files}
+        pubs_dicts = {}
+        for author, file in files.items():
+            if cache_dir:
+                pubs_dicts[author] = load_sheets_with_cache(file, cache_dir)
+            else:
+                pubs_dicts[author] = pd.read_excel(file, sheet_name=None)
+        return cls.from_pubs_dicts(pubs_dicts)
+
+    @property
+    def authors(self):
+        return list(self.author_index.keys())
+
+    @property
+    def snapshots(self):
+        return sorted(self.snapshot_index.keys())
+
+    def __len__(self):
+        return len(self.author_index)
+
+    def __contains__(self, author):
+        return author in self.author_index
+
+    def __repr__(self):
+        return 'PublicationDataset('+str(len(self.author_index))+' authors, '+str(len(self.groups))+' snapshots, '+str(len(self.table))+' rows)'
+
+    def author(self, author):
+        '''
+        Returns the pubs_dict-like AuthorView of one author.
+        '''
+        return AuthorView(self, author)
+
+    def snapshot(self, snap):
+        '''
+        Returns the long-format rows of every author for one date code.
+        '''
+        rows = self.groups.iloc[self.snapshot_index.get(snap, [])]
+        if len(rows) == 0:
+            return self.table.iloc[0:0]
+        blocks = np.concatenate([np.arange(start, stop) for start, stop in zip(rows['start'], rows['stop'])])
+        return self.table.iloc[blocks].reset_index(drop=True)
+
+    def metrics_table(self, metrics=True):
+        '''
+        Computes the h-index (and, with metrics=True, every entry of metric_columns) of every author at every
+        snapshot in one batched call over the whole table.
+
+        Outputs:
+            metrics_df (dataframe): one row per (author, snapshot) with columns Author, Snapshot, Date and the
+                metrics.
+        '''
+        offsets = np.append(self.groups['start'].to_numpy(), len(self.table))
+        citations = self.table['Citations'].to_numpy(dtype=np.float64)
+        years = self.table['Year'].to_numpy(dtype=np.float64)
+        first_years = np.fmin.reduceat(years, self.groups['start'].to_numpy()) if len(self.groups) else np.array([])
+        snapshot_years = self.groups['Snapshot'].str[:4].astype(float).to_numpy()
+        values = metrics_batch(citations, offsets, first_years=first_years, snapshot_years=snapshot_years)
+        metrics_df = self.groups[['Author', 'Snapshot']].copy()
+        metrics_df['Date'] = pd.to_datetime(metrics_df['Snapshot'], format='%Y%m%d')
+        for column in (metric_columns if metrics else ['h-index']):
+            metrics_df[column] = values[column]
+        return metrics_df
+
+    def frontier_table(self, k_max=3):
+        '''
+        Runs the h-index frontier simulator (frontier_batch) over every author and snapshot in one batch, with
+        each paper's lifetime average citations per year as its rate.
+
+        Outputs:
+            frontier_df (dataframe): one row per (author, snapshot) with Author, Snapshot, h-index and, for each
+                k, the citations needed for h+k (needed h+k) and the projected years until then (years h+k).
+        '''
+        offsets = np.append(self.groups['start'].to_numpy(), len(self.table))
+        citations = self.table['Citations'].to_numpy(dtype=np.float64)
+        lengths = np.diff(offsets)
+        snapshot_years = np.repeat(self.groups['Snapshot'].str[:4].astype(float).to_numpy(), lengths)
+        rates = np.nan_to_num(citations)/np.clip(snapshot_years - self.table['Year'].to_numpy(dtype=np.float64) + 1, 1, None)
+        summary, _, _ = frontier_batch(citations, offsets, rates=rates, k_max=k_max)
+        frontier_df = self.groups[['Author', 'Snapshot']].copy()
+        frontier_df['h-index'] = summary['h']
+        for k in range(k_max):
+            frontier_df['needed h+'+str(k+1)] = summary['needed'][:, k]
+            frontier_df['years h+'+str(k+1)] = summary['years'][:, k]
+        return frontier_df
+
+
+class ColumnarAuthorView(Mapping):
+    '''
+    The snapshots of one author in a ColumnarStore, seen as a pubs_dict (like AuthorView). Each value is a 
+    DataFrame built from the mapped slices on access.
+    '''
+
+    def __init__(self, store, author):
+        self.store = store
+        self.author = author
+        self.rows = {snap:row for row, snap in store.author_groups(author)}
+
+    def __getitem__(self, key):
+        return self.store.sheet(self.rows[key])
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __repr__(self):
+        return 'ColumnarAuthorView('+repr(self.author)+', snapshots='+repr(list(self.rows))+')'
+
+
+class ColumnarStore:
+    '''
+    On-disk columnar copy of the snapshots of many authors, opened with np.memmap so that reads are zero-copy:
+    only the pages that a query touches are read, and worker processes that open the same store share the 
+    operating system's page cache instead of each holding a private copy. The folder holds one flat array per
+    column, in the row order of PublicationDataset (author, then snapshot), with each (author, snapshot) block 
+    sorted on descending citations:
+        citations.int32, year.int16 (missing years are year_missing), title.int32 and journal.int32 (codes into
+        the titles.json and journals.json dictionaries, -1 if missing),
+    and one entry per block in offsets.int64 (block i is rows offsets[i]:offsets[i+1]), group_author.int32 
+    (code into authors.json) and group_snapshot.int32 (the date code as a number). meta.json holds the lengths.
+
+    Inputs:
+        folder (string): folder of a store written by ColumnarStore.write.
+    '''
+    year_missing = np.iinfo(np.int16).min
+    columns = {'citations':np.int32, 'year':np.int16, 'title':np.int32, 'journal':np.int32}
+    group_columns = {'offsets':np.int64, 'group_author':np.int32, 'group_snapshot':np.int32}
+
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, 'meta.json')) as f:
+            self.meta = json.load(f)
+        for name, dtype in (self.columns | self.group_columns).items():
+            length = self.meta['groups'] + 1 if name == 'offsets' else self.meta['groups'] if name in self.group_columns else self.meta['rows']
+            path = os.path.join(folder, name+'.'+np.dtype(dtype).name)
+            #np.memmap cannot map an empty file
+            setattr(self, name, np.memmap(path, dtype=dtype, mode='r', shape=(length,)) if length else np.zeros(0, dtype=dtype))
+        with open(os.path.join(folder, 'authors.json')) as f:
+            self.authors = json.load(f)
+        self.author_codes = {author:code for code, author in enumerate(self.authors)}
+        self._titles = None
+        self._journals = None
+
+    @property
+    def titles(self):
+        if self._titles is None:   #The title dictionary is only read when titles are needed
+            with open(os.path.join(self.folder, 'titles.json')) as f:
+                self._titles = np.array(json.load(f), dtype=object)
+        return self._titles
+
+    @property
+    def journals(self):
+        if self._journals is None:
+            with open(os.path.join(self.folder, 'journals.json')) as f:
+                self._journals = np.array(json.load(f), dtype=object)
+        return self._journals
+
+    def __len__(self):
+        return len(self.authors)
+
+    def __repr__(self):
+        return 'ColumnarStore('+repr(self.folder)+', '+str(len(self.authors))+' authors, '+str(self.meta['groups'])+' snapshots, '+str(self.meta['rows'])+' rows)'
+
+    @classmethod
+    def write(cls, folder, sources, cache_dir=None, log=debug):
+        '''
+        Writes a store from many authors, one author at a time, so building it never holds more than one 
+        author's snapshots in memory.
+
+        Inputs:
+            folder (string): folder of the new store. Existing store files in it are replaced.
+            sources (dictionary, list or PublicationDataset): author name -> workbook file name or pubs_dict, a
+                list of workbook file names (named by file name, as in PublicationDataset.from_workbooks), or a
+                PublicationDataset.
+            cache_dir (string, default None): sheet cache used to read workbooks, see load_sheets_with_cache.
+            log (function, default debug): receives the closing summary (rows, snapshots and authors written).
+        Outputs:
+            store (ColumnarStore): the new store, opened.
+        '''
+        if isinstance(sources, PublicationDataset):
+            sources = {author:sources.author(author) for author in sources.authors}
+        elif not isinstance(sources, dict):
+            sources = {os.path.splitext(os.path.basename(source))[0]:source for source in sources}
+        os.makedirs(folder, exist_ok=True)
+        files = {name:open(os.path.join(folder, name+'.'+np.dtype(dtype).name), 'wb') for name, dtype in (cls.columns | cls.group_columns).items()}
+        titles, journals = {}, {}
+        rows = groups = 0
+        try:
+            np.zeros(1, dtype=np.int64).tofile(files['offsets'])
+            for code, (author, source) in enumerate(sorted(sources.items())):
+                if isinstance(source, str):
+                    pubs_dict = load_sheets_with_cache(source, cache_dir) if cache_dir else pd.read_excel(source, sheet_name=None)
+                else:
+                    pubs_dict = source
+                for snap in sorted(pubs_dict.keys()):
+                    data = pubs_dict[snap]
+                    citations = np.nan_to_num(data['Citations'].to_numpy(dtype=np.float64), nan=0.0)
+                    order = np.argsort(-citations, kind='stable')
+                    years = data['Year'].to_numpy(dtype=np.float64)[order]
+                    np.asarray(citations[order], dtype=np.int32).tofile(files['citations'])
+                    np.where(np.isnan(years), cls.year_missing, years).astype(np.int16).tofile(files['year'])
+                    for name, column, dictionary in [('title', 'Title', titles), ('journal', 'Journal', journals)]:
+                        values = data[column].to_numpy(dtype=object)[order] if column in data else np.full(len(data), None)
+                        codes = [dictionary.setdefault(value, len(dictionary)) if isinstance(value, str) else -1 for value in values]
+                        np.asarray(codes, dtype=np.int32).tofile(files[name])
+                    rows += len(data)
+                    groups += 1
+                    np.array([rows], dtype=np.int64).tofile(files['offsets'])
+                    np.array([code], dtype=np.int32).tofile(files['group_author'])
+                    np.array([int(snap)], dtype=np.int32).tofile(files['group_snapshot'])
+                pubs_dict = None
+        finally:
+            for f in files.values():
+                f.close()
+        for name, values in [('authors.json', sorted(sources)), ('titles.json', list(titles)), ('journals.json', list(journals))]:
+            with open(os.path.join(folder, name), 'w') as f:
+                json.dump(values, f)
+        with open(os.path.join(folder, 'meta.json'), 'w') as f:
+            json.dump({'version':1, 'rows':rows, 'groups':groups}, f)
+        count('rows_written', rows)
+        log('Wrote', rows, 'rows of', groups, 'snapshots of', len(sources), 'authors to', folder)
+        return cls(folder)
+
+    def author_groups(self, author):
+        '''
+        Returns (block, date code) of every snapshot of one author, in date order.
+        '''
+        code = self.author_codes[author]
+        first, last = np.searchsorted(self.group_author, [code, code+1])
+        return [(int(row), str(snap)) for row, snap in zip(range(first, last), self.group_snapshot[first:last])]
+
+    def author(self, author):
+        '''
+        Returns the pubs_dict-like view of one author, for the plotting functions.
+        '''
+        return ColumnarAuthorView(self, author)
+
+    def block(self, author, snapshot):
+        '''
+        Returns the block number of one author's snapshot.
+        '''
+        for row, snap in self.author_groups(author):
+            if snap == snapshot:
+                return row
+        raise KeyError((author, snapshot))
+
+    def slice(self, name, row):
+        '''
+        Zero-copy view of one column (citations, year, title or journal) of block row.
+        '''
+        return getattr(self, name)[self.offsets[row]:self.offsets[row+1]]
+
+    @staticmethod
+    def decode(dictionary, codes):
+        '''
+        Maps dictionary codes back to strings, with None where the code is -1 (missing value or missing column).
+        '''
+        values = np.full(len(codes), None, dtype=object)
+        present = codes >= 0
+        values[present] = dictionary[codes[present]]
+        return values
+
+    def sheet(self, row):
+        '''
+        Materializes block row as a DataFrame with the Year, Journal, Title and Citations columns of a workbook tab.
+        '''
+        years = self.slice('year', row)
+        titles, journals = self.slice('title', row), self.slice('journal', row)
+        data = pd.DataFrame({
+            'Year':np.where(years == self.year_missing, np.nan, years) if (years == self.year_missing).any() else np.asarray(years, dtype=np.int64),
+            'Journal':self.decode(self.journals, journals),
+            'Title':self.decode(self.titles, titles),
+            'Citations':np.asarray(self.slice('citations', row), dtype=np.int64)
+        })
+        return data
+
+    def h_index(self, author, snapshot):
+        '''
+        H-index of one snapshot straight from its mapped citations (see h_index_kernel).
+        '''
+        return h_index_kernel(self.slice('citations', self.block(author, snapshot)))
+
+    def limits(self, author, snapshots=None):
+        '''
+        Shared axis and colorbar limits of some (all by default) snapshots of one author, as snapshot_limits 
+        returns them. Blocks are sorted on citations, so the largest citation count of each is its first entry 
+        and only the year slices are scanned.
+        '''
+        rows = [row for row, snap in self.author_groups(author) if snapshots is None or snap in snapshots]
+        if not rows:
+            raise ValueError('None of the snapshots '+str(snapshots)+' of '+str(author)+' are in the store')
+        starts, stops = self.offsets[rows], self.offsets[np.asarray(rows)+1]
+        lengths = stops - starts
+        max_citations = max((int(self.citations[start]) for start, length in zip(starts, lengths) if length), default=0)
+        years = np.concatenate([self.year[start:stop] for start, stop in zip(starts, stops)])
+        years = years[years != self.year_missing]
+        if not len(years):
+            raise ValueError('The selected snapshots of '+str(author)+' have no publication years')
+        lims_dict = {'x':[-2, int(lengths.max())], 'y':[-20, 10*(np.ceil(max_citations/10))]}
+        return lims_dict, (int(years.min()), int(years.max()))
+
+    def metrics_table(self, metrics=True, chunk_rows=1 << 22):
+        '''
+        Computes the h-index (and, with metrics=True, every entry of metric_columns) of every author at every 
+        snapshot, like PublicationDataset.metrics_table, streaming over the mapped columns in chunks of about
+        chunk_rows rows so memory stays bounded however large the store is.
+        '''
+        offsets = np.asarray(self.offsets)
+        n_groups = len(offsets) - 1
+        columns = metric_columns if metrics else ['h-index']
+        values = {}
+        snapshot_years = np.asarray(self.group_snapshot)//10000
+        first = 0
+        while first < n_groups:
+            last = max(first+1, int(np.searchsorted(offsets, offsets[first] + chunk_rows, side='right')) - 1)
+            last = min(last, n_groups)
+            start, stop = offsets[first], offsets[last]
+            local = offsets[first:last+1] - start
+            citations = np.asarray(self.citations[start:stop], dtype=np.float64)
+            if metrics:
+                years = np.asarray(self.year[start:stop], dtype=np.float64)
+                years[years == self.year_missing] = np.nan
+                lengths = np.diff(local)
+                first_years = np.full(len(lengths), np.nan)
+                nonempty = lengths > 0
+                first_years[nonempty] = np.fmin.reduceat(years, local[:-1][nonempty])
+                chunk = metrics_batch(citations, local, first_years=first_years, snapshot_years=snapshot_years[first:last])
+            else:
+                #Blocks are already sorted on descending citations, so h is a count of citations >= rank.
+                lengths = np.diff(local)
+                ranks = np.arange(len(citations)) - np.repeat(local[:-1], lengths) + 1
+                chunk = {'h-index':np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=citations >= ranks, minlength=len(lengths)).astype(np.int64)}
+            for column in columns:
+                values.setdefault(column, np.zeros(n_groups, dtype=chunk[column].dtype))[first:last] = chunk[column]
+            first = last
+
+        metrics_df = pd.DataFrame({
+            'Author':np.array(self.authors, dtype=object)[np.asarray(self.group_author)] if n_groups else np.array([], dtype=object),
+            'Snapshot':np.asarray(self.group_snapshot).astype(str)
+        })
+        metrics_df['Date'] = pd.to_datetime(metrics_df['Snapshot'], format='%Y%m%d')
+        for column in columns:
+            metrics_df[column] = values.get(column, np.zeros(0))
+        return metrics_df
+
+
+def cohort_long_table(series):
+    '''
+    Brings the time series of many authors into one long table with an Author and a Date column. series can be
+    a PublicationDataset (its metrics_table is used), a dictionary of author -> ts_df from h_index_time_series
+    or snapshot_time_series, or a DataFrame that already has Author and Date columns.
+    '''
+    if isinstance(series, PublicationDataset):
+        return series.metrics_table()
+    if isinstance(series, dict):
+        frames = [ts_df.assign(Author=author) for author, ts_df in series.items()]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['Author', 'Date', 'h-index'])
+    return series
+
+def align_to_grid(long_df, dates, columns=('h-index',), method='step', carry_forward=False):
+    '''
+    Aligns the irregular snapshot dates of every author onto a common date grid in one vectorized pass. All
+    rows are sorted on (author, date) and encoded as one integer key per row, so a single searchsorted finds,
+    for every author and every grid date, the last snapshot taken on or before that date.
+
+    Inputs:
+        long_df (dataframe): long table with Author, Date and the metric columns (see cohort_long_table).
+        dates (array-like of datetimes): the common date grid.
+        columns (list or tuple of strings): metric columns to align.
+        method (string, 'step' or 'linear'): 'step' holds each snapshot value until the next snapshot, 'linear'
+            interpolates between consecutive snapshots.
+        carry_forward (boolean, default False): if False, grid dates after an author's last snapshot are NaN, so 
+            authors only count towards the dates their data cover. Grid dates before an author's first snapshot 
+            are always NaN.
+
+    Outputs:
+        authors (numpy array): author names, one per row of the aligned matrices.
+        aligned (dictionary of numpy arrays): for each column, a matrix of authors x grid dates.
+    '''
+    if method not in ['step', 'linear']:
+        raise ValueError('method must be step or linear, not '+repr(method))
+    long_df = long_df.dropna(subset=['Date'])
+    codes, authors = pd.factorize(long_df['Author'], sort=True)
+    days = pd.to_datetime(long_df['Date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+    grid = pd.to_datetime(pd.Index(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+    n_authors, n_dates = len(authors), len(grid)
+    if n_authors == 0 or n_dates == 0:
+        return np.asarray(authors), {column:np.full((n_authors, n_dates), np.nan) for column in columns}
+
+    #One sortable integer key per (author, day); grid days are clipped so they never spill into the next author.
+    first_day = min(days.min(), grid.min())
+    span = max(days.max(), grid.max()) - first_day + 2
+    keys = codes.astype(np.int64)*span + (days - first_day)
+    order = np.argsort(keys, kind='stable')
+    keys, codes, days = keys[order], codes[order], days[order]
+
+    query_codes = np.repeat(np.arange(n_authors), n_dates)
+    query_days = np.tile(grid, n_authors)
+    queries = query_codes*span + (query_days - first_day)
+    idx = np.searchsorted(keys, queries, side='right') - 1
+    found = (idx >= 0) & (codes[np.clip(idx, 0, None)] == query_codes)
+    idx = np.clip(idx, 0, None)
+    following = np.clip(idx + 1, 0, len(keys) - 1)
+    has_next = found & (idx + 1 < len(keys)) & (codes[following] == query_codes)
+    if not carry_forward:
+        found &= has_next | (days[idx] == query_days)
+
+    aligned = {}
+    for column in columns:
+        values = long_df[column].to_numpy(dtype=np.float64)[order]
+        result = values[idx]
+        if method == 'linear':
+            step = (days[following] - days[idx]).astype(np.float64)
+            fraction = np.where(has_next & (step > 0), (query_days - days[idx])/np.where(step > 0, step, 1), 0.0)
+            result = result + fraction*(values[following] - result)
+        result = np.where(found, result, np.nan)
+        aligned[column] = result.reshape(n_authors, n_dates)
+    return np.asarray(authors), aligned
+
+def cohort_bands(series, dates='YS', columns=('h-index',), percentiles=(10, 25, 50, 75, 90), method='step', carry_forward=False):
+    '''
+    Computes median and percentile bands of h (and the other metrics) across many authors on a common date
+    grid. Each author's snapshots are first aligned to the grid with align_to_grid, then the percentiles of 
+    every grid date come from one nanpercentile over the authors x dates matrix.
+
+    Inputs:
+        series: the authors' time series, as a PublicationDataset, a dictionary of author -> ts_df, or a long
+            DataFrame with Author, Date and metric columns.
+        dates (string or array-like, default 'YS'): either the grid dates themselves, or a pandas frequency 
+            string (e.g. 'YS' yearly, 'QS' quarterly, 'MS' monthly) for a grid spanning all snapshots.
+        columns (list or tuple of strings): metric columns to summarize, e.g. metric_columns.
+        percentiles (tuple of numbers): percentiles to compute. 50 (the median) is always included.
+        method (string, 'step' or 'linear'): interpolation of each author's snapshots onto the grid.
+        carry_forward (boolean, default False): see align_to_grid.
+
+    Outputs:
+        bands_df (dataframe): one row per metric and grid date, with columns Metric, Date, Authors (number of 
+            authors with data at that date) and one column per percentile named p10, p25, p50 and so on.
+    '''
+    long_df = cohort_long_table(series)
+    if isinstance(dates, str):
+        all_dates = pd.to_datetime(long_df['Date'])
+        dates = pd.date_range(all_dates.min(), all_dates.max(), freq=dates) if len(all_dates) else []
+    dates = pd.to_datetime(pd.Index(dates))
+    percentiles = sorted(set(percentiles) | {50})
+    _, aligned = align_to_grid(long_df, dates, columns=columns, method=method, carry_forward=carry_forward)
+
+    frames = []
+    for column in columns:
+        matrix = aligned[column]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)  #All-NaN grid dates give NaN bands.
+            values = np.nanpercentile(matrix, percentiles, axis=0) if matrix.size else np.full((len(percentiles), len(dates)), np.nan)
+        band = pd.DataFrame({'Metric':column, 'Date':dates, 'Authors':np.count_nonzero(~np.isnan(matrix), axis=0)})
+        for q, row in zip(percentiles, values):
+            band['p'+format(q, 'g')] = row
+        frames.append(band)
+    return pd.concat(frames, ignore_index=True)
+
+def plot_cohort_band(ax, bands_df, metric='h-index', color='lightgray'):
+    '''
+    Draws the cohort median of one metric and shaded bands between symmetric pairs of percentiles (e.g. p25-p75 
+    and p10-p90) into an existing axes, below anything already plotted in it.
+
+    Inputs:
+        ax (matplotlib axes): the axes to draw into, e.g. the one returned by h_index_time_series.
+        bands_df (dataframe): output of cohort_bands.
+        metric (string): which metric of bands_df to draw.
+        color (string): color of the shaded bands.
+    Outputs:
+        labels (list of strings): legend labels of the drawn median line and bands, in drawing order.
+    '''
+    band = bands_df[bands_df['Metric'] == metric]
+    lows = sorted(float(column[1:]) for column in band.columns if column.startswith('p') and float(column[1:]) < 50)
+    ax.plot(band['Date'], band['p50'], color='gray', linestyle='--', zorder=1)
+    labels = ['Cohort median']
+    for low in lows:
+        high = 100 - low
+        if 'p'+format(high, 'g') not in band.columns:
+            continue
+        ax.fill_between(band['Date'], band['p'+format(low, 'g')], band['p'+format(high, 'g')], color=color, alpha=0.4, linewidth=0, zorder=0)
+        labels.append('Cohort p'+format(low, 'g')+'-p'+format(high, 'g'))
+    return labels
+
+
+#Regression coefficients of Acuna, Allesina and Kording (2012, Nature 489:201) for the h-index 1, 5 and 10 years
+#ahead, in the order intercept, sqrt(number of articles), current h, years since first article, number of distinct
+#journals, number of articles in top journals.
+aak_coefficients = {
+    1:[0.76, 0.37, 0.97, -0.07, 0.02, 0.03],
+    5:[4.00, 1.58, 0.86, -0.35, 0.06, 0.20],
+    10:[8.73, 1.33, 0.48, -0.41, 0.52, 0.82]
+}
+#Journals counted as "top journals" by the AAK model. Change this list (or pass journals=) for your own field.
+top_journals = [
+    'Nature',
+    'Science',
+    'Nature Neuroscience',
+    'Proceedings of the National Academy of Sciences',
+    'PNAS',
+    'Neuron'
+]
+
+def forecast_features(dataset, journals=None):
+    '''
+    Computes the AAK model features of every author in a PublicationDataset from their latest snapshot, using
+    grouped array operations over the long table.
+
+    Inputs:
+        dataset (PublicationDataset): snapshots of one or more authors.
+        journals (list of strings, default None): journals that count as top journals, top_journals if None.
+            Journal names are compared without case and surrounding whitespace.
+    Outputs:
+        features_df (dataframe): one row per author with columns Author, Snapshot (latest date code), Year (of
+            that snapshot), n (articles), h, y (years since first article), j (distinct journals) and q
+            (articles in top journals).
+    '''
+    journals = top_journals if journals is None else journals
+    last_groups = np.array([last-1 for _, last in dataset.author_index.values()], dtype=np.int64)
+    groups = dataset.groups.iloc[last_groups]
+    starts, stops = groups['start'].to_numpy(), groups['stop'].to_numpy()
+    lengths = stops - starts
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    #Gather the rows of each author's latest snapshot into one contiguous array.
+    rows = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths) + np.repeat(starts, lengths)
+    block_ids = np.repeat(np.arange(len(groups)), lengths)
+    table = dataset.table.iloc[rows]
+
+    snapshot_years = groups['Snapshot'].str[:4].astype(float).to_numpy()
+    years = table['Year'].to_numpy(dtype=np.float64)
+    first_years = np.fmin.reduceat(years, offsets[:-1]) if len(groups) else np.array([])
+    h = metrics_batch(table['Citations'].to_numpy(dtype=np.float64), offsets)['h-index']
+    if 'Journal' in table.columns:
+        names = table['Journal'].astype(object).where(table['Journal'].notna(), '').astype(str).str.strip().str.lower()
+        codes, uniques = pd.factorize(names)
+        #Each distinct (author, journal) pair counts once; blank journal names are not counted.
+        named = (names != '').to_numpy()
+        pairs = np.unique(block_ids[named].astype(np.int64)*max(len(uniques), 1) + codes[named])
+        j = np.bincount(pairs//max(len(uniques), 1), minlength=len(groups))
+        top = names.isin([journal.strip().lower() for journal in journals]).to_numpy()
+        q = np.bincount(block_ids, weights=top, minlength=len(groups)).astype(np.int64)
+    else:
+        j = np.zeros(len(groups), dtype=np.int64)
+        q = np.zeros(len(groups), dtype=np.int64)
+
+    return pd.DataFrame({
+        'Author':groups['Author'].to_numpy(),
+        'Snapshot':groups['Snapshot'].to_numpy(),
+        'Year':snapshot_years.astype(int),
+        'n':lengths,
+        'h':h,
+        'y':np.nan_to_num(snapshot_years - first_years),
+        'j':j,
+        'q':q
+    })
+
+def aak_forecast_batch(features, years=10, coefficients=None):
+    '''
+    AAK-style regression forecast of the h-index for many authors at once. The features of all authors are one
+    matrix, so the h-index at every AAK horizon is a single matrix product, and the yearly values in between
+    are a second matrix product with fixed linear interpolation weights.
+
+    Inputs:
+        features (dataframe): output of forecast_features (columns n, h, y, j and q are used).
+        years (integer, default 10): number of years to forecast after the latest snapshot.
+        coefficients (dictionary, default None): horizon in years -> regression coefficients, aak_coefficients
+            if None.
+    Outputs:
+        forecast (numpy array): authors x (years+1) h-index values; column 0 is the current h-index.
+    '''
+    coefficients = aak_coefficients if coefficients is None else coefficients
+    horizons = sorted(coefficients.keys())
+    X = np.column_stack([
+        np.ones(len(features)),
+        np.sqrt(features['n'].to_numpy(dtype=np.float64)),
+        features['h'].to_numpy(dtype=np.float64),
+        features['y'].to_numpy(dtype=np.float64),
+        features['j'].to_numpy(dtype=np.float64),
+        features['q'].to_numpy(dtype=np.float64)
+    ])
+    C = np.array([coefficients[horizon] for horizon in horizons], dtype=np.float64).T
+    knots = np.column_stack([X[:, 2], X @ C])
+    #Linear interpolation weights from the knots (0 and each horizon) to every year, beyond the last horizon flat.
+    knot_years = np.array([0] + horizons, dtype=np.float64)
+    weights = np.zeros((len(knot_years), years+1))
+    for k in range(years+1):
+        position = np.interp(k, knot_years, np.arange(len(knot_years)))
+        low = int(np.floor(position))
+        high = min(low+1, len(knot_years)-1)
+        weights[low, k] += 1 - (position - low)
+        weights[high, k] += position - low
+    return knots @ weights
 
-def get_publication_data(file):
-    pubs_dict = pd.read_excel(file, sheet_name=None)
-    pubs_snapshot_list = list(pubs_dict.keys())
-    print('Your available publication snapshot dates are: ', pubs_snapshot_list)
+def growth_forecast_batch(dataset, years=10):
+    '''
+    Simple growth-model forecast for many authors at once: a least-squares line of h-index on time is fitted to
+    every author's snapshots (from grouped sums, without a loop over authors), and the h-index grows from its 
+    latest value at the fitted rate. Authors with a single snapshot grow at their m-quotient instead. The rate 
+    is never negative.
 
-    return pubs_dict, pubs_snapshot_list
+    Inputs:
+        dataset (PublicationDataset): snapshots of one or more authors.
+        years (integer, default 10): number of years to forecast after the latest snapshot.
+    Outputs:
+        forecast (numpy array): authors x (years+1) h-index values; column 0 is the current h-index.
+    '''
+    metrics_df = dataset.metrics_table()
+    codes, _ = pd.factorize(metrics_df['Author'], sort=True)
+    n_authors = len(dataset.author_index)
+    t = (metrics_df['Date'] - pd.Timestamp('2000-01-01')).dt.days.to_numpy()/365.25
+    h = metrics_df['h-index'].to_numpy(dtype=np.float64)
+    n_points = np.bincount(codes, minlength=n_authors).astype(np.float64)
+    sum_t = np.bincount(codes, weights=t, minlength=n_authors)
+    sum_h = np.bincount(codes, weights=h, minlength=n_authors)
+    sum_tt = np.bincount(codes, weights=t*t, minlength=n_authors)
+    sum_th = np.bincount(codes, weights=t*h, minlength=n_authors)
+    denominator = n_points*sum_tt - sum_t**2
+    last = np.array([last-1 for _, last in dataset.author_index.values()], dtype=np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(denominator > 1e-12, (n_points*sum_th - sum_t*sum_h)/denominator, metrics_df['m-quotient'].to_numpy()[last])
+    rate = np.clip(np.nan_to_num(rate), 0, None)
+    return h[last][:, np.newaxis] + rate[:, np.newaxis]*np.arange(years+1)
 
+def forecast_batch(dataset, method='aak', years=10, journals=None):
+    '''
+    Forecasts the h-index of every author in a PublicationDataset.
 
-def calculate_H_index(data):
+    Inputs:
+        dataset (PublicationDataset): snapshots of one or more authors.
+        method (string, 'aak' or 'growth'): the AAK regression (aak_forecast_batch) or the growth model
+            (growth_forecast_batch).
+        years (integer, default 10): number of years to forecast after each author's latest snapshot.
+        journals (list of strings, default None): top journals for the AAK model, top_journals if None.
+    Outputs:
+        forecast_df (dataframe): long table with columns Author, Year and h-index, starting at the year of each
+            author's latest snapshot.
     '''
-    Calculates the H-index as defined by the intersection of the 1:1 line between citations and number of publications
-    and the rank of publicaitons ordered in decreasing number of citations. That means that publication 1 has 
-    the most citations and publication n has the least. 
+    features = forecast_features(dataset, journals=journals)
+    if method == 'aak':
+        forecast = aak_forecast_batch(features, years=years)
+    elif method == 'growth':
+        forecast = growth_forecast_batch(dataset, years=years)
+    else:
+        raise ValueError('method must be aak or growth, not '+repr(method))
+    return pd.DataFrame({
+        'Author':np.repeat(features['Author'].to_numpy(), years+1),
+        'Year':(features['Year'].to_numpy()[:, np.newaxis] + np.arange(years+1)).ravel(),
+        'h-index':forecast.ravel()
+    })
+
+def forecast_h_index(pubs_dict, method='aak', years=10, journals=None, snapshot=None):
+    '''
+    Forecasts the h-index of one author directly from their snapshot data, replacing a hand-made prediction
+    csv such as Rosenheim_AAK_forecast_2013.csv. The output can be passed to h_index_time_series as prediction.
 
     Inputs:
-        data (dataframe)
-            One sheet from the excel spreadsheet containing the historical Google scholar Hirsch plot data.
-    
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        method (string, 'aak' or 'growth'): see forecast_batch.
+        years (integer, default 10): number of years to forecast.
+        journals (list of strings, default None): top journals for the AAK model, top_journals if None.
+        snapshot (string, YYYYMMDD, default None): forecast from this snapshot (and the ones before it) instead 
+            of the latest one, e.g. to compare an old forecast with what happened since.
     Outputs:
-        h (integer)
-            This is the H-index calculated using the standard method.
-        sorted_data (dataframe)
-            Same as data input, however it is sorted on 'Citations' in descending order. It is useful to return
-            this variable for use in the plot_Hirsch function.
+        prediction_df (dataframe): columns Year and h-index, the same shape as the prediction csv.
     '''
-    #Sort data - spreadsheet should contain sorted data, but this is just in case.
-    sorted_data = data.sort_values(by='Citations', ascending=False, ignore_index=True)
-    ctr = 1
-    for datum in sorted_data.iterrows():
-        if  ctr <= datum[1]['Citations']:
-            h = ctr
-            ctr += 1
-        else:
-            break
+    keys = [key for key in pubs_dict.keys() if (snapshot is None) or (key <= snapshot)]
+    dataset = PublicationDataset.from_pubs_dicts({'author':{key:pubs_dict[key] for key in keys}})
+    forecast_df = forecast_batch(dataset, method=method, years=years, journals=journals)
+    return forecast_df[['Year', 'h-index']].reset_index(drop=True)
 
-    return h, sorted_data
 
-def h_index_time_series(pubs_dict, prediction=None):
+def normalize_title(title):
     '''
-    This function generates a time series by calculating the h-index from every dataframe in the pubs_dict, a dictionary
-    in which each value is a dataframe of publication information from your publication snapshot. 
+    Normalizes a publication title for matching across snapshots: accents are stripped, everything is lower 
+    case, and punctuation and repeated whitespace are removed.
+    '''
+    if not isinstance(title, str):
+        return ''
+    title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', title.lower()).split())
+
+#Words left out of the loose title key, so that titles differing only in them still match
+title_stop_words = {'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'of', 'on', 'or', 'the', 'to', 'with'}
+
+def title_keys(title):
+    '''
+    Returns the exact and the loose hash key of a title. The exact key hashes the normalized title. The loose
+    key hashes the sorted set of its words other than title_stop_words, so it also matches near-duplicate 
+    titles that differ in word order, articles and prepositions, or punctuation (e.g. Google scholar changing a
+    subtitle separator). Numbers and other short words are kept, so "Part 1" and "Part 2" stay apart. Empty 
+    or missing titles have no keys (None, None), since they cannot identify a paper.
+    '''
+    normalized = normalize_title(title)
+    if not normalized:
+        return None, None
+    words = sorted(set(word for word in normalized.split() if word not in title_stop_words))
+    exact = hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+    loose = hashlib.blake2b(' '.join(words).encode(), digest_size=8).hexdigest()
+    return exact, loose
+
+
+class PublicationIndex:
+    '''
+    Tracks each publication across the snapshots of one author and indexes its citation trajectory. Every
+    title is matched by its normalized-title hash, then by a loose hash of its words (see title_keys), and 
+    finally, only for the few titles still unmatched, by fuzzy comparison with papers of a similar year that
+    were not yet seen in that snapshot. Matching goes through dictionary lookups, so building the index is
+    near-linear in publications x snapshots.
 
     Inputs:
-        pubs_dict (dictionary of dataframes)
-            The dictionary output from get_publication_data. Each key is the date code (str, YYYYMMDD) of the publication and 
-            citation snapshot from each sheet in your excel workbook, and the values are the DataFrames loaded from those
-            corresponding sheets.
-        prediction (string)
-            file name (including directory) of any file that you have h-index predictive data in. The
-            prediction calculator I used in 2013, Acuna, Allesino, and Kording 2012 (Nature) no longer
-            seems to exist except in someone's R code. I may try to reproduce it here in the future, 
-            but there may be other ways to find a predictor and hence I leave this option as a keyword
-            argument. You need not enter this argument - the routine will still work. Columns must be
-            Year | h-index spelled as such, and file must be .csv. Extra columns simply won't be analyzed.
-            Obviously, the best way to use this feature is to rename my example file and enter your data.
-            Also, data can be fictitious - i.e. based on your hopes and goals. 
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        similarity (float, default 0.9): minimum difflib ratio of two normalized titles for the fuzzy fallback.
 
-    Outputs:
-        ts_df (dataframe) 
-            This is the DataFrame of the time series. It contains two columns, Date and h-index.
-            Date is in pandas datetime format, converted from the datecode (YYYYMMDD) from each
-            tab in your snapshot spreadsheet.
+    Attributes:
+        snapshots (list of strings): date codes in chronological order.
+        papers (dataframe): one row per paper id with its latest Title and Year.
+        trajectories (dataframe): citations of each paper id (rows) at each snapshot (columns), NaN where the 
+            paper was not in the snapshot.
+        row_ids (dictionary): date code -> array of paper ids aligned with the rows of that sheet.
+    '''
+
+    def __init__(self, pubs_dict, similarity=0.9):
+        self.similarity = similarity
+        self.snapshots = sorted(pubs_dict.keys())
+        self.exact_keys = {}
+        self.loose_keys = {}
+        titles, years = [], []
+        self.row_ids = {}
+        long_ids, long_snaps, long_citations = [], [], []
+
+        for column, snap in enumerate(self.snapshots):
+            data = pubs_dict[snap]
+            ids = np.empty(len(data), dtype=np.int64)
+            seen = set()
+            unmatched = []
+            for row, (title, year) in enumerate(zip(data['Title'], data['Year'])):
+                exact, loose = title_keys(title)
+                if exact is None:
+                    #An untitled row cannot be matched to anything, so it is always a paper of its own
+                    ids[row] = len(titles)
+                    seen.add(ids[row])
+                    titles.append(title)
+                    years.append(year)
+                    continue
+                paper = self.exact_keys.get(exact)
+                if paper is None or paper in seen:
+                    paper = self.loose_keys.get(loose)
+                if paper is None or paper in seen:
+                    unmatched.append((row, title, year, exact, loose))
+                    continue
+                ids[row] = paper
+                seen.add(paper)
+                self.exact_keys.setdefault(exact, paper)
+                self.loose_keys.setdefault(loose, paper)
+                titles[paper], years[paper] = title, year
+
+            #Fuzzy fallback, only against papers of a similar year that are not already in this snapshot.
+            for row, title, year, exact, loose in unmatched:
+                paper = self.fuzzy_match(title, year, titles, years, seen)
+                if paper is None:
+                    paper = len(titles)
+                    titles.append(title)
+                    years.append(year)
+                ids[row] = paper
+                seen.add(paper)
+                self.exact_keys.setdefault(exact, paper)
+                self.loose_keys.setdefault(loose, paper)
+                titles[paper], years[paper] = title, year
+
+            self.row_ids[snap] = ids
+            long_ids.append(ids)
+            long_snaps.append(np.full(len(ids), column))
+            long_citations.append(data['Citations'].to_numpy(dtype=np.float64))
+
+        matrix = np.full((len(titles), len(self.snapshots)), np.nan)
+        if long_ids:
+            matrix[np.concatenate(long_ids), np.concatenate(long_snaps)] = np.concatenate(long_citations)
+        self.papers = pd.DataFrame({'Title':titles, 'Year':years})
+        self.trajectories = pd.DataFrame(matrix, columns=self.snapshots)
+        self._velocity = None
 
+    def fuzzy_match(self, title, year, titles, years, seen):
+        normalized = normalize_title(title)
+        best, best_ratio = None, self.similarity
+        for paper, (other, other_year) in enumerate(zip(titles, years)):
+            if paper in seen:
+                continue
+            if pd.notna(year) and pd.notna(other_year) and abs(year - other_year) > 1:
+                continue
+            other = normalize_title(other)
+            if not other:   #Untitled papers never match
+                continue
+            ratio = difflib.SequenceMatcher(None, normalized, other).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = paper, ratio
+        return best
+
+    def lookup(self, titles):
+        '''
+        Returns the paper id of each title (-1 for titles that are not in the index).
+        '''
+        ids = []
+        for title in titles:
+            exact, loose = title_keys(title)
+            ids.append(self.exact_keys.get(exact, self.loose_keys.get(loose, -1)) if exact is not None else -1)
+        return np.asarray(ids, dtype=np.int64)
+
+    def velocity(self):
+        '''
+        Computes the measured citation velocity (citations per year) of every paper at every snapshot, from the
+        change in its citations since the previous snapshot in which it appeared. A paper's first appearance 
+        has no previous snapshot, so its velocity there is its lifetime average, citations/(years since 
+        publication + 1), the same rate that plot_Hirsch uses by default. The matrix is computed on the first 
+        call and reused afterwards, since the index does not change once built.
+
+        Outputs:
+            velocity_df (dataframe): same shape as trajectories.
+        '''
+        if self._velocity is None:
+            self._velocity = self.velocity_matrix()
+        return self._velocity.copy()
+
+    def velocity_matrix(self):
+        matrix = self.trajectories.to_numpy()
+        if matrix.size == 0:
+            return self.trajectories.copy()
+        dates = pd.to_datetime(pd.Index(self.snapshots)).to_numpy().astype('datetime64[D]').astype(np.float64)
+        #Column of the previous appearance of each paper, carried forward across snapshots it was missing from.
+        present = ~np.isnan(matrix)
+        last_seen = np.where(present, np.arange(matrix.shape[1]), -1)
+        last_seen = np.maximum.accumulate(last_seen, axis=1)
+        previous = np.concatenate([np.full((matrix.shape[0], 1), -1), last_seen[:, :-1]], axis=1)
+        rows = np.arange(matrix.shape[0])[:, np.newaxis]
+        previous_citations = matrix[rows, np.clip(previous, 0, None)]
+        years_between = (dates - dates[np.clip(previous, 0, None)])/365.25
+
+        snapshot_years = np.array([int(snap[:4]) for snap in self.snapshots], dtype=np.float64)
+        age = np.clip(snapshot_years - self.papers['Year'].to_numpy(dtype=np.float64)[:, np.newaxis] + 1, 1, None)
+        lifetime = matrix/age
+        with np.errstate(divide='ignore', invalid='ignore'):
+            measured = (matrix - previous_citations)/years_between
+        velocity = np.where((previous >= 0) & (years_between > 0), measured, lifetime)
+        velocity[~present] = np.nan
+        return pd.DataFrame(velocity, columns=self.snapshots)
+
+    def velocity_for(self, data, snapshot):
+        '''
+        Returns the measured velocity of every row of data (a sheet or its sorted copy) at one snapshot, found 
+        through the title hash index. Rows that are not in the index get the lifetime average.
+        '''
+        if self._velocity is None:
+            self._velocity = self.velocity_matrix()
+        velocity = self._velocity
+        ids = self.lookup(data['Title'])
+        age = np.clip(int(snapshot[:4]) - data['Year'].to_numpy(dtype=np.float64) + 1, 1, None)
+        lifetime = data['Citations'].to_numpy(dtype=np.float64)/age
+        if snapshot not in velocity.columns:
+            return lifetime
+        values = velocity[snapshot].to_numpy()[np.clip(ids, 0, None)] if len(velocity) else np.full(len(ids), np.nan)
+        return np.where((ids >= 0) & ~np.isnan(values), values, lifetime)
+
+
+def frontier_batch(citations, offsets, rates=None, k_max=3):
     '''
+    What-if simulator of the h-index frontier of many snapshots in one call, over the ragged layout of 
+    h_index_batch. For each snapshot with index h and each k = 1..k_max, the target is h+k: the top h+k papers
+    all need at least h+k citations. The citations each paper still needs, and their minimum total, follow from
+    one segmented sort. With citation rates (citations per year of each paper), the projected time to reach 
+    h+k is when the (h+k)-th paper to get there does: the (h+k)-th smallest of need/rate in the snapshot.
 
-    #Determine how plotting will work depending on the inclusion of a prediciton or not. Default is 
-    #`Rosenheim_AAK_forecast_2013.csv` which works for my example data.
-    if prediction:
-        print('Including predictive data for comparison to snapshot data. Leave keyword argument out of function call if you do not want predictive data shown.')
-        line_style = 'None'
-        prediction_data = pd.read_csv(prediction)
-        legend_list = ['Google scholar data', 'Prediction']
-        years_datetime = pd.to_datetime(prediction_data['Year'], format='%Y')
-    else:
-        print('No predictive data entered, plotting only snapshot data.')
-        line_style = '-'
-        legend_list = ['Google scholar data']
-    #Create time series dataframe with dates and h-indices from each date, start with empty lists 
-    #for each column.
-    date_list = []
-    h_list = []
-    for k,v in pubs_dict.items():
-        h_temp, _ = calculate_H_index(v)
-        date_temp = pd.to_datetime(k)
-        date_list.append(date_temp)
-        h_list.append(h_temp)
+    Inputs:
+        citations (array-like of numbers): citation counts of all snapshots concatenated together.
+        offsets (array-like of integers): snapshot i is citations[offsets[i]:offsets[i+1]].
+        rates (array-like of numbers, default None): citations per year of each paper, aligned with citations.
+            Without rates no times are projected.
+        k_max (integer): how many steps above the current h to simulate.
+    Outputs:
+        summary (dictionary of numpy arrays): h (one per snapshot); needed, papers, new_papers and years 
+            (snapshots x k_max): minimum total citations to reach h+k, the number of papers that need any, the
+            number of papers missing when there are fewer than h+k (each counted as needing h+k citations), and
+            the projected years until h+k (inf if the rates never get there, NaN without rates).
+        need (numpy array): citations each paper needs to reach h+k (papers x k_max), in input order.
+        frontier (numpy array of booleans): papers x k_max, True where a paper is among the top h+k and still 
+            short of h+k citations, i.e. the papers closest to raising the h-index.
+    '''
+    citations = np.nan_to_num(np.asarray(citations, dtype=np.float64).ravel(), nan=0.0)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n_snapshots = lengths.size
+    snapshot_ids = np.repeat(np.arange(n_snapshots), lengths)
+    order = np.lexsort((-citations, snapshot_ids))
+    sorted_citations = citations[order]
+    ranks = np.arange(citations.size) - np.repeat(offsets[:-1], lengths) + 1
+    h = np.bincount(snapshot_ids, weights=sorted_citations >= ranks, minlength=n_snapshots).astype(np.int64)
 
-    ts_df = pd.DataFrame({'Date':date_list, 'h-index':h_list})
+    targets = h[:, np.newaxis] + np.arange(1, k_max+1)   #snapshots x k_max
+    paper_targets = targets[snapshot_ids]                 #sorted papers x k_max
+    shortfall = np.clip(paper_targets - sorted_citations[:, np.newaxis], 0, None)
+    in_top = ranks[:, np.newaxis] <= paper_targets
+    sorted_frontier = in_top & (shortfall > 0)
 
-    fig, ax = plt.subplots(nrows=1, ncols=1)
-    fig.patch.set_facecolor('white')
-    ax.plot(
-        ts_df['Date'],
-        ts_df['h-index'],
-        linestyle=line_style,
-        mfc='lightblue',
-        marker='d',
-        mec='k',
-        color='k',
-        markersize=15
-    )
+    new_papers = np.clip(targets - lengths[:, np.newaxis], 0, None)
+    needed = np.zeros((n_snapshots, k_max))
+    papers = np.zeros((n_snapshots, k_max), dtype=np.int64)
+    for k in range(k_max):
+        needed[:, k] = np.bincount(snapshot_ids, weights=np.where(in_top[:, k], shortfall[:, k], 0), minlength=n_snapshots)
+        papers[:, k] = np.bincount(snapshot_ids, weights=sorted_frontier[:, k], minlength=n_snapshots)
+    needed += new_papers*targets
 
-    #Add prediction if present:
-    if prediction:
-        ax.plot(
-            years_datetime,
-            prediction_data['h-index'],
-            linestyle='-',
-            color='k'            
-        )
+    years = np.full((n_snapshots, k_max), np.nan)
+    if rates is not None:
+        sorted_rates = np.nan_to_num(np.asarray(rates, dtype=np.float64).ravel()[order], nan=0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            times = np.where(shortfall == 0, 0.0, shortfall/np.where(sorted_rates > 0, sorted_rates, 0)[:, np.newaxis])
+        for k in range(k_max):
+            #The (h+k)-th smallest time of each snapshot, found by sorting times within each snapshot.
+            time_order = np.lexsort((times[:, k], snapshot_ids))
+            pick = offsets[:-1] + targets[:, k] - 1
+            reachable = targets[:, k] <= lengths
+            years[reachable, k] = times[time_order, k][pick[reachable]]
+            years[~reachable, k] = np.inf
 
-    ax.set(xlabel='Date', ylabel='h-index')
-    ax.xaxis.get_label().set_fontsize(16)
-    ax.yaxis.get_label().set_fontsize(16)
-    font = matplotlib.font_manager.FontProperties(
-        family='arial',
-        size=14        
-    )
-    
-    ax.legend(legend_list, prop=font)
+    need = np.empty_like(shortfall)
+    need[order] = shortfall
+    frontier = np.empty_like(sorted_frontier)
+    frontier[order] = sorted_frontier
+    summary = {'h':h, 'needed':needed, 'papers':papers, 'new_papers':new_papers, 'years':years}
+    return summary, need, frontier
 
-    return ts_df, ax
+def h_index_frontier(data, snapshot, k_max=3, velocity=None):
+    '''
+    Which papers are closest to raising the h-index of one snapshot, and what it would take. Paper citation 
+    rates are their lifetime average citations per year, or the measured velocities of a PublicationIndex.
+
+    Inputs:
+        data (dataframe): one snapshot sheet.
+        snapshot (string): its date code, YYYYMMDD, for the ages and projected dates.
+        k_max (integer): simulate h+1 to h+k_max.
+        velocity (PublicationIndex, default None): measured citation velocities, see PublicationIndex.
+    Outputs:
+        summary_df (dataframe): one row per step with Target (h+k), Citations needed, Papers needing 
+            citations, New papers (missing papers), Years and Projected date.
+        papers_df (dataframe): the frontier papers (those short of h+k_max among its top h+k_max), with
+            Title, Year, Citations, Rate and the citations needed for each target.
+    '''
+    h, sorted_data = calculate_H_index(data)
+    citations = sorted_data['Citations'].to_numpy(dtype=np.float64)
+    if velocity is not None:
+        rates = velocity.velocity_for(sorted_data, snapshot)
+    else:
+        rates = citations/np.clip(int(snapshot[:4]) - sorted_data['Year'].to_numpy(dtype=np.float64) + 1, 1, None)
+    summary, need, frontier = frontier_batch(citations, [0, len(citations)], rates=rates, k_max=k_max)
 
+    targets = summary['h'][0] + np.arange(1, k_max+1)
+    years = summary['years'][0]
+    snapshot_date = pd.to_datetime(snapshot, format='%Y%m%d')
+    summary_df = pd.DataFrame({
+        'Target':targets,
+        'Citations needed':summary['needed'][0].astype(np.int64),
+        'Papers':summary['papers'][0],
+        'New papers':summary['new_papers'][0],
+        'Years':years,
+        'Projected date':[(snapshot_date + pd.Timedelta(days=365.25*y)).normalize() if np.isfinite(y) else pd.NaT for y in years]
+    })
+    papers_df = sorted_data[['Title', 'Year', 'Citations']].assign(Rate=rates)
+    for k, target in enumerate(targets):
+        papers_df['Need h='+str(target)] = need[:, k].astype(np.int64)
+    papers_df = papers_df[frontier[:, -1]].reset_index(drop=True)
+    return summary_df, papers_df
 
-def plot_Hirsch(data, axis, year, cbar_limits, cmap='inferno'):
+
+def plot_Hirsch(data, axis, year, cbar_limits, cmap='inferno', velocity=None, max_bubbles=None):
     '''
     Plots individual Hirsch plot into defined matplotlib axis
 
@@ -176,29 +2331,110 @@ def plot_Hirsch(data, axis, year, cbar_limits, cmap='inferno'):
             is called in a loop with different years' data.
         cmap (colormap, default inferno)
             The color map of the Hirsch plot
+        velocity (PublicationIndex, default None)
+            If given, bubbles are sized by the measured citation velocity of each paper since the previous
+            snapshot instead of its lifetime average of citations per year.
+        max_bubbles (integer, default None)
+            Level of detail for very long publication lists. If the snapshot has more papers than this, only
+            the top ranks (at least max_bubbles, and always twice the h-index so the region around h is kept)
+            are drawn as individual bubbles. The long tail is binned into max_bubbles//4 rank bins, drawn as a
+            band between the lowest and highest citations of each bin and one square marker per bin colored 
+            by the mean publication year. Tail layers are rasterized inside vector outputs (pdf, svg). None 
+            draws every paper.
 
+    Outputs:
+        h (integer): the h-index of the snapshot, always computed from all papers.
+        hirsch_plot (PathCollection): the bubble scatter, for the colorbar.
     '''
-    h, sorted_data = calculate_H_index(data[year])
+    with span('calculate_H_index'):
+        h, sorted_data = calculate_H_index(data[year])
+    count('rows_plotted', len(sorted_data))
+    if max_bubbles is not None and len(sorted_data) > max_bubbles:
+        return h, plot_Hirsch_lod(sorted_data, h, axis, year, cbar_limits, cmap, velocity, max_bubbles)
     year_num = int(year[:4])
+    age = year_num-sorted_data['Year']+1
+    if velocity is not None:
+        sizes = 25*(np.clip(velocity.velocity_for(sorted_data, year), 0, None) + 5/age)
+    else:
+        sizes = 25*(sorted_data['Citations']+5)/age
     
-    hirsch_plot = axis.scatter(
-        sorted_data.index,
-        sorted_data['Citations'],
-        c=sorted_data['Year'],
-        cmap=cmap,
-        vmin=cbar_limits[0],
-        vmax=cbar_limits[1], 
-        s=25*(sorted_data['Citations']+5)/(year_num-sorted_data['Year']+1),
-        marker='o',
-        edgecolor='k'
-    )
+    with span('scatter'):
+        hirsch_plot = axis.scatter(
+            sorted_data.index,
+            sorted_data['Citations'],
+            c=sorted_data['Year'],
+            cmap=cmap,
+            vmin=cbar_limits[0],
+            vmax=cbar_limits[1], 
+            s=sizes,
+            marker='o',
+            edgecolor='k'
+        )
 
-    axis.plot(sorted_data.index, sorted_data.index, color='k')
+    axis.plot([0, len(sorted_data)-1], [0, len(sorted_data)-1], color='k')   #Only the ends of the 1:1 line are needed
     
     
 
     return h, hirsch_plot
 
+def plot_Hirsch_lod(sorted_data, h, axis, year, cbar_limits, cmap, velocity, max_bubbles):
+    '''
+    Level of detail drawing of plot_Hirsch for snapshots with more than max_bubbles papers: individual bubbles
+    for the top ranks and the region around the h-index, a binned band and markers for the long tail. 
+    Returns the bubble scatter.
+    '''
+    n = len(sorted_data)
+    keep = min(n, max(max_bubbles, 2*h + 1))
+    head = sorted_data.iloc[:keep]
+    age = int(year[:4])-head['Year']+1
+    if velocity is not None:
+        sizes = 25*(np.clip(velocity.velocity_for(head, year), 0, None) + 5/age)
+    else:
+        sizes = 25*(head['Citations']+5)/age
+    hirsch_plot = axis.scatter(head.index, head['Citations'], c=head['Year'], cmap=cmap, vmin=cbar_limits[0],
+                               vmax=cbar_limits[1], s=sizes, marker='o', edgecolor='k', rasterized=keep > 1000)
+
+    if keep < n:
+        citations = sorted_data['Citations'].to_numpy(dtype=np.float64)[keep:]
+        years = sorted_data['Year'].to_numpy(dtype=np.float64)[keep:]
+        n_bins = min(len(citations), max(1, max_bubbles//4))
+        starts = np.linspace(0, len(citations), n_bins+1).astype(np.int64)[:-1]
+        counts = np.diff(np.append(starts, len(citations)))
+        ranks = keep + starts + (counts-1)/2
+        low = np.minimum.reduceat(citations, starts)
+        high = np.maximum.reduceat(citations, starts)
+        mean_years = np.add.reduceat(years, starts)/counts
+        axis.fill_between(ranks, low, high, color='0.6', alpha=0.5, linewidth=0, rasterized=True)
+        axis.scatter(ranks, np.add.reduceat(citations, starts)/counts, c=mean_years, cmap=cmap, vmin=cbar_limits[0],
+                     vmax=cbar_limits[1], s=20, marker='s', edgecolor='none', rasterized=True)
+
+    axis.plot([0, n-1], [0, n-1], color='k')
+    return hirsch_plot
+
+def overlay_frontier(axis, data, year, k=1, color='tab:red'):
+    '''
+    Highlights the frontier papers of a Hirsch plot drawn by plot_Hirsch: the papers among the top h+k that 
+    are short of h+k citations get a ring, with a dashed line up to the h+k citation level they need.
+
+    Inputs:
+        axis (matplotlib axes): the axes of the Hirsch plot.
+        data (dictionary of dataframes): the pubs_dict given to plot_Hirsch.
+        year (string): the snapshot date code given to plot_Hirsch.
+        k (integer): highlight the papers needed for h+k.
+        color: color of the overlay.
+    '''
+    h, sorted_data = calculate_H_index(data[year])
+    citations = sorted_data['Citations'].to_numpy(dtype=np.float64)
+    _, need, frontier = frontier_batch(citations, [0, len(citations)], k_max=k)
+    ranks = np.flatnonzero(frontier[:, k-1])
+    target = h + k
+    axis.scatter(ranks, citations[ranks], s=120, facecolors='none', edgecolors=color, linewidths=1.5, zorder=3)
+    axis.vlines(ranks, citations[ranks], target, colors=color, linestyles='dashed', linewidth=1, zorder=3)
+    axis.hlines(target, -0.5, target-0.5, colors=color, linewidth=1, zorder=3)
+    axis.annotate('h = '+str(target)+': '+str(int(need[ranks, k-1].sum()))+' citations on '+str(len(ranks))+' papers',
+                  xy=(target-0.5, target), xytext=(5, 5), textcoords='offset points', color=color, fontsize=9)
+
+
 def limits_search(good_list, pubs_dict):
     '''
     This replaces axis_limits_search, which used the get_xlim and get_ylim functions AFTER generation of a subplot.
@@ -254,61 +2490,403 @@ def pub_year_colorbar_ticks(pub_year_lims):
     pub_year_range = max(pub_year_lims) - min(pub_year_lims)
     debug('Publication year range: ', pub_year_range)
 
-    if pub_year_range <= 6:
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))
-    if (pub_year_range > 6) and (pub_year_range <= 12):
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::2]
-    if (pub_year_range > 12) and (pub_year_range <= 24):
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::3]
-    if (pub_year_range > 24) and (pub_year_range <= 36):
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::4]
-    if (pub_year_range > 36) and (pub_year_range <= 50):
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::5]
-    if (pub_year_range > 50):
-        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::7]
+    if pub_year_range <= 6:
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))
+    if (pub_year_range > 6) and (pub_year_range <= 12):
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::2]
+    if (pub_year_range > 12) and (pub_year_range <= 24):
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::3]
+    if (pub_year_range > 24) and (pub_year_range <= 36):
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::4]
+    if (pub_year_range > 36) and (pub_year_range <= 50):
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::5]
+    if (pub_year_range > 50):
+        pub_year_list = list(range(pub_year_lims[0], pub_year_lims[1]))[::7]
+
+    return pub_year_list
+
+def determine_subplots(year_list, fig=None):
+    '''
+    This function determines the necessary alignment of subplots for plotting the data in a dictionary of publication
+    metric data. The routine simply takes the list of years to plot and determines the alignment of up to 
+    4 subplot panels. 
+
+        Inputs:
+            year_list (list): the list of years to be plotted. This starts as the list of keys from the pubs_dict
+                (output of get_publication_data), but is modified if a user specifies a different list of years
+                and/or if the list is over 4 in length. 
+            fig (matplotlib figure, default None): figure to add the axes to. If None, the axes are added to
+                pyplot's current figure.
+        Outputs:
+            axes (list): list of axes information for subplots. 
+
+    '''
+
+    #Location (row, column), rowspan and colspan of each panel on a 4x4 grid, by number of panels
+    layouts = {
+        1:[((0, 0), 4, 4)],
+        2:[((0, 0), 4, 2), ((0, 2), 4, 2)],
+        3:[((0, 0), 2, 2), ((0, 2), 2, 2), ((2, 1), 2, 2)],
+        4:[((0, 0), 2, 2), ((0, 2), 2, 2), ((2, 0), 2, 2), ((2, 2), 2, 2)]
+    }
+    aa = min(max(len(year_list), 1), 4)
+
+    axes = []
+    grid = fig.add_gridspec(4, 4) if fig is not None else None
+    for (row, col), rowspan, colspan in layouts[aa]:
+        if fig is None:
+            axes.append(plt.subplot2grid(shape=(4,4), loc=(row, col), rowspan=rowspan, colspan=colspan))
+        else:
+            axes.append(fig.add_subplot(grid[row:row+rowspan, col:col+colspan]))
+
+    return axes
+
+
+def select_snapshots(pubs_dict, year_list=None, log=debug):
+    '''
+    Chooses the snapshots of a panel plot: the requested ones that exist in pubs_dict, or all of them, pared
+    down to 4 roughly evenly spaced snapshots that include the latest one.
+
+    Outputs:
+        good_list (list of strings): the chosen date codes.
+        messages (list): three messages describing the choice, printed by Hirsch_panels_auto.
+    '''
+    #Check whether a list is given:
+    keys_list = list(pubs_dict.keys())
+    log('Years from the pubs_dict are: ', keys_list)
+    if year_list:
+        good_list = [snap for snap in year_list if snap in keys_list]
+        log('Using ', year_list, ' to search for compatible years in ', keys_list)
+        message0 = ['Year list is specified, pared down requested keys of pubs_dict to: ', good_list]
+        if len(good_list) < len(year_list):
+            message1 = ['Only found: ', good_list, ' in the publications data years uploaded.']
+        else:
+            message1 = 'Specified list matches publications data years.'
+    else:
+        good_list = keys_list
+        message0 = 'Working with list of years in original dataset...'
+        message1 = ''
+
+    #If the list is longer than 4, pare list to 4:
+    if len(good_list) > 4:
+        ind = int(np.ceil(len(good_list)/4))
+        good_list = good_list[::-ind][::-1]
+        message2 = ['List of years shortened to 4: ', good_list, ' to fit graph. Please specify 4 specific years as "year_list" if you wish to plot different years than this selection.']
+    else:
+        message2 = ''
+
+    return good_list, [message0, message1, message2]
+
+def draw_Hirsch_panels(fig, pubs_dict, good_list, color_map='plasma', velocity=None, config=None):
+    '''
+    Draws the Hirsch plot panels of the snapshots in good_list, with shared limits, one colorbar and a single 
+    set of axis labels, into the given figure. Every axes is created from and passed through fig explicitly,
+    so nothing depends on pyplot's current figure or axes.
+
+    Inputs:
+        fig (matplotlib figure): the figure to draw into.
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        good_list (list of strings): the date codes to plot (1 to 4), e.g. from select_snapshots.
+        color_map (string): colormap of the Hirsch plots.
+        velocity (PublicationIndex, default None): see plot_Hirsch.
+        config (RenderConfig, default None): fonts and debug switch of this call, the module level ones if None.
+    Outputs:
+        axes (list of matplotlib axes): the panel axes.
+    '''
+    log = config.log if config else debug
+    label_font = config.axis_label if config else axis_label_dict
+    h_font = config.h_index_annotation if config else h_index_annotation_dict
+    date_font = config.date_annotation if config else date_annotation_dict
+
+    axes = determine_subplots(good_list, fig=fig)
+    good_dict = {key:pubs_dict[key] for key in good_list}
+    log(good_dict.keys())
+    with span('limits_search'):
+        lims_dict, cbar_lims = limits_search(good_list, good_dict)
+    xlimits = lims_dict['x']
+    ylimits = lims_dict['y']
+    pub_year_list = pub_year_colorbar_ticks(cbar_lims)
+
+    #Now plot the years in the list:
+    for j, snap in enumerate(good_dict.keys()):
+        log(j, snap)
+        with span('plot_Hirsch', snapshot=snap):
+            h, hirsch = plot_Hirsch(good_dict, axes[j], snap, cbar_lims, cmap=color_map, velocity=velocity,
+                                    max_bubbles=config.max_bubbles if config else None)
+        axes[j].set_ylim(ylimits)
+        axes[j].set_xlim(xlimits)
+        axes[j].text(0.3*max(xlimits), 0.75*max(ylimits),'H-index = '+str(h)+',\n ', fontdict=h_font)
+        axes[j].text(0.3*max(xlimits), 0.65*max(ylimits), snap[4:6]+'/'+snap[6::]+'/'+snap[:4], fontdict=date_font)
+    with span('tight_layout'):
+        fig.tight_layout()  #Must do tightlayout prior to fitting big axes and color bar, or else the color bar prints over axes.
+
+    #Add big bounding axis for a single set of y- and x-labels:
+    big_ax = fig.add_subplot(111, frameon=False)
+    big_ax.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
+    big_ax.set_xlabel(xlabel='Publication rank, descending citations', fontdict=label_font)
+    big_ax.set_ylabel(ylabel='Citations', fontdict=label_font)
+
+    with span('colorbar'):
+        cbar = fig.colorbar(hirsch, ax=axes, shrink=0.95)
+        cbar.set_ticks(pub_year_list)
+        cbar.ax.set_ylabel(ylabel='Year published', fontdict=label_font)
+    fig.patch.set_facecolor('white')  
+
+    return axes
+
+def Hirsch_panels_figure(pubs_dict, year_list=None, config=None, velocity=None):
+    '''
+    Thread-safe version of Hirsch_panels_auto: draws the same panels on a new Figure with its own canvas (see
+    new_figure), without pyplot, without printing, and with all settings taken from config. Many figures can 
+    be rendered at the same time in a thread pool.
+
+    Inputs:
+        pubs_dict, year_list, velocity: see Hirsch_panels_auto.
+        config (RenderConfig, default None): settings of this call (colormap, size, fonts, debug).
+    Outputs:
+        fig (matplotlib figure): the figure, e.g. for figure_bytes or fig.savefig.
+    '''
+    config = config or RenderConfig()
+    good_list, messages = select_snapshots(pubs_dict, year_list, log=config.log)
+    config.log(*messages)
+    fig = new_figure(config)
+    draw_Hirsch_panels(fig, pubs_dict, good_list, color_map=config.color_map, velocity=velocity, config=config)
+    return fig
+
+def snapshot_limits(pubs_dict, snapshots):
+    '''
+    Shared axis and colorbar limits of many snapshots in one vectorized pass, the same limits that limits_search
+    and pub_year_limits find with a loop over the snapshots: x from -2 to the largest number of publications,
+    y from -20 to the largest citation count rounded up to the next 10, and the colorbar from the earliest to 
+    the latest publication year.
+
+    Outputs:
+        lims_dict (dictionary): 'x' and 'y' limits, as in limits_search.
+        cbar_limits (tuple): min and max publication years, as in pub_year_limits.
+    '''
+    if len(snapshots) == 0:
+        raise ValueError('No snapshots given; snapshot_limits needs at least one date code of pubs_dict')
+    sheets = [pubs_dict[snap] for snap in snapshots]
+    lengths = np.array([len(sheet) for sheet in sheets])
+    citations = np.concatenate([sheet['Citations'].to_numpy(dtype=np.float64) for sheet in sheets])
+    years = np.concatenate([sheet['Year'].to_numpy(dtype=np.float64) for sheet in sheets])
+    lims_dict = {'x':[-2, int(lengths.max())], 'y':[-20, 10*(np.ceil(np.nanmax(citations)/10))]}
+    cbar_limits = (int(np.nanmin(years)), int(np.nanmax(years)))
+    return lims_dict, cbar_limits
+
+def draw_small_multiples(fig, pubs_dict, snapshots, ncols=None, color_map='plasma', velocity=None, config=None):
+    '''
+    Draws a grid of Hirsch plots, one panel per snapshot and any number of snapshots, into the given figure.
+    All panels share their x and y axes, so only the outer panels carry tick labels, and one colorbar serves
+    the whole grid. The shared limits come from snapshot_limits in a single pass. The layout is handled by
+    matplotlib's constrained layout, which stays readable at 50 panels.
+
+    Inputs:
+        fig (matplotlib figure): the figure to draw into.
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        snapshots (list of strings): date codes of the panels, in order.
+        ncols (integer, default None): number of columns, about the square root of the number of panels if None.
+        color_map (string): colormap of the Hirsch plots.
+        velocity (PublicationIndex, default None): see plot_Hirsch.
+        config (RenderConfig, default None): fonts of this call, the module font dictionaries if None.
+    Outputs:
+        axes (numpy array of matplotlib axes): the panel axes, row by row.
+        h (list of integers): the h-index of each snapshot.
+    '''
+    label_font = config.axis_label if config else axis_label_dict
+    n = len(snapshots)
+    if n == 0:
+        raise ValueError('No snapshots to draw')
+    ncols, nrows = small_multiples_grid(n, ncols)
+    fig.set_layout_engine('constrained')
+    axes = fig.subplots(nrows=nrows, ncols=ncols, sharex=True, sharey=True, squeeze=False).ravel()
+    lims_dict, cbar_limits = snapshot_limits(pubs_dict, snapshots)
+    annotation_size = max(6, 14 - 1.5*ncols)
+
+    h = []
+    for ax, snap in zip(axes, snapshots):
+        h_temp, hirsch = plot_Hirsch(pubs_dict, ax, snap, cbar_limits, cmap=color_map, velocity=velocity,
+                                     max_bubbles=config.max_bubbles if config else None)
+        h.append(h_temp)
+        ax.text(0.97, 0.95, 'h = '+str(h_temp)+'\n'+snap[4:6]+'/'+snap[6::]+'/'+snap[:4], transform=ax.transAxes,
+                ha='right', va='top', fontsize=annotation_size)
+        ax.tick_params(labelsize=annotation_size)
+    for ax in axes[n:]:
+        ax.set_visible(False)
+    axes[0].set_xlim(lims_dict['x'])
+    axes[0].set_ylim(lims_dict['y'])
+
+    fig.supxlabel('Publication rank, descending citations', **{'fontsize':label_font['fontsize'], 'fontfamily':label_font['fontfamily']})
+    fig.supylabel('Citations', **{'fontsize':label_font['fontsize'], 'fontfamily':label_font['fontfamily']})
+    cbar = fig.colorbar(hirsch, ax=axes[:n].tolist(), shrink=0.95)
+    cbar.set_ticks(pub_year_colorbar_ticks(cbar_limits))
+    cbar.ax.set_ylabel(ylabel='Year published', fontdict=label_font)
+    fig.patch.set_facecolor('white')
+    return axes[:n], h
+
+def small_multiples_grid(n, ncols=None):
+    '''
+    Columns and rows of a grid of n small multiples: about the square root of n columns unless ncols is given.
+    '''
+    ncols = ncols or int(np.ceil(np.sqrt(n)))
+    return ncols, int(np.ceil(n/ncols))
+
+def small_multiples_figure(pubs_dict, snapshots=None, ncols=None, panel_size=2.5, config=None, velocity=None):
+    '''
+    Thread-safe small-multiples figure of any number of snapshots (all of them by default), e.g. every annual
+    snapshot of a long career on one page. The figure grows with the grid, panel_size inches per panel.
+
+    Inputs:
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        snapshots (list of strings, default None): date codes to plot; those not in pubs_dict are skipped.
+        ncols (integer, default None): see draw_small_multiples.
+        panel_size (float): width and height of each panel in inches.
+        config (RenderConfig, default None): colormap, fonts and resolution; width and height are ignored.
+        velocity (PublicationIndex, default None): see plot_Hirsch.
+    Outputs:
+        fig (matplotlib figure): the figure.
+    '''
+    config = config or RenderConfig()
+    keys_list = list(pubs_dict.keys())
+    snapshots = keys_list if snapshots is None else [snap for snap in snapshots if snap in keys_list]
+    if not snapshots:
+        raise ValueError('None of the snapshots are in pubs_dict; nothing to plot')
+    ncols, nrows = small_multiples_grid(len(snapshots), ncols)
+    fig = new_figure(RenderConfig(width=panel_size*ncols + 1.5, height=panel_size*nrows + 0.8, dpi=config.dpi))
+    draw_small_multiples(fig, pubs_dict, snapshots, ncols=ncols, color_map=config.color_map, velocity=velocity, config=config)
+    return fig
+
+def Hirsch_small_multiples(pubs_dict, snapshots=None, ncols=None, color_map='plasma', panel_size=2.5, velocity=None, log=debug):
+    '''
+    Plots the Hirsch plots of any number of snapshots (all of them by default) as a grid of small multiples 
+    with shared axes and one colorbar, in a new pyplot figure. Unlike Hirsch_panels_auto, snapshots are not 
+    pared down to 4. The snapshots plotted are reported through log (e.g. log=print).
+
+    Outputs:
+        fig (matplotlib figure): the figure.
+        h (list of integers): the h-index of each plotted snapshot.
+    '''
+    keys_list = list(pubs_dict.keys())
+    snapshots = keys_list if snapshots is None else [snap for snap in snapshots if snap in keys_list]
+    if not snapshots:
+        raise ValueError('None of the snapshots are in pubs_dict; nothing to plot')
+    log('Plotting', len(snapshots), 'snapshots as small multiples: ', snapshots)
+    ncols, nrows = small_multiples_grid(len(snapshots), ncols)
+    fig = plt.figure(figsize=(panel_size*ncols + 1.5, panel_size*nrows + 0.8))
+    _, h = draw_small_multiples(fig, pubs_dict, snapshots, ncols=ncols, color_map=color_map, velocity=velocity)
+    return fig, h
 
-    return pub_year_list
+def Hirsch_frames(pubs_dict, snapshots, velocity=None):
+    '''
+    Precomputes everything an animation frame needs from each snapshot, once: the citation-sorted ranks and 
+    citations as scatter offsets, publication years for the colors, bubble sizes as in plot_Hirsch, and the 
+    h-index.
 
-def determine_subplots(year_list):
+    Outputs:
+        frames (list of dictionaries): one per snapshot, with keys snapshot, offsets, years, sizes and h.
     '''
-    This function determines the necessary alignment of subplots for plotting the data in a dictionary of publication
-    metric data. The routine simply takes the list of years to plot and determines the alignment of up to 
-    4 subplot panels. 
+    frames = []
+    for snap in snapshots:
+        h, sorted_data = calculate_H_index(pubs_dict[snap])
+        citations = sorted_data['Citations'].to_numpy(dtype=np.float64)
+        years = sorted_data['Year'].to_numpy(dtype=np.float64)
+        age = int(snap[:4]) - years + 1
+        if velocity is not None:
+            sizes = 25*(np.clip(velocity.velocity_for(sorted_data, snap), 0, None) + 5/age)
+        else:
+            sizes = 25*(citations+5)/age
+        frames.append({
+            'snapshot':snap,
+            'offsets':np.column_stack([np.arange(len(citations)), citations]),
+            'years':years,
+            'sizes':np.asarray(sizes, dtype=np.float64),
+            'h':h
+        })
+    return frames
 
-        Inputs:
-            year_list (list): the list of years to be plotted. This starts as the list of keys from the pubs_dict
-                (output of get_publication_data), but is modified if a user specifies a different list of years
-                and/or if the list is over 4 in length. 
-        Outputs:
-            axes (list): list of axes information for subplots. 
+def Hirsch_animation(pubs_dict, file, snapshots=None, fps=2, config=None, velocity=None):
+    '''
+    Animates an author's Hirsch plot through the snapshots (all of them by default) and writes it as an animated
+    GIF, or as a sequence of numbered frames when file is a folder. The figure, axes, scatter and colorbar are 
+    built and drawn once with limits that fit every snapshot; each frame restores that background and redraws only
+    the scatter (new offsets, sizes and colors), the identity line and the annotations, so a 100-frame animation 
+    of 1000 papers takes seconds.
 
+    Inputs:
+        pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+        file (string): .gif file to write, or a folder for the frames (written as png with Pillow, which 
+            matplotlib installs).
+        snapshots (list of strings, default None): date codes of the frames; those not in pubs_dict are skipped.
+        fps (float): frames per second of the GIF.
+        config (RenderConfig, default None): colormap, size, resolution and fonts. Progress messages are
+            printed only with config.debug.
+        velocity (PublicationIndex, default None): see plot_Hirsch.
+    Outputs:
+        files (list of strings): the GIF, or the frame files in order.
     '''
+    config = config or RenderConfig()
+    keys_list = list(pubs_dict.keys())
+    snapshots = keys_list if snapshots is None else [snap for snap in snapshots if snap in keys_list]
+    frames = Hirsch_frames(pubs_dict, snapshots, velocity=velocity)
+    lims_dict, cbar_limits = snapshot_limits(pubs_dict, snapshots)
 
-    aa = len(year_list)
-
-    if aa <= 1:
-        ax1 = plt.subplot2grid(shape=(4,4), loc=(0, 0), colspan=4, rowspan=4)
-        axes = [ax1]
-    elif aa == 2:
-        ax1 = plt.subplot2grid(shape=(4,4), loc=(0, 0), colspan=2, rowspan=4)
-        ax2 = plt.subplot2grid(shape=(4,4), loc=(0, 2), colspan=2, rowspan=4)
-        axes = [ax1, ax2]
-    elif aa == 3:
-        ax1 = plt.subplot2grid(shape=(4,4), loc=(0, 0), rowspan=2, colspan=2 )
-        ax2 = plt.subplot2grid(shape=(4,4), loc=(0, 2), rowspan=2, colspan=2 )
-        ax3 = plt.subplot2grid(shape=(4,4), loc=(2, 1), rowspan=2, colspan=2 )
-        axes = [ax1, ax2, ax3]
-    elif aa >= 4:
-        ax1 = plt.subplot2grid(shape=(4,4), loc=(0, 0), colspan=2, rowspan=2)
-        ax2 = plt.subplot2grid(shape=(4,4), loc=(0, 2), colspan=2, rowspan=2)
-        ax3 = plt.subplot2grid(shape=(4,4), loc=(2, 0), colspan=2, rowspan=2)
-        ax4 = plt.subplot2grid(shape=(4,4), loc=(2, 2), colspan=2, rowspan=2)
-        axes = [ax1, ax2, ax3, ax4]
+    fig = new_figure(config)
+    ax = fig.add_subplot()
+    first = frames[0]
+    hirsch_plot = ax.scatter(first['offsets'][:, 0], first['offsets'][:, 1], c=first['years'], s=first['sizes'],
+                             cmap=config.color_map, vmin=cbar_limits[0], vmax=cbar_limits[1], marker='o', edgecolor='k')
+    identity, = ax.plot([0, len(first['years'])-1], [0, len(first['years'])-1], color='k')
+    ax.set_xlim(lims_dict['x'])
+    ax.set_ylim(lims_dict['y'])
+    ax.set_xlabel('Rank (Descending order of citations)', fontdict=config.axis_label)
+    ax.set_ylabel('Citations', fontdict=config.axis_label)
+    h_text = ax.text(0.5, 0.75, '', transform=ax.transAxes, fontdict=config.h_index_annotation)
+    date_text = ax.text(0.5, 0.65, '', transform=ax.transAxes, fontdict=config.date_annotation)
+    cbar = fig.colorbar(hirsch_plot, ax=ax, shrink=0.95)
+    cbar.set_ticks(pub_year_colorbar_ticks(cbar_limits))
+    cbar.ax.set_ylabel(ylabel='Year published', fontdict=config.axis_label)
+    fig.patch.set_facecolor('white')
 
-    return axes
+    #Draw the static parts (axes, ticks, labels, colorbar) once and keep the pixels; every frame restores them
+    #and draws only the artists that change.
+    animated = [hirsch_plot, identity, h_text, date_text]
+    for artist in animated:
+        artist.set_animated(True)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
 
+    from PIL import Image
+    images = []
+    for i, frame in enumerate(frames):
+        snap = frame['snapshot']
+        hirsch_plot.set_offsets(frame['offsets'])
+        hirsch_plot.set_sizes(frame['sizes'])
+        hirsch_plot.set_array(frame['years'])
+        identity.set_data([0, len(frame['years'])-1], [0, len(frame['years'])-1])
+        h_text.set_text('H-index = '+str(frame['h']))
+        date_text.set_text(snap[4:6]+'/'+snap[6::]+'/'+snap[:4])
+        fig.canvas.restore_region(background)
+        for artist in animated:
+            ax.draw_artist(artist)
+        images.append(Image.fromarray(np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()))
+        config.log('Animation frame', i+1, 'of', len(frames), snap)
+
+    if file.lower().endswith('.gif'):
+        #One palette for every frame, taken from the last (fullest) frame, which also holds the whole colorbar.
+        palette = images[-1].quantize(colors=256)
+        images = [image.quantize(palette=palette, dither=Image.Dither.NONE) for image in images]
+        images[0].save(file, save_all=True, append_images=images[1:], duration=int(1000/fps), loop=0)
+        files = [file]
+    else:
+        os.makedirs(file, exist_ok=True)
+        files = [os.path.join(file, 'frame_'+str(i).zfill(4)+'_'+frame['snapshot']+'.png') for i, frame in enumerate(frames)]
+        for image, frame_file in zip(images, files):
+            image.save(frame_file)
+    count('animation_frames', len(frames))
+    config.log('Wrote', len(frames), 'animation frames to', file)
+    return files
 
-def Hirsch_panels_auto(pubs_dict, year_list=None, color_map='plasma'):
+def Hirsch_panels_auto(pubs_dict, year_list=None, color_map='plasma', velocity=None):
     '''
     This function takes the loaded data from pubs_dict and constructs a panel plot with up to 4 panels. If there are 
     more than 4 years in the pubs_dict, then it selects a sub-list of 4 years, including the latest one, and roughly 
@@ -324,70 +2902,27 @@ def Hirsch_panels_auto(pubs_dict, year_list=None, color_map='plasma'):
                 to populate the panels with. The list is automatically checked to make sure that the entries match
                 the list of dictionary keys in pubs_dict. 
             color_map (string, python matplotlib colormaps): default: plasma. User can change color map if desired.
+            velocity (PublicationIndex, default None): if given, bubbles are sized by measured citation velocity
+                (see plot_Hirsch).
+
+        Outputs:
+            fig (matplotlib figure): the figure with all panels, e.g. to save or close it.
     
     '''
 
-    #Check whether a list is given:
-    keys_list = list(pubs_dict.keys())
-    debug('Years from the pubs_dict are: ', keys_list)
-    if year_list:
-        good_list = [snap for snap in year_list if snap in keys_list]
-        debug('Using ', year_list, ' to search for compatible years in ', keys_list)
-        message0 = ['Year list is specified, pared down requested keys of pubs_dict to: ', good_list]
-        if len(good_list) < len(year_list):
-            message1 = ['Only found: ', good_list, ' in the publications data years uploaded.']
-        else:
-            message1 = 'Specified list matches publications data years.'
-    else:
-        good_list = keys_list
-        message0 = 'Working with list of years in original dataset...'
-        message1 = ''
-
-    #If the list is longer than 4, pare list to 4:
-    if len(good_list) > 4:
-        ind = int(np.ceil(len(good_list)/4))
-        good_list = good_list[::-ind][::-1]
-        message2 = ['List of years shortened to 4: ', good_list, ' to fit graph. Please specify 4 specific years as "year_list" if you wish to plot different years than this selection.']
-    else:
-        message2 = ''
-
-    print(message0, '\n', message1, '\n', message2)
-
-    #Configure the axes and limits:
-    fig = plt.figure()
-    fig.set_figheight(6)
-    fig.set_figwidth(6)
-    axes = determine_subplots(good_list)
-    good_dict = {key:pubs_dict[key] for key in good_list}
-    debug(good_dict.keys())
-    lims_dict, cbar_lims = limits_search(good_list, good_dict)
-    xlimits = lims_dict['x']
-    ylimits = lims_dict['y']
-    pub_year_list = pub_year_colorbar_ticks(cbar_lims)
-
-    #Now plot the years in the list:
-    for j, snap in enumerate(good_dict.keys()):
-        debug(j, snap)
-        h, hirsch = plot_Hirsch(pubs_dict, axes[j], snap, pub_year_limits(pubs_dict, good_list), cmap=color_map)
-        axes[j].set_ylim(ylimits)
-        axes[j].set_xlim(xlimits)
-        axes[j].text(0.3*max(xlimits), 0.75*max(ylimits),'H-index = '+str(h)+',\n ', fontdict=h_index_annotation_dict)
-        axes[j].text(0.3*max(xlimits), 0.65*max(ylimits), snap[4:6]+'/'+snap[6::]+'/'+snap[:4], fontdict=date_annotation_dict)
-    plt.tight_layout()  #Must do tightlayout prior to fitting big axes and color bar, or else the color bar prints over axes.
-
-    #Add big bounding axis for a single set of y- and x-labels:
-    big_ax = fig.add_subplot(111, frameon=False)
-    plt.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
-    big_ax.set_xlabel(xlabel='Publication rank, descending citations', fontdict=axis_label_dict)
-    big_ax.set_ylabel(ylabel='Citations', fontdict=axis_label_dict)
-
-    cbar = fig.colorbar(hirsch, ax=axes, shrink=0.95)
-    year_list = [int(entry[:4]) for entry in good_list]
-    cbar.set_ticks(pub_year_list)
-    cbar.ax.set_ylabel(ylabel='Year published', fontdict=axis_label_dict)
-    fig.patch.set_facecolor('white')  
+    with span('Hirsch_panels_auto'):
+        with span('select_snapshots'):
+            good_list, messages = select_snapshots(pubs_dict, year_list)
+        print(messages[0], '\n', messages[1], '\n', messages[2])
 
+        #Configure the axes and limits:
+        fig = plt.figure()
+        fig.set_figheight(6)
+        fig.set_figwidth(6)
+        draw_Hirsch_panels(fig, pubs_dict, good_list, color_map=color_map, velocity=velocity)
+    count('figures_rendered')
 
+    return fig
 
 
 
@@ -470,7 +3005,7 @@ def quad_Hirsch_trim(fig, axs, pubs_dict, hirsch_plot, year, h, year_list):
     #Add big bounding axis for a single set of y- and x-labels:
 
     big_ax = fig.add_subplot(111, frameon=False)
-    plt.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
+    big_ax.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
     big_ax.set_xlabel(xlabel='Publication rank, descending citations', fontdict=axis_label_dict)
     big_ax.set_ylabel(ylabel='Citations', fontdict=axis_label_dict)
 
@@ -552,50 +3087,52 @@ def h_index_panels(pubs_dict, snapshots_list, color_map='inferno'):
     Inputs:
         snapshots_list: (list) a list containing at least one datecode lalbel from the excel 
             spreadsheet workbook. Function uses the size of this list to determine how 
-            many axes to create (1, 2, or 4) and decides which snapshots to plot if the list
-            contains a different number than 1, 2, or 4 snapshsot datecodes.
+            many axes to create: 1 and 4 snapshots get the single and quad plots, any other
+            number is plotted as a grid of small multiples (see draw_small_multiples).
         color_map (string): a python color map for plots
 
     Outputs:
-        fig: (pyplot figure handle): the figure handle in which all axes are plotted
-        axs: (pyplot axes handles): the axes handles for the panel axes
+        fig: (pyplot figure handle): the figure handle in which all axes are plotted. It is a pyplot figure, so
+            plt.show() and notebook inline display work as usual; Hirsch_panels_figure draws the same panels
+            without pyplot for threads and servers.
+        axs: (matplotlib axes): the axes handles for the panel axes
     '''
 
-    #Check if listed snapshots are in the keys of the pubs_dict; only work with those which are.
-    keys_list = pubs_dict.keys()
-    good_list = [snap for snap in snapshots_list if snap in keys_list]
-    debug('Good List = ', good_list)
-    cbar_limits = pub_year_limits(pubs_dict, good_list)
+    with span('h_index_panels', snapshots=len(snapshots_list)):
+        #Check if listed snapshots are in the keys of the pubs_dict; only work with those which are.
+        keys_list = pubs_dict.keys()
+        good_list = [snap for snap in snapshots_list if snap in keys_list]
+        debug('Good List = ', good_list)
+        with span('pub_year_limits'):
+            cbar_limits = pub_year_limits(pubs_dict, good_list) if good_list else None
     
-    #Plot bubble plots and print information messages depending on the length of snapshots_list
-    if len(good_list) == 1:
-        print('Plotting a single h-index bubble plot...')
-        print('Compatible snapshots: ', good_list)
-        #Create figure and axes for plot:
-        fig, axs = plt.subplots(nrows=1, ncols=1)
-        h, hirsch_plot = plot_Hirsch(pubs_dict, axs, snapshots_list[0], cbar_limits, cmap=color_map)
-        single_Hirsch_trim(fig, axs, hirsch_plot, snapshots_list[0], h)
-
-    if len(good_list) > 1:
-        print('Attempting to plot 4-panel h-index evolution bubble plot...')
-        if len(good_list) > 4:
-            print('Detected more than 4 snapshot years in your list. Plotting the first four...')
-            snaps = good_list[:4]
-            print('Compatible snapshots: ', snaps)
-            fig, axs, h = create_4panel_plot_trim(snaps, pubs_dict, snapshots_list, cbar_limits, color_map)
-        if len(good_list) < 4:
-            print('Detected fewer than 4 snapshot years in your snapshot list; plotting ONLY the first one...')
+        #Plot bubble plots and print information messages depending on the length of snapshots_list
+        if len(good_list) == 1:
+            print('Plotting a single h-index bubble plot...')
             print('Compatible snapshots: ', good_list)
+            #Create figure and axes for plot:
             fig, axs = plt.subplots(nrows=1, ncols=1)
             h, hirsch_plot = plot_Hirsch(pubs_dict, axs, snapshots_list[0], cbar_limits, cmap=color_map)
             single_Hirsch_trim(fig, axs, hirsch_plot, snapshots_list[0], h)
-        if len(good_list) == 4: #When there are 4 entries in snapshot list...
-            print('Exactly 4 snapshots in list, plotting 4-panel plot.')
-            print('Compatible snapshots: ', good_list)
-            snaps = good_list
-            fig, axs, h = create_4panel_plot_trim(snaps, pubs_dict, snapshots_list, cbar_limits, color_map)
-    if len(good_list) == 0:
-        print('List of citations snapshots is empty! Please fill the list, checking for transcription errors, and rerun code!')
+
+        if len(good_list) > 1:
+            print('Attempting to plot 4-panel h-index evolution bubble plot...')
+            if len(good_list) != 4:
+                print('Detected', len(good_list), 'snapshot years in your list. Plotting all of them as small multiples...')
+                print('Compatible snapshots: ', good_list)
+                ncols, nrows = small_multiples_grid(len(good_list))
+                fig = plt.figure(figsize=(2.5*ncols + 1.5, 2.5*nrows + 0.8))   #As small_multiples_figure
+                axs, h = draw_small_multiples(fig, pubs_dict, good_list, ncols=ncols, color_map=color_map)
+            if len(good_list) == 4: #When there are 4 entries in snapshot list...
+                print('Exactly 4 snapshots in list, plotting 4-panel plot.')
+                print('Compatible snapshots: ', good_list)
+                snaps = good_list
+                fig, axs, h = create_4panel_plot_trim(snaps, pubs_dict, snapshots_list, cbar_limits, color_map)
+        if len(good_list) == 0:
+            print('List of citations snapshots is empty! Please fill the list, checking for transcription errors, and rerun code!')
+            return None, None, None
+
+    count('figures_rendered')
 
     return fig, axs, h
 
@@ -603,7 +3140,7 @@ def create_4panel_plot_trim(snaps, pubs_dict, year_list, cbar_limits, color_map)
     fig, axs = plt.subplots(nrows=2, ncols=2)
     h, hirsch_plot = [], []
     for ind, snap in enumerate(snaps):
-        h_temp, hirsch_plot_temp = plot_Hirsch(pubs_dict, fig, axs.flatten()[ind], snap, cbar_limits, cmap=color_map)
+        h_temp, hirsch_plot_temp = plot_Hirsch(pubs_dict, axs.flatten()[ind], snap, cbar_limits, cmap=color_map)
         h.append(h_temp)
         hirsch_plot.append(hirsch_plot_temp)
     quad_Hirsch_trim(fig, axs, pubs_dict, hirsch_plot_temp, snaps, h, year_list)
@@ -635,3 +3172,1004 @@ def pub_year_limits(pubs_dict, year_list):
 
     pub_year_limits = (min(min_years), max(max_years))
     return pub_year_limits
+
+
+#Figures that render_author can produce, and the file name suffix of each
+render_kinds = {
+    'single':'Hirsch',
+    'panels':'Hirsch_panels',
+    'time_series':'h_index_time_series'
+}
+
+def safe_file_name(name):
+    '''
+    Replaces characters that are not safe in file names with underscores.
+    '''
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(name)).strip('_') or 'author'
+
+def render_worker_init():
+    '''
+    Initializes a render worker process: switches pyplot to the non-interactive Agg backend.
+    '''
+    plt.switch_backend('Agg')
+
+def render_author(author, source, output_dir, kinds=('single', 'panels', 'time_series'), formats=('png',), dpi=150, color_map='plasma',
+                  snapshots=None):
+    '''
+    Renders the figures of one author straight to files and closes every figure it opened, whatever happens,
+    so a long batch does not accumulate pyplot figures. Errors are caught and returned rather than raised, so
+    one bad workbook does not stop a batch.
+
+    Inputs:
+        author (string): name of the author, used in the file names.
+        source (string or dictionary): workbook file name, or a pubs_dict that is already loaded.
+        output_dir (string): directory the figures are written to.
+        kinds (tuple of strings): which figures to render, keys of render_kinds: 'single' (Hirsch plot of the
+            latest snapshot), 'panels' (Hirsch_panels_auto) and 'time_series' (h_index_time_series).
+        formats (tuple of strings): file formats, e.g. 'png', 'pdf', 'svg'.
+        dpi (integer): resolution of raster formats.
+        color_map (string): colormap of the Hirsch plots.
+        snapshots (list of strings, default None): date codes of the Hirsch panels (see Hirsch_panels_auto); the
+            single Hirsch plot shows the latest of them. None lets Hirsch_panels_auto choose.
+    Outputs:
+        records (list of dictionaries): one record per figure with author, kind, files, status ('ok' or 
+            'error'), error (message, or None) and seconds.
+    '''
+    records = []
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pubs_dict = get_publication_data(source, log=debug)[0] if isinstance(source, str) else source
+    except Exception as error:
+        message = type(error).__name__+': '+str(error)
+        return [{'author':author, 'kind':kind, 'files':[], 'status':'error', 'error':message,
+                 'seconds':time.perf_counter() - start} for kind in kinds]
+
+    for kind in kinds:
+        start = time.perf_counter()
+        fig = None
+        files = []
+        try:
+            config = RenderConfig(color_map=color_map, dpi=dpi)
+            if kind == 'single':
+                latest = [snap for snap in pubs_dict.keys() if snapshots is None or snap in snapshots][-1]
+                fig = Hirsch_panels_figure(pubs_dict, year_list=[latest], config=config)
+            elif kind == 'panels':
+                fig = Hirsch_panels_figure(pubs_dict, year_list=snapshots, config=config)
+            elif kind == 'time_series':
+                fig = time_series_figure(pubs_dict, config=config)[0]
+            else:
+                raise ValueError('Unknown figure kind '+repr(kind)+', choose from '+str(list(render_kinds)))
+            for fmt in formats:
+                file = os.path.join(output_dir, safe_file_name(author)+'_'+render_kinds[kind]+'.'+fmt)
+                fig.savefig(file, dpi=dpi, format=fmt)
+                files.append(file)
+            records.append({'author':author, 'kind':kind, 'files':files, 'status':'ok', 'error':None,
+                            'seconds':time.perf_counter() - start})
+        except Exception as error:
+            debug(traceback.format_exc())
+            records.append({'author':author, 'kind':kind, 'files':files, 'status':'error',
+                            'error':type(error).__name__+': '+str(error), 'seconds':time.perf_counter() - start})
+        finally:
+            #Figures from the object-oriented path are not held by pyplot; drop them and anything else left open.
+            fig = None
+            plt.close('all')
+    return records
+
+def render_batch(sources, output_dir, kinds=('single', 'panels', 'time_series'), formats=('png',), jobs=None,
+                 dpi=150, color_map='plasma', tasks_per_worker=50, snapshots=None, log=debug):
+    '''
+    Renders the Hirsch plot, the Hirsch panels and the h-index time series of many authors in a pool of worker 
+    processes, each drawing with the Agg backend and writing its figures straight to files (see render_author).
+    Workers are replaced after tasks_per_worker authors, so their memory stays bounded over a long batch. 
+    A failing workbook is reported in the returned table and does not stop the other authors, and the authors
+    caught in a crashed worker pool are rendered again in a fresh one (see below). Worker processes
+    are started fresh (spawn), so a script that calls this function must do so under if __name__ == '__main__':.
+
+    Inputs:
+        sources (dictionary or list): author name -> workbook file name (or pubs_dict), or a list of workbook 
+            file names, in which case the file name without extension is the author name.
+        output_dir (string): directory the figures are written to. It is created if it does not exist.
+        kinds, formats, dpi, color_map, snapshots: see render_author.
+        jobs (integer, default None): number of worker processes, the number of CPUs if None. With jobs=1 the 
+            authors are rendered one after another in this process.
+        tasks_per_worker (integer, default 50): authors rendered by a worker process before it is replaced.
+        log (function, default debug): receives the number of figures rendered and the failed authors.
+    Outputs:
+        results_df (dataframe): one row per author and figure kind with columns author, kind, files, status,
+            error and seconds.
+    '''
+    import concurrent.futures
+    import multiprocessing
+
+    if not isinstance(sources, dict):
+        sources = {os.path.splitext(os.path.basename(source))[0]:source for source in sources}
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    records = []
+
+    if jobs == 1:
+        backend = matplotlib.get_backend()
+        render_worker_init()
+        try:
+            for author, source in sources.items():
+                records.extend(render_author(author, source, output_dir, kinds, formats, dpi, color_map, snapshots))
+        finally:
+            plt.switch_backend(backend)
+    else:
+        pool_options = {'max_workers':jobs, 'initializer':render_worker_init}
+        if tasks_per_worker:
+            pool_options |= {'mp_context':multiprocessing.get_context('spawn'), 'max_tasks_per_child':tasks_per_worker}
+        def failure(author, error):
+            return [{'author':author, 'kind':kind, 'files':[], 'status':'error', 'error':type(error).__name__+': '+str(error),
+                     'seconds':np.nan} for kind in kinds]
+
+        def run_round(authors, workers):
+            crashed = {}
+            with concurrent.futures.ProcessPoolExecutor(**(pool_options | {'max_workers':workers})) as pool:
+                futures = {pool.submit(render_author, author, sources[author], output_dir, kinds, formats, dpi, color_map, snapshots):author
+                           for author in authors}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        records.extend(future.result())
+                    except concurrent.futures.process.BrokenProcessPool as error:
+                        crashed[futures[future]] = error
+                    except Exception as error:
+                        records.extend(failure(futures[future], error))
+            return crashed
+
+        #A worker that dies (e.g. out of memory) breaks the whole pool, and every author still pending fails with
+        #it. Those authors are rendered again in a fresh pool. When a round renders none of them, they are tried
+        #one at a time until the author that crashes the worker is found; it is reported and the rest go back to
+        #a full pool.
+        pending, workers = list(sources), jobs
+        while pending:
+            crashed = run_round(pending[:1] if workers == 1 else pending, workers)
+            if workers == 1:
+                if pending[0] in crashed:
+                    records.extend(failure(pending[0], crashed[pending[0]]))
+                    workers = jobs
+                pending = pending[1:]
+            else:
+                if len(crashed) == len(pending):
+                    workers = 1
+                pending = [author for author in pending if author in crashed]
+
+    results_df = pd.DataFrame.from_records(records, columns=['author', 'kind', 'files', 'status', 'error', 'seconds'])
+    order = {author:j for j, author in enumerate(sources)}
+    results_df = results_df.sort_values('author', key=lambda authors: authors.map(order), kind='stable', ignore_index=True)
+    failed = results_df.loc[results_df['status'] == 'error', 'author'].unique()
+    log('Rendered', int((results_df['status'] == 'ok').sum()), 'figures for', len(sources), 'authors.',
+          'Failed authors: '+str(list(failed)) if len(failed) else 'No failures.')
+    return results_df
+
+
+def report_pages(author, pubs_dict, config=None):
+    '''
+    Yields the report pages of one author, one figure at a time: the h-index time series (time_series_figure) 
+    and the Hirsch panels (Hirsch_panels_figure, the same snapshots Hirsch_panels_auto picks), each titled with
+    the author's name. Figures are built on the object-oriented path, so a page is freed as soon as the caller
+    drops it.
+    '''
+    config = config or RenderConfig()
+    fig = time_series_figure(pubs_dict, config=config)[0]
+    fig.suptitle(author, fontsize=config.axis_label['fontsize'])
+    yield fig
+    fig = Hirsch_panels_figure(pubs_dict, config=config)
+    fig.suptitle(author, fontsize=config.axis_label['fontsize'])
+    yield fig
+
+def write_report_pages(sources, file, config=None):
+    '''
+    Writes the report pages of every author in sources into one pdf, loading one author at a time and writing 
+    each page as soon as it is drawn, so memory does not grow with the number of authors. Authors that fail 
+    are left out of the pdf and reported.
+
+    Outputs:
+        records (list of dictionaries): one record per author with author, pages, status, error and seconds.
+    '''
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    records = []
+    with PdfPages(file, metadata={'Title':'PubPy h-index report', 'Creator':'PubPy'}) as pdf:
+        for author, source in sources.items():
+            start = time.perf_counter()
+            pages = 0
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    pubs_dict = get_publication_data(source, log=debug)[0] if isinstance(source, str) else source
+                    for fig in report_pages(author, pubs_dict, config=config):
+                        #The pdf backend keeps each rasterized layer as a view of a full page of pixels until the
+                        #file is closed. Every page has a colorbar strip, so memory would grow with every page;
+                        #the strip is drawn as vectors instead. The binned tail of large portfolios (see 
+                        #plot_Hirsch_lod) stays rasterized, as that is what keeps those pages small.
+                        for ax in fig.axes:
+                            if getattr(ax, '_colorbar', None) is not None:
+                                for collection in ax.collections:
+                                    collection.set_rasterized(False)
+                        pdf.savefig(fig)
+                        pages += 1
+                        fig = None
+                records.append({'author':author, 'pages':pages, 'status':'ok', 'error':None,
+                                'seconds':time.perf_counter() - start})
+            except Exception as error:
+                debug(traceback.format_exc())
+                records.append({'author':author, 'pages':pages, 'status':'error',
+                                'error':type(error).__name__+': '+str(error), 'seconds':time.perf_counter() - start})
+            finally:
+                pubs_dict = None
+    return records
+
+def merge_pdfs(files, file):
+    '''
+    Concatenates pdf files into one with pypdf. Returns False, leaving the files in place, if pypdf is not 
+    installed.
+    '''
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        return False
+    writer = PdfWriter()
+    for part in files:
+        writer.append(part)
+    with open(file, 'wb') as f:
+        writer.write(f)
+    return True
+
+def h_index_report(sources, file, shards=1, color_map='plasma', dpi=100, log=debug):
+    '''
+    Writes a multi-page pdf report of a whole department: for each author a page with the h-index time series 
+    and a page with the Hirsch panels. Pages are streamed into the pdf with PdfPages and each author's workbook 
+    is loaded only when its pages are drawn, so peak memory stays flat whatever the number of authors.
+
+    With shards > 1, the authors are split into that many consecutive groups, each written to its own pdf by
+    a worker process, and the parts are merged into file in author order. Merging needs pypdf; without it 
+    the parts are kept next to file (file.part1.pdf, ...) and a warning says so. A shard whose worker crashes is
+    retried once alone; if it crashes again its authors are reported as failed and the report is written from
+    the other shards. Worker processes are started
+    fresh (spawn), so a script that shards must call this function under if __name__ == '__main__':.
+
+    Inputs:
+        sources (dictionary or list): author name -> workbook file name (or pubs_dict), or a list of workbook 
+            file names, in which case the file name without extension is the author name (as in render_batch).
+        file (string): the pdf to write.
+        shards (integer, default 1): number of worker processes.
+        color_map (string): colormap of the Hirsch plots.
+        dpi (integer): resolution of the rasterized parts of the pages.
+        log (function, default debug): receives the number of pages written and the failed authors.
+    Outputs:
+        results_df (dataframe): one row per author with columns author, pages, status, error and seconds.
+    '''
+    if not isinstance(sources, dict):
+        sources = {os.path.splitext(os.path.basename(source))[0]:source for source in sources}
+    config = RenderConfig(color_map=color_map, dpi=dpi)
+    authors = list(sources)
+    shards = max(1, min(shards, len(authors)))
+    destination = file
+
+    if shards == 1:
+        records = write_report_pages(sources, file, config=config)
+    else:
+        import concurrent.futures
+        import multiprocessing
+
+        groups = [authors[bounds[0]:bounds[-1]+1] for bounds in np.array_split(np.arange(len(authors)), shards)]
+        parts = [os.path.splitext(file)[0]+'.part'+str(j+1)+'.pdf' for j in range(shards)]
+        def run_shards(indices, workers):
+            results, failures = {}, {}
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=render_worker_init,
+                                                        mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {j:pool.submit(write_report_pages, {author:sources[author] for author in groups[j]}, parts[j], config)
+                           for j in indices}
+                for j, future in futures.items():
+                    try:
+                        results[j] = future.result()
+                    except Exception as error:
+                        failures[j] = error
+            return results, failures
+
+        results, failures = run_shards(range(shards), shards)
+        #A crashed worker (e.g. killed for memory) breaks the whole pool and fails every shard still running in
+        #it. Each failed shard is retried alone in a fresh worker, so only a shard that fails again is reported.
+        for j in sorted(failures):
+            retried, failed = run_shards([j], 1)
+            results |= retried
+            failures |= failed
+            if j in retried:
+                del failures[j]
+        records, written = [], []
+        for j in range(shards):
+            if j in results:
+                records.extend(results[j])
+                written.append(parts[j])
+            else:
+                records.extend({'author':author, 'pages':0, 'status':'error', 'seconds':0.0,
+                                'error':'report shard failed: '+type(failures[j]).__name__+': '+str(failures[j])} for author in groups[j])
+                if os.path.exists(parts[j]):
+                    os.remove(parts[j])
+        if not written:
+            destination = 'no file'
+        elif merge_pdfs(written, file):
+            for part in written:
+                os.remove(part)
+        else:
+            destination = ', '.join(written)
+            warnings.warn('pypdf is not installed, so the report was left in '+str(len(written))+' parts: '+destination)
+
+    results_df = pd.DataFrame.from_records(records, columns=['author', 'pages', 'status', 'error', 'seconds'])
+    failed = results_df.loc[results_df['status'] == 'error', 'author'].tolist()
+    log('Wrote', int(results_df['pages'].sum()), 'pages for', len(authors), 'authors to', destination+'.',
+          'Failed authors: '+str(failed) if failed else 'No failures.')
+    return results_df
+
+class RenderCache:
+    '''
+    In-memory LRU cache of encoded figures (PNG, SVG, PDF bytes) for services that serve the same figures over
+    and over. A figure is keyed by a content hash of the snapshots it shows plus every render parameter, so a
+    repeated request returns the stored bytes without running matplotlib, and any change to the data or the
+    parameters is a different key. Entries beyond the byte budget are evicted least recently used first, and
+    can spill to a folder on disk from which they are read back on a later miss. All methods are thread-safe.
+
+    DataFrames are fingerprinted once and remembered by identity, so they should not be modified in place 
+    after they were first rendered (pass data_key to render() if they are).
+
+    Inputs:
+        max_bytes (integer, default 64 MB): memory budget for the stored images.
+        disk_dir (string, default None): folder of the disk tier; no disk tier if None.
+
+    Attributes:
+        hits, disk_hits, misses (integers): counts of requests served from memory, from disk, and rendered.
+    '''
+
+    def __init__(self, max_bytes=64*1024*1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+
+    def data_fingerprint(self, data):
+        '''
+        Fingerprint of one snapshot DataFrame, computed once per DataFrame object.
+        '''
+        with self.lock:
+            entry = self.fingerprints.get(id(data))
+            if entry is not None and entry[0]() is data:
+                return entry[1]
+        fingerprint = sheet_fingerprint(data)
+        with self.lock:
+            self.fingerprints[id(data)] = (weakref.ref(data), fingerprint)
+            weakref.finalize(data, self.fingerprints.pop, id(data), None)
+        return fingerprint
+
+    def key(self, pubs_dict, snapshots, params, data_key=None):
+        '''
+        Cache key of a figure: hash of the fingerprints of the snapshots shown, in order, and of the render
+        parameters.
+        '''
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode())
+        if data_key is not None:
+            digest.update(str(data_key).encode())
+        else:
+            for snap in snapshots:
+                digest.update(snap.encode() + self.data_fingerprint(pubs_dict[snap]).encode())
+        return digest.hexdigest()
+
+    def get(self, key, format='png'):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+        if self.disk_dir:
+            file = os.path.join(self.disk_dir, key+'.'+format)
+            if os.path.exists(file):
+                with open(file, 'rb') as f:
+                    image = f.read()
+                with self.lock:
+                    self.disk_hits += 1
+                self.put(key, image, format=format)
+                return image
+        return None
+
+    def put(self, key, image, format='png'):
+        spilled = []
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key)[0])
+            self.entries[key] = (image, format)   #Each entry spills under its own format, not the evicting call's
+            self.size += len(image)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                old_key, (old_image, old_format) = self.entries.popitem(last=False)
+                self.size -= len(old_image)
+                spilled.append((old_key, old_image, old_format))
+        if self.disk_dir:
+            for old_key, old_image, old_format in spilled:
+                file = os.path.join(self.disk_dir, old_key+'.'+old_format)
+                if not os.path.exists(file):
+                    descriptor, temporary = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+                    with os.fdopen(descriptor, 'wb') as f:
+                        f.write(old_image)
+                    os.replace(temporary, file)   #A concurrent get never sees a half-written image
+
+    def render(self, pubs_dict, kind='panels', snapshots=None, color_map='plasma', format='png', dpi=100, width=6, height=6, data_key=None,
+               max_bubbles=None):
+        '''
+        Returns the encoded image of a figure, from the cache if possible and rendered otherwise.
+
+        Inputs:
+            pubs_dict (dictionary of dataframes): the dictionary output from get_publication_data.
+            kind (string, 'panels' or 'time_series'): Hirsch_panels_figure or time_series_figure.
+            snapshots (list of strings, default None): year_list of the panels (see Hirsch_panels_auto).
+            color_map, dpi, width, height, max_bubbles: render settings (see RenderConfig).
+            format (string): image format, e.g. 'png', 'svg' or 'pdf'.
+            data_key (string, default None): identifies the data instead of fingerprinting the snapshots, e.g.
+                a workbook fingerprint the caller already has.
+        Outputs:
+            image (bytes): the encoded figure.
+        '''
+        if kind == 'panels':
+            shown, _ = select_snapshots(pubs_dict, snapshots, log=lambda *args: None)
+        elif kind == 'time_series':
+            shown = list(pubs_dict.keys())
+        else:
+            raise ValueError('kind must be panels or time_series, not '+repr(kind))
+        params = {'kind':kind, 'snapshots':shown, 'color_map':color_map, 'format':format, 'dpi':dpi, 'width':width, 'height':height,
+                  'max_bubbles':max_bubbles}
+        key = self.key(pubs_dict, shown, params, data_key=data_key)
+        image = self.get(key, format=format)
+        if image is not None:
+            return image
+
+        with self.lock:
+            self.misses += 1
+        config = RenderConfig(color_map=color_map, dpi=dpi, width=width, height=height, max_bubbles=max_bubbles)
+        if kind == 'panels':
+            fig = Hirsch_panels_figure(pubs_dict, year_list=shown, config=config)
+        else:
+            fig = time_series_figure(pubs_dict, config=config)[0]
+        image = figure_bytes(fig, format=format, dpi=dpi)
+        self.put(key, image, format=format)
+        return image
+
+    def stats(self):
+        '''
+        Returns the hit and miss counts and the memory use of the cache.
+        '''
+        with self.lock:
+            requests = self.hits + self.disk_hits + self.misses
+            return {'hits':self.hits, 'disk_hits':self.disk_hits, 'misses':self.misses,
+                    'hit_rate':(self.hits + self.disk_hits)/requests if requests else 0.0,
+                    'entries':len(self.entries), 'bytes':self.size, 'max_bytes':self.max_bytes}
+
+    def clear(self):
+        '''
+        Empties the memory tier (the disk tier is kept).
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+#Google scholar ingest. A transport is any callable that takes an author id and returns the raw profile as a
+#json-compatible dictionary in the shape scholarly produces: {'name':..., 'publications':[{'bib':{'title':...,
+#'pub_year':..., 'citation':...}, 'num_citations':...}, ...]}.
+
+class ScholarlyTransport:
+    '''
+    Fetches author profiles from Google scholar with the scholarly package (pip install scholarly), which is only
+    imported when the first profile is fetched. Authors are given by their scholar id (the user= part of the
+    profile address) or, failing that, by name, in which case the first search result is used.
+    '''
+    def __init__(self, sections=('basics', 'publications')):
+        self.sections = list(sections)
+
+    def __call__(self, author_id):
+        from scholarly import scholarly
+
+        if re.fullmatch(r'[\w-]{12}', author_id):
+            author = scholarly.search_author_id(author_id)
+        else:
+            author = next(scholarly.search_author(author_id), None)
+            if author is None:
+                raise LookupError('No Google scholar profile found for '+repr(author_id))
+        author = scholarly.fill(author, sections=self.sections)
+        return json.loads(json.dumps(author, default=str))   #Only keep what can be cached as json
+
+class HTTPTransport:
+    '''
+    Fetches raw author profiles as json from base_url + author id, e.g. from a local stand-in server in tests or
+    from a mirror of the profiles. A 404 response raises LookupError, which is not retried.
+    '''
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def __call__(self, author_id):
+        import urllib.error
+        import urllib.parse
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(self.base_url + urllib.parse.quote(author_id), timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            if error.code == 404:
+                raise LookupError('No profile for '+repr(author_id)+' at '+self.base_url) from error
+            raise
+
+class FixtureTransport:
+    '''
+    Reads raw author profiles from json files named after the author id in a folder, for offline runs.
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+
+    def __call__(self, author_id):
+        file = os.path.join(self.folder, safe_file_name(author_id)+'.json')
+        if not os.path.exists(file):
+            raise LookupError('No fixture file '+file)
+        with open(file) as f:
+            return json.load(f)
+
+class RateLimiter:
+    '''
+    Token bucket shared by all fetching threads: at most rate requests per second on average, with bursts of at
+    most burst requests.
+    '''
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens)/self.rate
+            time.sleep(wait)
+
+def fetch_profile(transport, author_id, limiter=None, retries=3, backoff=2.0, cache_file=None):
+    '''
+    Fetches one raw profile through the transport under the rate limiter, retrying failed requests after
+    backoff, 2*backoff, 4*backoff... seconds (with a little jitter so threads do not retry in step). LookupError
+    (no such author) is not retried. If cache_file exists the profile is read from it instead, and a fetched 
+    profile is written to it.
+    '''
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file) as f:
+            return json.load(f)
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            profile = transport(author_id)
+            break
+        except LookupError:
+            raise
+        except Exception as error:
+            if attempt == retries:
+                raise
+            wait = backoff*2**attempt*(1 + 0.25*np.random.random())
+            debug('Fetching', author_id, 'failed with', repr(error), '- retrying in', round(wait, 1), 's')
+            time.sleep(wait)
+    if cache_file:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        temporary = cache_file+'.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(profile, f)
+        os.replace(temporary, cache_file)
+    return profile
+
+def profile_year(bib):
+    '''
+    Publication year of a scholar bib entry: pub_year if usable, otherwise the last plausible year in the 
+    citation text, otherwise NaN.
+    '''
+    year = str(bib.get('pub_year') or '').strip()
+    if re.fullmatch(r'\d{4}', year):
+        return int(year)
+    years = re.findall(r'\b(1[89]\d\d|20\d\d)\b', str(bib.get('citation') or ''))
+    return int(years[-1]) if years else np.nan
+
+def parse_profile(profile):
+    '''
+    Turns a raw scholar profile into one snapshot sheet with the Year, Journal, Title and Citations columns of
+    the workbook tabs, sorted on citations. Missing fields are tolerated: a missing year is taken from the 
+    citation text or left empty, a missing citation count is 0, and the journal falls back to the venue or the
+    citation text.
+    '''
+    rows = []
+    for pub in profile.get('publications') or []:
+        bib = pub.get('bib') or {}
+        citations = pub.get('num_citations')
+        rows.append({
+            'Year':profile_year(bib),
+            'Journal':bib.get('journal') or bib.get('venue') or bib.get('citation') or '',
+            'Title':bib.get('title') or '',
+            'Citations':int(citations) if str(citations or '').strip().isdigit() else 0
+        })
+    data = pd.DataFrame.from_records(rows, columns=['Year', 'Journal', 'Title', 'Citations'])
+    if not data['Year'].isna().any():
+        data['Year'] = data['Year'].astype(np.int64)
+    return data.sort_values('Citations', ascending=False, kind='stable', ignore_index=True)
+
+def append_snapshot(file, snapshot, data):
+    '''
+    Writes one snapshot sheet into an author's workbook, creating it if needed and replacing an existing tab of
+    the same date.
+    '''
+    if os.path.exists(file):
+        with pd.ExcelWriter(file, mode='a', if_sheet_exists='replace') as writer:
+            data.to_excel(writer, sheet_name=snapshot, index=False)
+    else:
+        with pd.ExcelWriter(file) as writer:
+            data.to_excel(writer, sheet_name=snapshot, index=False)
+
+def ingest_scholar(authors, snapshot=None, transport=None, workers=4, rate=1.0, retries=3, backoff=2.0,
+                   cache_dir=None, output_dir=None, log=debug):
+    '''
+    Fetches the Google scholar profiles of many authors concurrently, in a bounded pool of threads that share 
+    one rate limit, and turns each into a dated snapshot sheet. 
+
+    Inputs:
+        authors (dictionary or list): author name -> scholar id (or search name), or a list of scholar ids, 
+            which are then also the author names.
+        snapshot (string, default None): date code of the snapshot, YYYYMMDD, today if None.
+        transport (callable, default None): fetches a raw profile, ScholarlyTransport() if None. Use
+            HTTPTransport or FixtureTransport (or any function) to run offline or in tests.
+        workers (integer): number of fetching threads.
+        rate (float): requests per second over all threads.
+        retries (integer), backoff (float): retries of a failed request and the first wait in seconds.
+        cache_dir (string, default None): raw profiles are cached here as json, one file per author and 
+            snapshot date, so a rerun on the same day does not fetch them again.
+        output_dir (string, default None): if given, each snapshot is added as a tab to output_dir/author.xlsx,
+            the workbook layout get_publication_data reads.
+        log (function, default debug): receives a summary of the profiles fetched and failed.
+    Outputs:
+        pubs_dicts (dictionary): author name -> {snapshot: sheet}, the pubs_dict shape of get_publication_data.
+        errors (dictionary): author name -> error message of the authors that could not be fetched.
+    '''
+    import concurrent.futures
+
+    if not isinstance(authors, dict):
+        authors = {author_id:author_id for author_id in authors}
+    snapshot = snapshot or time.strftime('%Y%m%d')
+    transport = transport or ScholarlyTransport()
+    limiter = RateLimiter(rate=rate)
+
+    def ingest(author, author_id):
+        cache_file = os.path.join(cache_dir, safe_file_name(author_id)+'_'+snapshot+'.json') if cache_dir else None
+        return parse_profile(fetch_profile(transport, author_id, limiter, retries=retries, backoff=backoff, cache_file=cache_file))
+
+    pubs_dicts, errors = {}, {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ingest, author, author_id):author for author, author_id in authors.items()}
+        for future in concurrent.futures.as_completed(futures):
+            author = futures[future]
+            try:
+                pubs_dicts[author] = {snapshot:future.result()}
+            except Exception as error:
+                errors[author] = type(error).__name__+': '+str(error)
+
+    pubs_dicts = {author:pubs_dicts[author] for author in authors if author in pubs_dicts}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for author, pubs_dict in pubs_dicts.items():
+            append_snapshot(os.path.join(output_dir, safe_file_name(author)+'.xlsx'), snapshot, pubs_dict[snapshot])
+    count('profiles_fetched', len(pubs_dicts))
+    count('profiles_failed', len(errors))
+    log('Fetched', len(pubs_dicts), 'of', len(authors), 'Google scholar profiles for snapshot', snapshot+'.',
+          'Failed: '+str(list(errors)) if errors else '')
+    return pubs_dicts, errors
+
+
+#Bulk export ingest. Institution-wide exports are csv or json lines files with one row per publication, author
+#and export date. They are read in chunks and split by author into bucket files, and each bucket is then read
+#back on its own, so memory holds one chunk or one bucket at a time whatever the size of the export.
+export_aliases = {
+    'Author':['author', 'author_id', 'authorid', 'scholar_id', 'researcher_id'],
+    'Snapshot':['snapshot', 'export_date', 'date', 'retrieved'],
+    'Year':['year', 'pub_year', 'publication_year'],
+    'Journal':['journal', 'venue', 'source'],
+    'Title':['title', 'publication', 'paper'],
+    'Citations':['citations', 'num_citations', 'cited_by', 'citation_count', 'times_cited']
+}
+
+def export_columns(names):
+    '''
+    Matches the column names of an export to the sheet columns (see export_aliases), ignoring case, and treating
+    spaces, underscores and hyphens alike ('Times Cited', 'times-cited' and 'times_cited' all match). Returns
+    sheet column -> export column of the columns found.
+    '''
+    lookup = {column_key(name):name for name in names}
+    return {column:lookup[column_key(alias)] for column, aliases in export_aliases.items() for alias in aliases[::-1] if column_key(alias) in lookup}
+
+def column_key(name):
+    return re.sub(r'[\s_-]+', '_', str(name).strip().lower())
+
+def read_export_chunks(file, chunk_rows=500000):
+    '''
+    Reads a csv or json lines export (.jsonl, .ndjson or .json, optionally compressed, e.g. .csv.gz) in 
+    DataFrames of at most chunk_rows rows. Only the columns in export_aliases are read, and csv text columns are
+    read as text so author ids keep their leading zeros.
+    '''
+    name = file.lower()
+    for suffix in ['.gz', '.bz2', '.xz', '.zip', '.zst']:
+        name = name.removesuffix(suffix)
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        reader = pd.read_json(file, lines=True, chunksize=chunk_rows, dtype=False)
+    else:
+        columns = export_columns(pd.read_csv(file, nrows=0).columns)
+        text = {columns[column]:str for column in ['Author', 'Snapshot', 'Journal', 'Title'] if column in columns}
+        reader = pd.read_csv(file, chunksize=chunk_rows, usecols=list(columns.values()), dtype=text)
+    with reader:
+        chunks = iter(reader)
+        while True:
+            with span('read_export_chunk'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+def export_text(series):
+    '''
+    Text column of an export with surrounding and repeated whitespace removed, and '' for missing values.
+    '''
+    if pd.api.types.is_float_dtype(series):
+        series = series.astype('Int64')   #Numeric ids read as floats because some are missing
+    #Authors, dates, journals and (across export dates) titles repeat, so each distinct value is cleaned once.
+    codes, uniques = pd.factorize(series)
+    cleaned = [' '.join(str(value).split()) for value in uniques] + ['']
+    return pd.Series(np.array(cleaned, dtype=object)[codes], index=series.index)
+
+def snapshot_code(value):
+    '''
+    Date code, YYYYMMDD, of an export date in any format pandas can parse ('' if it cannot).
+    '''
+    if re.fullmatch(r'\d{8}', value):
+        return value
+    try:
+        return pd.Timestamp(value).strftime('%Y%m%d')
+    except (ValueError, TypeError):
+        return ''
+
+def normalize_export_chunk(chunk, snapshot=None, stats=None):
+    '''
+    Validates and normalizes one chunk of an export into the long-format table of PublicationDataset: Author, 
+    Snapshot, Year, Journal, Title and Citations. Export dates in any format become date codes, years that are
+    missing or not plausible become NaN, missing or negative citation counts become 0, and rows without an 
+    author, a date or a title are dropped. An export without an author, title, citations or (unless snapshot
+    is given) date column raises a ValueError.
+
+    Inputs:
+        chunk (dataframe): raw rows, from read_export_chunks.
+        snapshot (string, default None): date code used for every row when the export has no date column.
+        stats (dictionary, default None): running totals of rows read, dropped, with missing years and with
+            missing citation counts, updated in place.
+    Outputs:
+        data (dataframe): the normalized rows.
+    '''
+    with span('normalize_export_chunk', rows=len(chunk)):
+        columns = export_columns(chunk.columns)
+        required = ['Author', 'Title', 'Citations'] + ([] if snapshot else ['Snapshot'])
+        missing = [column for column in required if column not in columns]
+        if missing:
+            raise ValueError('The export has no '+' or '.join(missing)+' column; columns are '+str(list(chunk.columns)))
+        if 'Snapshot' in columns:
+            dates = export_text(chunk[columns['Snapshot']])
+            dates = dates.map({value:snapshot_code(value) for value in dates.unique()})   #Few distinct dates per export
+        else:
+            dates = pd.Series(snapshot, index=chunk.index)
+        years = pd.to_numeric(chunk[columns['Year']], errors='coerce') if 'Year' in columns else pd.Series(np.nan, index=chunk.index)
+        years = years.where((years >= 1800) & (years <= 2100)).astype(np.float64)
+        citations = pd.to_numeric(chunk[columns['Citations']], errors='coerce')
+        data = pd.DataFrame({
+            'Author':export_text(chunk[columns['Author']]),
+            'Snapshot':dates,
+            'Year':years,
+            'Journal':export_text(chunk[columns['Journal']]) if 'Journal' in columns else '',
+            'Title':export_text(chunk[columns['Title']]),
+            'Citations':citations.fillna(0).clip(lower=0).astype(np.int64)
+        })
+        valid = ((data['Author'] != '') & (data['Snapshot'] != '') & (data['Title'] != '')).to_numpy()
+        if stats is not None:
+            stats['rows'] += len(data)
+            stats['dropped'] += int((~valid).sum())
+            stats['missing_years'] += int(data['Year'].isna().to_numpy()[valid].sum())
+            stats['missing_citations'] += int(citations.isna().to_numpy()[valid].sum())
+        count('rows_ingested', len(data))
+        return data[valid].reset_index(drop=True)
+
+def partition_export(chunks, folder, buckets):
+    '''
+    Splits normalized chunks by author into buckets subfolders of folder, one columnar part file (see 
+    save_cached_sheet) per chunk and bucket. All rows of an author end up in the same bucket.
+    '''
+    extension = '.parquet' if cache_format() == 'parquet' else '.npz'
+    for j, data in enumerate(chunks):
+        with span('partition_export', rows=len(data)):
+            bucket = pd.util.hash_pandas_object(data['Author'], index=False).to_numpy() % buckets
+            order = np.argsort(bucket, kind='stable')
+            bounds = np.searchsorted(bucket[order], np.arange(buckets+1))
+            for b in range(buckets):
+                if bounds[b+1] > bounds[b]:
+                    os.makedirs(os.path.join(folder, str(b).zfill(4)), exist_ok=True)
+                    part = data.iloc[order[bounds[b]:bounds[b+1]]].reset_index(drop=True)
+                    save_cached_sheet(part, os.path.join(folder, str(b).zfill(4), 'part_'+str(j).zfill(6)+extension))
+
+def dedupe_export(data, stats=None):
+    '''
+    Cleans the rows of whole authors (a bucket of partition_export). A missing year is filled in from another
+    row of the same author and normalized title (see normalize_title), and rows of the same author, date, 
+    normalized title and year are duplicates, of which the most cited one is kept. Returns the table sorted on
+    Author, Snapshot and descending citations.
+    '''
+    with span('dedupe_export', rows=len(data)):
+        codes, uniques = pd.factorize(data['Title'])
+        keys = np.array([normalize_title(title) for title in uniques], dtype=object)[codes]   #Each distinct title once
+        data = data.assign(key=keys)
+        filled = data.groupby(['Author', 'key'], sort=False)['Year'].transform('max')
+        if stats is not None:
+            stats['filled_years'] += int((data['Year'].isna() & filled.notna()).sum())
+        data['Year'] = data['Year'].fillna(filled)
+        data = data.sort_values(['Author', 'Snapshot', 'Citations'], ascending=[True, True, False], kind='stable')
+        duplicated = data.duplicated(['Author', 'Snapshot', 'key', 'Year']).to_numpy()
+        if stats is not None:
+            stats['duplicates'] += int(duplicated.sum())
+        return data[~duplicated].drop(columns='key').reset_index(drop=True)
+
+def export_buckets(folder, stats=None):
+    '''
+    Yields the cleaned table (see dedupe_export) of each bucket written by partition_export, one at a time.
+    '''
+    for bucket in sorted(os.listdir(folder)):
+        parts = sorted(os.listdir(os.path.join(folder, bucket)))
+        yield dedupe_export(pd.concat([load_cached_sheet(os.path.join(folder, bucket, part)) for part in parts], ignore_index=True), stats)
+
+def export_pubs_dicts(data):
+    '''
+    Yields (author, pubs_dict) for every author of a cleaned export table, with the sheets in date order. Years
+    are integers in sheets where none is missing, like the workbook tabs.
+    '''
+    sheets = data.drop(columns=['Author', 'Snapshot'])
+    blocks = data.groupby(['Author', 'Snapshot'], sort=True).indices
+    pubs_dict, previous = {}, None
+    for (author, snap), rows in sorted(blocks.items()):
+        if author != previous and pubs_dict:
+            yield previous, pubs_dict
+            pubs_dict = {}
+        previous = author
+        sheet = sheets.iloc[rows].reset_index(drop=True)
+        if not sheet['Year'].isna().any():
+            sheet['Year'] = sheet['Year'].astype(np.int64)
+        pubs_dict[snap] = sheet
+    if pubs_dict:
+        yield previous, pubs_dict
+
+def ingest_export(files, output_dir=None, output_format='store', snapshot=None, metrics=True, chunk_rows=500000,
+                  buckets=None, work_dir=None, log=debug):
+    '''
+    Streams bulk csv or json lines exports (author id, title, year, citations and export date per row) into
+    per-author snapshots and metrics, in bounded memory. The exports are read chunk by chunk, normalized (see 
+    normalize_export_chunk) and split by author into temporary bucket files (partition_export). Then one bucket
+    at a time is cleaned of duplicates (dedupe_export), its snapshots are written per author, and its metrics
+    are computed in one batched call (PublicationDataset.metrics_table). Memory therefore holds one chunk or one
+    bucket at a time, never the whole export.
+
+    Inputs:
+        files (string or list of strings): export files, read in order.
+        output_dir (string, default None): if given, every author's snapshots are written to it, named after
+            the author (see author_file_name). Otherwise only the metrics are computed.
+        output_format (string, default 'store'): 'store' appends to one SnapshotStore folder per author (dates
+            already in the store, or older than its last snapshot, are skipped, so monthly exports can be added
+            one after another), 'workbook'
+            adds the tabs to one excel workbook per author (see append_snapshot). A ColumnarStore for 
+            institution-wide queries can then be built from the stores with ColumnarStore.write.
+        snapshot (string, default None): date code of every row, for exports without a date column.
+        metrics (boolean, default True): compute the metrics of every author and snapshot.
+        chunk_rows (integer, default 500000): rows read at a time.
+        buckets (integer, default None): number of author buckets. By default, one per 64 MB of input, so a
+            bucket is about as large as a chunk.
+        work_dir (string, default None): folder of the temporary bucket files, a temporary folder if None.
+        log (function, default debug): receives a summary of the rows read, dropped and deduplicated.
+    Outputs:
+        metrics_df (dataframe): metrics of every author and snapshot, as PublicationDataset.metrics_table (None
+            if metrics is False).
+        stats (dictionary): rows read, dropped, duplicates, missing and filled-in years, missing citations, 
+            authors, snapshots written, snapshots skipped (dates older than the end of an existing store), 
+            seconds, rows_per_minute, and errors (author -> message).
+    '''
+    if isinstance(files, str):
+        files = [files]
+    if output_format not in ['store', 'workbook']:
+        raise ValueError("output_format must be 'store' or 'workbook', not "+repr(output_format))
+    if buckets is None:
+        buckets = max(1, -(-sum(os.path.getsize(file) for file in files) // (64 << 20)))
+    stats = {'rows':0, 'dropped':0, 'duplicates':0, 'missing_years':0, 'filled_years':0, 'missing_citations':0,
+             'authors':0, 'snapshots_written':0, 'snapshots_skipped':0, 'errors':{}}
+    start = time.perf_counter()
+    frames = []
+    with span('ingest_export'), tempfile.TemporaryDirectory(dir=work_dir) as folder:
+        chunks = (normalize_export_chunk(chunk, snapshot, stats) for file in files for chunk in read_export_chunks(file, chunk_rows))
+        partition_export(chunks, folder, buckets)
+        for data in export_buckets(folder, stats):
+            if metrics:
+                with span('export_metrics'):
+                    frames.append(PublicationDataset(data).metrics_table())
+            stats['authors'] += data['Author'].nunique()
+            for author, pubs_dict in (export_pubs_dicts(data) if output_dir else []):
+                with span('write_author_snapshots'):
+                    try:
+                        written, skipped = write_author_snapshots(author, pubs_dict, output_dir, output_format)
+                        stats['snapshots_written'] += written
+                        stats['snapshots_skipped'] += skipped
+                    except Exception as error:
+                        stats['errors'][author] = type(error).__name__+': '+str(error)
+            data = None
+
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_minute'] = stats['rows']/stats['seconds']*60 if stats['seconds'] else np.nan
+    metrics_df = None
+    if metrics:
+        metrics_df = pd.concat(frames, ignore_index=True) if frames else PublicationDataset.from_pubs_dicts({}).metrics_table()
+        metrics_df = metrics_df.sort_values(['Author', 'Snapshot'], ignore_index=True)
+    log('Ingested', stats['rows'], 'rows of', stats['authors'], 'authors in', '{:.1f} s'.format(stats['seconds']),
+          '({:.2f} million rows per minute).'.format(stats['rows_per_minute']/1e6), 'Dropped', stats['dropped'],
+          'invalid rows and', stats['duplicates'], 'duplicates.', 'Failed: '+str(list(stats['errors'])) if stats['errors'] else '')
+    return metrics_df, stats
+
+def author_file_name(author):
+    '''
+    File name of an author's output: safe_file_name of the author, followed by a short hash of the full name 
+    whenever characters had to be replaced, so two authors that differ only in those characters (e.g. 'a b' 
+    and 'a/b') never share a store or workbook.
+    '''
+    name = safe_file_name(author)
+    if name != str(author):
+        name += '_'+hashlib.blake2b(str(author).encode(), digest_size=4).hexdigest()
+    return name
+
+def write_author_snapshots(author, pubs_dict, output_dir, output_format='store'):
+    '''
+    Writes the snapshots of one author from ingest_export, to output_dir/name (a SnapshotStore) or to
+    output_dir/name.xlsx, with name from author_file_name. Stores are append-only, so dates already in the 
+    store and dates older than its last snapshot are skipped.
+
+    Outputs:
+        written (integer): number of snapshots written.
+        skipped (integer): number of snapshots older than the last one already in the store, not written.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    written, skipped = 0, 0
+    if output_format == 'store':
+        store = SnapshotStore(os.path.join(output_dir, author_file_name(author)))
+        for snap, data in sorted(pubs_dict.items()):
+            if snap in store:
+                continue
+            last = store.manifest['snapshots'][-1]['snapshot'] if len(store) else None
+            if (last is not None) and (snap < last):
+                debug('Skipping snapshot', snap, 'of', author, ': the store already ends at', last)
+                skipped += 1
+                continue
+            store.append(snap, data)
+            written += 1
+    else:
+        file = os.path.join(output_dir, author_file_name(author)+'.xlsx')
+        for snap, data in pubs_dict.items():
+            append_snapshot(file, snap, data)
+            written += 1
+    return written, skipped
@@ -0,0 +1,262 @@
+'''
+PubPy benchmarks - synthetic publication portfolios and timings of PubPy's hot paths.
+
+Run from the repository folder, for example:
+    python PubPy_benchmarks.py --output bench.json
+    python PubPy_benchmarks.py --papers 100 10000 100000 --snapshots 1 50 500 --authors 1 1000 10000
+
+Every benchmark is repeated and the minimum and median wall times are written to a json file together with
+the versions of python, numpy, pandas and matplotlib, so results from different upgrades can be compared.
+'''
+import matplotlib
+matplotlib.use('Agg')   #Render without a display, and the same way on every machine.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+import PubPy
+
+journal_names = [
+    'Geophysical Research Letters',
+    'Geochimica et Cosmochimica Acta',
+    'Quaternary Science Reviews',
+    'Geology',
+    'Radiocarbon',
+    'Paleoceanography',
+    'Organic Geochemistry',
+    'Nature',
+    'Science'
+]
+
+
+def synthetic_portfolio(n_papers, n_snapshots, first_year=1995, last_year=2025, seed=0):
+    '''
+    Generates the long-format snapshots of one synthetic author. Final citation counts are heavy tailed (a
+    lognormal body with a Pareto tail, like real citation distributions), papers are published throughout the
+    career, and each paper accumulates its citations gradually after publication, so the citations of a paper
+    never decrease from one snapshot to the next.
+
+    Inputs:
+        n_papers (integer): number of papers at the end of the career.
+        n_snapshots (integer): number of snapshots, evenly spaced over the career and ending at its end.
+        first_year, last_year (integers): span of the career.
+        seed (integer): random seed.
+    Outputs:
+        table (dataframe): long table with Snapshot, Year, Journal, Title and Citations columns.
+    '''
+    rng = np.random.default_rng(seed)
+    years = np.sort(rng.integers(first_year, last_year+1, n_papers))
+    final = rng.lognormal(mean=2.0, sigma=1.3, size=n_papers)
+    tail = rng.random(n_papers) < 0.05
+    final[tail] *= rng.pareto(1.5, tail.sum()) + 1
+    build_up = rng.uniform(2, 8, n_papers)   #Years for a paper to collect most of its citations
+    journals = np.array(journal_names)[rng.integers(0, len(journal_names), n_papers)]
+    titles = np.char.add('Synthetic paper number ', np.arange(n_papers).astype(str))
+
+    #Evenly spaced snapshots that always end with the full career.
+    start, end = pd.Timestamp(str(first_year+1)), pd.Timestamp(str(last_year)+'-12-31')
+    snapshot_dates = pd.to_datetime(np.linspace(start.value, end.value, n_snapshots)) if n_snapshots > 1 else [end]
+    frames = []
+    for date in snapshot_dates:
+        t = date.year + date.dayofyear/365.25
+        published = years < t
+        age = t - years[published]
+        citations = np.floor(final[published]*(1 - np.exp(-age/build_up[published]))).astype(np.int64)
+        frames.append(pd.DataFrame({
+            'Snapshot':date.strftime('%Y%m%d'),
+            'Year':years[published],
+            'Journal':journals[published],
+            'Title':titles[published],
+            'Citations':citations
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def synthetic_pubs_dict(n_papers, n_snapshots, seed=0):
+    '''
+    Synthetic portfolio of one author in the pubs_dict shape of get_publication_data, sorted on citations like
+    a Google scholar sheet.
+    '''
+    table = synthetic_portfolio(n_papers, n_snapshots, seed=seed)
+    pubs_dict = {}
+    for snap, data in table.groupby('Snapshot', sort=True):
+        data = data.drop(columns='Snapshot').sort_values('Citations', ascending=False, ignore_index=True)
+        if len(data):
+            pubs_dict[snap] = data
+    return pubs_dict
+
+def synthetic_dataset(n_authors, n_papers, n_snapshots, seed=0):
+    '''
+    Synthetic PublicationDataset of many authors. Career sizes vary around n_papers so authors are not all alike.
+    '''
+    rng = np.random.default_rng(seed)
+    sizes = np.clip(rng.lognormal(np.log(max(n_papers, 1)), 0.5, n_authors).astype(int), 1, None)
+    frames = [synthetic_portfolio(size, n_snapshots, seed=seed+i).assign(Author='author'+str(i).zfill(5)) for i, size in enumerate(sizes)]
+    return PubPy.PublicationDataset(pd.concat(frames, ignore_index=True))
+
+def write_workbook(pubs_dict, file):
+    '''
+    Writes a synthetic pubs_dict to an excel workbook with one tab per snapshot.
+    '''
+    with pd.ExcelWriter(file) as writer:
+        for snap, data in pubs_dict.items():
+            data.to_excel(writer, sheet_name=snap, index=False)
+
+
+def time_call(function, repeats=3):
+    '''
+    Times a call, silencing PubPy's messages and closing any figure it leaves open.
+    '''
+    times = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        plt.close('all')
+    return {'repeats':repeats, 'min_s':min(times), 'median_s':statistics.median(times)}
+
+#Timed in a fresh interpreter, so nothing is imported yet; prints the import time and the heavy modules it loaded.
+import_script = '''
+import sys, time, json
+start = time.perf_counter()
+import PubPy
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds':seconds, 'loaded':[name for name in ['pandas', 'matplotlib', 'matplotlib.pyplot', 'openpyxl'] if name in sys.modules]}))
+'''
+
+def import_benchmark(repeats=5):
+    '''
+    Times "import PubPy" in fresh python processes, the cost every short-lived batch job or CLI call pays before
+    it computes anything, and records which heavy modules the import loaded (none should be, since pandas, 
+    matplotlib and the excel reader load on first use).
+    '''
+    folder = os.path.dirname(os.path.abspath(__file__))
+    times, loaded = [], []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', import_script], cwd=folder, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        loaded = result['loaded']
+    return {'benchmark':'import_PubPy', 'params':{}, 'repeats':repeats, 'min_s':min(times),
+            'median_s':statistics.median(times), 'loaded_modules':loaded}
+
+def run_benchmarks(papers=(100, 1000, 10000), snapshots=(1, 20), authors=(1, 100), repeats=3, workbook_snapshots=20, render=True):
+    '''
+    Runs every benchmark over the requested sizes.
+
+    Inputs:
+        papers (list of integers): numbers of papers per author.
+        snapshots (list of integers): numbers of snapshots per author.
+        authors (list of integers): numbers of authors for the batched benchmarks.
+        repeats (integer): repeats of each timing.
+        workbook_snapshots (integer): snapshots written to the excel workbook for the loading benchmarks,
+            capped because writing large workbooks is slow.
+        render (boolean): include the rendering benchmarks.
+    Outputs:
+        results (list of dictionaries): one entry per benchmark and size.
+    '''
+    results = [import_benchmark(repeats=max(repeats, 3))]
+    print('import_PubPy', '{:.4f} s'.format(results[0]['min_s']), 'loaded:', results[0]['loaded_modules'])
+    def record(name, params, function):
+        result = {'benchmark':name, 'params':params} | time_call(function, repeats=repeats)
+        print(name, params, '{:.4f} s'.format(result['min_s']))
+        results.append(result)
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n_papers in papers:
+            for n_snapshots in snapshots:
+                params = {'papers':n_papers, 'snapshots':n_snapshots}
+                pubs_dict = synthetic_pubs_dict(n_papers, n_snapshots)
+                keys = list(pubs_dict.keys())
+                latest = pubs_dict[keys[-1]]
+                panels = keys[::-max(1, len(keys)//4)][:4][::-1]
+
+                record('calculate_H_index', params, lambda: PubPy.calculate_H_index(latest))
+                record('h_index_kernel', params, lambda: PubPy.h_index_kernel(latest['Citations'].to_numpy()))
+                record('calculate_metrics', params, lambda: PubPy.calculate_metrics(latest, snapshot=keys[-1]))
+                record('h_index_time_series', params, lambda: PubPy.h_index_time_series(pubs_dict))
+                record('limits_search', params, lambda: PubPy.limits_search(panels, pubs_dict))
+                record('pub_year_limits', params, lambda: PubPy.pub_year_limits(pubs_dict, keys))
+                if render:
+                    record('Hirsch_panels_auto', params, lambda: PubPy.Hirsch_panels_auto(pubs_dict))
+                    record('h_index_panels', params, lambda: PubPy.h_index_panels(pubs_dict, [keys[-1]]))
+
+                if n_snapshots <= workbook_snapshots:
+                    file = os.path.join(folder, 'portfolio_'+str(n_papers)+'_'+str(n_snapshots)+'.xlsx')
+                    write_workbook(pubs_dict, file)
+                    cache_dir = os.path.join(folder, 'cache')
+                    record('get_publication_data', params, lambda: PubPy.get_publication_data(file))
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        PubPy.get_publication_data(file, cache_dir=cache_dir)
+                    record('get_publication_data_cached', params, lambda: PubPy.get_publication_data(file, cache_dir=cache_dir))
+
+        for n_authors in authors:
+            for n_snapshots in snapshots:
+                params = {'authors':n_authors, 'papers':papers[0], 'snapshots':n_snapshots}
+                dataset = synthetic_dataset(n_authors, papers[0], n_snapshots)
+                record('metrics_table', params, lambda: dataset.metrics_table())
+                offsets = np.append(dataset.groups['start'].to_numpy(), len(dataset.table))
+                citations = dataset.table['Citations'].to_numpy()
+                record('h_index_batch', params, lambda: PubPy.h_index_batch(citations, offsets))
+                export_file = os.path.join(folder, 'export_'+str(n_authors)+'_'+str(n_snapshots)+'.csv')
+                dataset.table.to_csv(export_file, index=False)
+                record('ingest_export', params | {'rows':len(dataset.table)}, lambda: PubPy.ingest_export(export_file))
+                results[-1]['million_rows_per_minute'] = len(dataset.table)/results[-1]['min_s']*60/1e6
+
+    return results
+
+def environment():
+    '''
+    Versions of everything that affects the timings.
+    '''
+    return {
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'processor':platform.processor(),
+        'numpy':np.__version__,
+        'pandas':pd.__version__,
+        'matplotlib':matplotlib.__version__,
+        'time':time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the hot paths of PubPy on synthetic portfolios.')
+    parser.add_argument('--papers', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--snapshots', type=int, nargs='+', default=[1, 20])
+    parser.add_argument('--authors', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workbook-snapshots', type=int, default=20, help='largest snapshot count written to excel for the loading benchmarks')
+    parser.add_argument('--no-render', action='store_true', help='skip the plotting benchmarks')
+    parser.add_argument('--import-only', action='store_true', help='only time importing PubPy')
+    parser.add_argument('--output', default='bench.json', help='json file the results are written to')
+    args = parser.parse_args()
+
+    if args.import_only:
+        results = [import_benchmark(repeats=max(args.repeats, 3))]
+        print('import_PubPy', '{:.4f} s'.format(results[0]['min_s']), 'loaded:', results[0]['loaded_modules'])
+    else:
+        results = run_benchmarks(
+            papers=args.papers,
+            snapshots=args.snapshots,
+            authors=args.authors,
+            repeats=args.repeats,
+            workbook_snapshots=args.workbook_snapshots,
+            render=not args.no_render
+        )
+    with open(args.output, 'w') as f:
+        json.dump({'environment':environment(), 'results':results}, f, indent=1)
+    print('Wrote', len(results), 'results to', args.output)
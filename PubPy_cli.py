@@ -0,0 +1,271 @@
+'''
+PubPy command line - batch metrics, figures and reports from a folder of Google scholar snapshot workbooks,
+for scheduled runs.
+
+Run from the repository folder, for example:
+    python PubPy_cli.py metrics workbooks/ --output metrics.csv --jobs 8
+    python PubPy_cli.py render "workbooks/*.xlsx" --output-dir figures --formats png pdf
+    python PubPy_cli.py report workbooks/ --output department.pdf
+
+Each workbook is one author, named after the file. Workbooks whose contents have not changed since the last
+run are skipped: their metrics are taken from the state file and their figures are left as they are. The exit
+status is 0 when every input succeeded, 1 when some failed (they are listed on stderr) and 2 for usage errors.
+'''
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import PubPy
+
+
+def expand_inputs(patterns):
+    '''
+    Expands folders (every .xlsx file in them) and glob patterns into workbook file names, in order and without
+    duplicates. Patterns that match nothing are returned separately so they can be reported as failed inputs.
+    '''
+    files, missing = [], []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.xlsx')))
+        else:
+            matches = sorted(glob.glob(pattern))
+        matches = [file for file in matches if not os.path.basename(file).startswith('~$')]   #Excel lock files
+        if not matches:
+            missing.append(pattern)
+        files.extend(file for file in matches if file not in files)
+    return files, missing
+
+def parse_snapshots(values):
+    '''
+    Turns the --snapshots option into None (all snapshots), 'latest', or a list of YYYYMMDD date codes.
+    '''
+    if not values or values == ['all']:
+        return None
+    if values == ['latest']:
+        return 'latest'
+    return values
+
+def load_state(file):
+    if os.path.exists(file):
+        with open(file) as f:
+            return json.load(f)
+    return {}
+
+def save_state(state, file):
+    temporary = file+'.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(temporary, file)   #A crash while writing never leaves a half-written state file
+
+def workbook_metrics(author, file, snapshots=None, metrics=None):
+    '''
+    Metrics of every selected snapshot of one workbook, as records with Author, Snapshot, Date and the metrics.
+    Runs in the worker processes of metrics_command.
+    '''
+    metrics_df = PubPy.PublicationDataset.from_workbooks({author:file}).metrics_table()
+    if snapshots == 'latest':
+        metrics_df = metrics_df[metrics_df['Snapshot'] == metrics_df['Snapshot'].max()]
+    elif snapshots is not None:
+        metrics_df = metrics_df[metrics_df['Snapshot'].isin(snapshots)]
+    metrics_df = metrics_df[['Author', 'Snapshot', 'Date'] + (metrics or PubPy.metric_columns)]
+    metrics_df['Date'] = metrics_df['Date'].dt.strftime('%Y-%m-%d')
+    return metrics_df.to_dict(orient='records')
+
+def run_parallel(function, tasks, jobs):
+    '''
+    Calls function(*arguments) for every task name -> arguments, in a pool of jobs worker processes (in this
+    process if jobs is 1). Returns name -> result and name -> error message.
+    '''
+    import concurrent.futures
+    import multiprocessing
+
+    results, errors = {}, {}
+    if jobs == 1:
+        for name, arguments in tasks.items():
+            try:
+                results[name] = function(*arguments)
+            except Exception as error:
+                errors[name] = type(error).__name__+': '+str(error)
+        return results, errors
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(function, *arguments):name for name, arguments in tasks.items()}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                errors[futures[future]] = type(error).__name__+': '+str(error)
+    return results, errors
+
+def changed_inputs(files, section, params, force=False):
+    '''
+    Splits the workbooks into those that must be processed and those whose contents and parameters match the
+    last successful run recorded in the state section. Returns (changed, unchanged, fingerprints).
+    '''
+    fingerprints = {file:PubPy.file_fingerprint(file) for file in files}
+    changed, unchanged = [], []
+    for file in files:
+        entry = section.get(os.path.abspath(file))
+        if not force and entry and entry['fingerprint'] == fingerprints[file] and entry['params'] == params:
+            unchanged.append(file)
+        else:
+            changed.append(file)
+    return changed, unchanged, fingerprints
+
+def author_name(file):
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def metrics_command(args, files, state):
+    '''
+    Writes one metrics table of every workbook and selected snapshot, as csv or, for a .parquet output, parquet.
+    '''
+    section = state.setdefault('metrics', {})
+    snapshots = parse_snapshots(args.snapshots)
+    params = {'snapshots':snapshots, 'metrics':args.metrics}
+    changed, unchanged, fingerprints = changed_inputs(files, section, params, force=args.force)
+    print('Computing metrics of', len(changed), 'workbooks,', len(unchanged), 'unchanged.')
+
+    tasks = {file:(author_name(file), file, snapshots, args.metrics) for file in changed}
+    results, errors = run_parallel(workbook_metrics, tasks, args.jobs)
+    for file, rows in results.items():
+        section[os.path.abspath(file)] = {'fingerprint':fingerprints[file], 'params':params, 'rows':rows}
+    for file in errors:
+        section.pop(os.path.abspath(file), None)
+
+    records = [row for file in files if file not in errors for row in section[os.path.abspath(file)]['rows']]
+    metrics_df = PubPy.pd.DataFrame.from_records(records, columns=['Author', 'Snapshot', 'Date'] + (args.metrics or PubPy.metric_columns))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.output.endswith('.parquet'):
+        metrics_df.to_parquet(args.output, index=False)
+    else:
+        metrics_df.to_csv(args.output, index=False)
+    print('Wrote', len(metrics_df), 'rows to', args.output)
+    return errors
+
+def render_command(args, files, state):
+    '''
+    Renders the figures of the workbooks that changed, with PubPy.render_batch.
+    '''
+    section = state.setdefault('render', {})
+    snapshots = parse_snapshots(args.snapshots)
+    params = {'snapshots':snapshots, 'kinds':args.kinds, 'formats':args.formats, 'dpi':args.dpi, 'color_map':args.color_map,
+              'output_dir':os.path.abspath(args.output_dir)}
+    changed, unchanged, fingerprints = changed_inputs(files, section, params, force=args.force)
+    #An unchanged workbook is rendered again if any of its figures has gone missing.
+    for file in list(unchanged):
+        if not all(os.path.exists(figure) for figure in section[os.path.abspath(file)]['files']):
+            unchanged.remove(file)
+            changed.append(file)
+    print('Rendering', len(changed), 'workbooks,', len(unchanged), 'unchanged.')
+    if not changed:
+        return {}
+
+    sources = {author_name(file):file for file in changed}
+    if snapshots == 'latest':
+        snapshots = None
+        kinds = ['single' if kind == 'panels' else kind for kind in args.kinds]
+    else:
+        kinds = args.kinds
+    results_df = PubPy.render_batch(sources, args.output_dir, kinds=tuple(dict.fromkeys(kinds)), formats=tuple(args.formats),
+                                    jobs=args.jobs, dpi=args.dpi, color_map=args.color_map, snapshots=snapshots)
+    errors = {}
+    for file in changed:
+        rows = results_df[results_df['author'] == author_name(file)]
+        failed = rows[rows['status'] == 'error']
+        if len(failed):
+            errors[file] = '; '.join(dict.fromkeys(failed['error']))   #Each distinct error once, not once per figure
+            section.pop(os.path.abspath(file), None)
+        else:
+            section[os.path.abspath(file)] = {'fingerprint':fingerprints[file], 'params':params,
+                                              'files':[figure for figures in rows['files'] for figure in figures]}
+    return errors
+
+def report_command(args, files, state):
+    '''
+    Writes the multi-page pdf report of all workbooks with PubPy.h_index_report, unless no workbook changed
+    since the report was last written.
+    '''
+    section = state.setdefault('report', {})
+    params = {'color_map':args.color_map, 'dpi':args.dpi}
+    fingerprints = {os.path.abspath(file):PubPy.file_fingerprint(file) for file in files}
+    output = os.path.abspath(args.output)
+    previous = section.get(output)
+    if not args.force and previous and previous['fingerprints'] == fingerprints and previous['params'] == params and os.path.exists(output):
+        print('No workbook changed since', args.output, 'was written; skipping the report.')
+        return {}
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    sources = {author_name(file):file for file in files}
+    results_df = PubPy.h_index_report(sources, args.output, shards=args.jobs, color_map=args.color_map, dpi=args.dpi)
+    failed = results_df[results_df['status'] == 'error']
+    errors = {sources[author]:error for author, error in zip(failed['author'], failed['error'])}
+    if errors:
+        section.pop(output, None)
+    else:
+        section[output] = {'fingerprints':fingerprints, 'params':params}
+    return errors
+
+commands = {
+    'metrics':metrics_command,
+    'render':render_command,
+    'report':report_command
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='PubPy_cli.py', description='Batch h-index metrics, figures and reports from Google scholar snapshot workbooks.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='+', help='workbooks, folders of workbooks, or glob patterns')
+    common.add_argument('--snapshots', nargs='+', default=['all'], help='all (default), latest, or YYYYMMDD date codes; with latest, render draws the single Hirsch plot instead of panels')
+    common.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs; 1 for report)')
+    common.add_argument('--state', default=None, help='json file remembering the last run (default: .pubpy_state.json next to the output)')
+    common.add_argument('--force', action='store_true', help='process every workbook, changed or not')
+
+    metrics = subparsers.add_parser('metrics', parents=[common], help='write a table of metrics (csv or parquet)')
+    metrics.add_argument('--metrics', nargs='+', choices=PubPy.metric_columns, default=None, help='metrics to compute (default: all)')
+    metrics.add_argument('--output', default='metrics.csv', help='csv file, or parquet if it ends in .parquet')
+
+    render = subparsers.add_parser('render', parents=[common], help='render figures of every workbook')
+    render.add_argument('--output-dir', default='figures')
+    render.add_argument('--kinds', nargs='+', choices=list(PubPy.render_kinds), default=list(PubPy.render_kinds))
+    render.add_argument('--formats', nargs='+', default=['png'])
+    render.add_argument('--dpi', type=int, default=150)
+    render.add_argument('--color-map', default='plasma')
+
+    report = subparsers.add_parser('report', parents=[common], help='write a multi-page pdf report of every workbook')
+    report.add_argument('--output', default='report.pdf')
+    report.add_argument('--dpi', type=int, default=100)
+    report.add_argument('--color-map', default='plasma')
+    return parser
+
+def main(argv=None):
+    '''
+    Runs one command and returns the exit status: 0 if every input succeeded, 1 if any failed.
+    '''
+    args = build_parser().parse_args(argv)
+    if args.command == 'report' and parse_snapshots(args.snapshots) is not None:
+        print('The report always uses every snapshot; --snapshots is ignored.', file=sys.stderr)
+    #The report is written by one process unless --jobs asks for shards; metrics and figures use every CPU.
+    args.jobs = max(1, args.jobs or (1 if args.command == 'report' else os.cpu_count() or 1))
+    start = time.perf_counter()
+    files, missing = expand_inputs(args.inputs)
+    output_dir = args.output_dir if args.command == 'render' else os.path.dirname(os.path.abspath(args.output))
+    state_file = args.state or os.path.join(output_dir, '.pubpy_state.json')
+    state = load_state(state_file)
+
+    errors = commands[args.command](args, files, state) if files else {}
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    save_state(state, state_file)
+
+    print(args.command, 'finished in', '{:.1f} s;'.format(time.perf_counter() - start), len(files) - len(errors), 'of', len(files), 'workbooks ok.')
+    errors = {pattern:'no workbooks match' for pattern in missing} | errors
+    for name, error in errors.items():
+        print('FAILED', name+':', error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+#The modules live in the repository folder, not in an installed package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
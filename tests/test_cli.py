@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+
+import PubPy_benchmarks
+import PubPy_cli
+
+
+def write_workbooks(folder, authors=2):
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for j in range(authors):
+        file = os.path.join(folder, 'author'+str(j)+'.xlsx')
+        PubPy_benchmarks.write_workbook(PubPy_benchmarks.synthetic_pubs_dict(20, 3, seed=j), file)
+        files.append(file)
+    return files
+
+def run_metrics(capsys, *args):
+    status = PubPy_cli.main(['metrics', *args, '--jobs', '1'])
+    return status, capsys.readouterr().out
+
+
+def test_unchanged_workbooks_are_skipped(tmp_path, capsys):
+    files = write_workbooks(str(tmp_path/'workbooks'))
+    output = str(tmp_path/'out'/'metrics.csv')
+
+    status, out = run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output)
+    assert status == 0
+    assert 'Computing metrics of 2 workbooks, 0 unchanged.' in out
+    assert os.path.exists(str(tmp_path/'out'/'.pubpy_state.json'))
+    first = pd.read_csv(output)
+    assert sorted(first['Author'].unique()) == ['author0', 'author1']
+
+    status, out = run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output)
+    assert 'Computing metrics of 0 workbooks, 2 unchanged.' in out
+    pd.testing.assert_frame_equal(pd.read_csv(output), first)   #Rows of skipped workbooks come from the state file
+
+    PubPy_benchmarks.write_workbook(PubPy_benchmarks.synthetic_pubs_dict(25, 3, seed=9), files[1])
+    status, out = run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output)
+    assert 'Computing metrics of 1 workbooks, 1 unchanged.' in out
+
+    status, out = run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output, '--force')
+    assert 'Computing metrics of 2 workbooks, 0 unchanged.' in out
+
+def test_changed_parameters_are_not_skipped(tmp_path, capsys):
+    write_workbooks(str(tmp_path/'workbooks'), authors=1)
+    output = str(tmp_path/'metrics.csv')
+    run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output)
+    status, out = run_metrics(capsys, str(tmp_path/'workbooks'), '--output', output, '--snapshots', 'latest')
+    assert 'Computing metrics of 1 workbooks, 0 unchanged.' in out
+    assert len(pd.read_csv(output)) == 1
+
+def test_missing_inputs_fail(tmp_path, capsys):
+    write_workbooks(str(tmp_path/'workbooks'), authors=1)
+    status = PubPy_cli.main(['metrics', str(tmp_path/'workbooks'), str(tmp_path/'nothing*.xlsx'),
+                             '--output', str(tmp_path/'metrics.csv'), '--jobs', '1'])
+    assert status == 1
+    assert 'no workbooks match' in capsys.readouterr().err
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import PubPy
+
+
+def long_table():
+    return pd.DataFrame({
+        'Author':['a', 'a', 'a', 'b', 'b'],
+        'Date':pd.to_datetime(['2010-01-01', '2012-01-01', '2014-01-01', '2011-01-01', '2013-01-01']),
+        'h-index':[2, 4, 8, 10, 20]
+    })
+
+
+def test_align_to_grid_step_and_linear():
+    dates = pd.to_datetime(['2009-01-01', '2011-01-01', '2013-01-01', '2014-01-01'])
+    authors, step = PubPy.align_to_grid(long_table(), dates)
+    assert list(authors) == ['a', 'b']
+    np.testing.assert_array_equal(step['h-index'], [[np.nan, 2, 4, 8], [np.nan, 10, 20, np.nan]])
+
+    _, carried = PubPy.align_to_grid(long_table(), dates, carry_forward=True)
+    np.testing.assert_array_equal(carried['h-index'][1], [np.nan, 10, 20, 20])
+
+    _, linear = PubPy.align_to_grid(long_table(), dates, method='linear')
+    np.testing.assert_allclose(linear['h-index'][0], [np.nan, 3, 6, 8], rtol=1e-2)   #Leap years shift the fractions slightly
+
+def test_align_to_grid_matches_a_loop():
+    rng = np.random.default_rng(5)
+    rows = []
+    for author in range(6):
+        days = np.sort(rng.choice(np.arange(3000), size=rng.integers(1, 6), replace=False))
+        rows += [{'Author':'author '+str(author), 'Date':pd.Timestamp('2005-01-01') + pd.Timedelta(days=int(day)),
+                  'h-index':float(rng.integers(0, 30))} for day in days]
+    long_df = pd.DataFrame(rows)
+    dates = pd.date_range('2004-01-01', '2014-01-01', freq='QS')
+    authors, aligned = PubPy.align_to_grid(long_df, dates, carry_forward=True)
+    for i, author in enumerate(authors):
+        own = long_df[long_df['Author'] == author]
+        for k, date in enumerate(dates):
+            before = own[own['Date'] <= date]
+            expected = before['h-index'].iloc[-1] if len(before) else np.nan
+            np.testing.assert_equal(aligned['h-index'][i, k], expected)
+
+def test_cohort_bands_of_time_series_dictionary():
+    series = {author:group.drop(columns='Author') for author, group in long_table().groupby('Author')}
+    bands = PubPy.cohort_bands(series, dates=pd.to_datetime(['2011-06-01', '2013-06-01']), percentiles=(0, 100))
+    assert list(bands.columns) == ['Metric', 'Date', 'Authors', 'p0', 'p50', 'p100']
+    assert bands['Authors'].tolist() == [2, 1]
+    assert bands[['p0', 'p50', 'p100']].to_numpy().tolist() == [[2, 6, 10], [4, 4, 4]]
+
+def test_cohort_bands_of_a_dataset():
+    dataset = PubPy.PublicationDataset.from_pubs_dicts({
+        author:{'20'+str(10+j)+'0101':pd.DataFrame({'Year':[2005]*5, 'Citations':[citations*(j+1)]*5}) for j in range(3)}
+        for author, citations in [('a', 1), ('b', 2)]})
+    bands = PubPy.cohort_bands(dataset, columns=('h-index', 'i10-index'))
+    assert sorted(bands['Metric'].unique()) == ['h-index', 'i10-index']
+    assert bands[bands['Metric'] == 'h-index']['p50'].tolist() == [1.5, 3, 4]   #h of a is 1, 2, 3 and of b 2, 4, 5
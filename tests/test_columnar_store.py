@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+import PubPy_benchmarks
+
+
+@pytest.fixture
+def dataset():
+    return PubPy_benchmarks.synthetic_dataset(6, 40, 4)
+
+@pytest.fixture
+def store(dataset, tmp_path):
+    PubPy.ColumnarStore.write(str(tmp_path/'store'), dataset)
+    return PubPy.ColumnarStore(str(tmp_path/'store'))   #Reopened, as a worker process would
+
+
+def test_metrics_match_the_dataset(dataset, store):
+    expected = dataset.metrics_table()
+    result = store.metrics_table(chunk_rows=50)   #Many chunks
+    assert len(result) == len(expected)
+    for column in PubPy.metric_columns:
+        np.testing.assert_allclose(result[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float), equal_nan=True)
+
+def test_sheets_and_h_index_match_the_dataset(dataset, store):
+    assert store.authors == dataset.authors
+    for author in dataset.authors:
+        expected = dataset.author(author)
+        view = store.author(author)
+        assert list(view) == list(expected)
+        for snap in expected:
+            sheet = view[snap]
+            assert sheet['Citations'].is_monotonic_decreasing
+            columns = ['Citations', 'Year', 'Title']
+            pd.testing.assert_frame_equal(sheet.sort_values(columns, ignore_index=True)[['Year', 'Journal', 'Title', 'Citations']],
+                                          expected[snap].sort_values(columns, ignore_index=True)[['Year', 'Journal', 'Title', 'Citations']],
+                                          check_dtype=False)
+            assert store.h_index(author, snap) == PubPy.calculate_H_index(expected[snap])[0]
+
+def test_limits_match_snapshot_limits(dataset, store):
+    author = dataset.authors[0]
+    snapshots = list(dataset.author(author))
+    assert store.limits(author) == PubPy.snapshot_limits(dataset.author(author), snapshots)
+    assert store.limits(author, snapshots[:2]) == PubPy.snapshot_limits(dataset.author(author), snapshots[:2])
+
+def test_limits_of_an_empty_selection(dataset, store):
+    with pytest.raises(ValueError):
+        store.limits(dataset.authors[0], ['19000101'])
+
+def test_missing_years_and_journals(tmp_path):
+    pubs_dict = {'20200101':pd.DataFrame({'Year':[2001, np.nan], 'Journal':['J1', None], 'Title':['A', 'B'], 'Citations':[3, 1]})}
+    store = PubPy.ColumnarStore.write(str(tmp_path/'store'), {'author':pubs_dict})
+    sheet = store.author('author')['20200101']
+    assert sheet['Year'].isna().tolist() == [False, True]
+    assert sheet['Journal'].isna().tolist() == [False, True]
+    assert sheet['Citations'].tolist() == [3, 1]
+
+def test_sources_without_journal_or_title_columns(tmp_path):
+    pubs_dict = {'20200101':pd.DataFrame({'Year':[2001, 2002], 'Citations':[3, 1]})}
+    store = PubPy.ColumnarStore.write(str(tmp_path/'store'), {'author':pubs_dict})
+    sheet = store.author('author')['20200101']
+    assert sheet['Journal'].isna().all() and sheet['Title'].isna().all()
+    assert sheet['Citations'].tolist() == [3, 1]
+
+def test_write_is_quiet_unless_asked(dataset, tmp_path, capsys):
+    PubPy.ColumnarStore.write(str(tmp_path/'quiet'), dataset)
+    assert capsys.readouterr().out == ''
+    messages = []
+    PubPy.ColumnarStore.write(str(tmp_path/'logged'), dataset, log=lambda *args: messages.append(args))
+    assert messages[0][:2] == ('Wrote', len(dataset.table))
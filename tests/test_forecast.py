@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+
+
+def growing_author(h_per_year, first_snapshot=2015, n_snapshots=4):
+    '''
+    Snapshots in which the h-index grows by h_per_year every year: n papers with n citations each.
+    '''
+    pubs_dict = {}
+    for j in range(n_snapshots):
+        n = 4 + h_per_year*j
+        pubs_dict[str(first_snapshot + j)+'0101'] = pd.DataFrame({
+            'Year':[2010]*n, 'Journal':['Nature', ' science '] + ['Other']*(n-2), 'Title':['Paper '+str(i) for i in range(n)],
+            'Citations':[n]*n})
+    return pubs_dict
+
+
+def test_features_of_the_latest_snapshot():
+    dataset = PubPy.PublicationDataset.from_pubs_dicts({'a':growing_author(2), 'b':growing_author(1, n_snapshots=2)})
+    features = PubPy.forecast_features(dataset)
+    assert features[['Author', 'Snapshot', 'Year', 'n', 'h', 'y', 'j', 'q']].to_dict('records') == [
+        {'Author':'a', 'Snapshot':'20180101', 'Year':2018, 'n':10, 'h':10, 'y':8.0, 'j':3, 'q':2},
+        {'Author':'b', 'Snapshot':'20160101', 'Year':2016, 'n':5, 'h':5, 'y':6.0, 'j':3, 'q':2}]
+
+def test_aak_forecast_hits_the_regression_at_each_horizon():
+    dataset = PubPy.PublicationDataset.from_pubs_dicts({'a':growing_author(2), 'b':growing_author(1)})
+    features = PubPy.forecast_features(dataset)
+    forecast = PubPy.aak_forecast_batch(features, years=12)
+    assert forecast.shape == (2, 13)
+    for i, row in enumerate(features.to_dict('records')):
+        x = np.array([1, np.sqrt(row['n']), row['h'], row['y'], row['j'], row['q']])
+        assert forecast[i, 0] == row['h']
+        for horizon, coefficients in PubPy.aak_coefficients.items():
+            assert forecast[i, horizon] == pytest.approx(x @ coefficients)
+        assert forecast[i, 12] == forecast[i, 10]   #Flat beyond the last horizon
+
+def test_growth_forecast_follows_the_fitted_rate():
+    forecast = PubPy.forecast_h_index(growing_author(2), method='growth', years=5)
+    assert forecast['Year'].tolist() == list(range(2018, 2024))
+    np.testing.assert_allclose(forecast['h-index'], 10 + 2*np.arange(6), rtol=1e-2)   #Leap years bend the fit slightly
+
+def test_single_snapshot_grows_at_its_m_quotient():
+    pubs_dict = {'20200101':growing_author(1)['20150101']}
+    forecast = PubPy.forecast_h_index(pubs_dict, method='growth', years=2)
+    np.testing.assert_allclose(forecast['h-index'], 4 + 4/11*np.arange(3))
+
+def test_batch_matches_single_author_forecasts():
+    pubs_dicts = {'a':growing_author(2), 'b':growing_author(1), 'c':growing_author(3, first_snapshot=2012)}
+    dataset = PubPy.PublicationDataset.from_pubs_dicts(pubs_dicts)
+    for method in ['aak', 'growth']:
+        batch = PubPy.forecast_batch(dataset, method=method, years=4)
+        for author, pubs_dict in pubs_dicts.items():
+            single = PubPy.forecast_h_index(pubs_dict, method=method, years=4)
+            own = batch[batch['Author'] == author].reset_index(drop=True)
+            pd.testing.assert_frame_equal(own[['Year', 'h-index']], single)
+
+def test_forecast_from_an_earlier_snapshot():
+    forecast = PubPy.forecast_h_index(growing_author(2), method='growth', years=1, snapshot='20160101')
+    assert forecast['Year'].tolist() == [2016, 2017]
+    assert forecast['h-index'].iloc[0] == 6
+    with pytest.raises(ValueError):
+        PubPy.forecast_h_index(growing_author(2), method='linear')
@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+
+
+def brute_force(citations, rates, target):
+    '''
+    Minimum citations to reach h = target over every choice of papers, and the first time at which the
+    h-index of citations + rates*t reaches target.
+    '''
+    if len(citations) < target:
+        needed = sum(max(0, target - c) for c in citations) + (target - len(citations))*target
+        return needed, np.inf
+    needed = min(sum(max(0, target - c) for c in chosen) for chosen in itertools.combinations(citations, target))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        candidates = np.where(citations >= target, 0.0, (target - citations)/rates)
+    for t in sorted(candidates[np.isfinite(candidates)]):
+        if PubPy.h_index_kernel(citations + rates*t + 1e-9) >= target:
+            return needed, t
+    return needed, np.inf
+
+@pytest.mark.parametrize('seed', range(6))
+def test_frontier_batch_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    snapshots = [rng.integers(0, 12, rng.integers(0, 9)).astype(float) for _ in range(4)]
+    rates = [rng.choice([0, 0.5, 1, 3], len(c)) for c in snapshots]
+    offsets = np.concatenate([[0], np.cumsum([len(c) for c in snapshots])])
+    summary, _, _ = PubPy.frontier_batch(np.concatenate(snapshots), offsets, rates=np.concatenate(rates), k_max=3)
+    for i, (citations, rate) in enumerate(zip(snapshots, rates)):
+        h = PubPy.h_index_kernel(citations)
+        assert summary['h'][i] == h
+        for k in range(3):
+            needed, years = brute_force(citations, rate, h+k+1)
+            assert summary['needed'][i, k] == needed
+            assert summary['years'][i, k] == pytest.approx(years)
+
+def test_h_index_frontier_of_one_snapshot():
+    data = pd.DataFrame({'Title':['A', 'B', 'C', 'D', 'E'], 'Year':[2010, 2015, 2018, 2019, 2020],
+                         'Citations':[20, 3, 2, 2, 0]})
+    summary_df, papers_df = PubPy.h_index_frontier(data, '20200101', k_max=2)
+    assert summary_df['Target'].tolist() == [3, 4]
+    assert summary_df['Citations needed'].tolist() == [1, 1+2+2]
+    assert summary_df['Papers'].tolist() == [1, 3]
+    #Lifetime rates: B 3/6, C 2/3 and D 2/2 a year, so D reaches 3 after a year, and B, D and C reach 4 after 2, 2 and 3
+    assert summary_df['Years'].tolist() == pytest.approx([1, 3])
+    assert summary_df['Projected date'].tolist() == [pd.Timestamp('2020-12-31'), pd.Timestamp('2022-12-31')]
+    assert papers_df['Title'].tolist() == ['B', 'C', 'D']
+    assert papers_df['Need h=4'].tolist() == [1, 2, 2]
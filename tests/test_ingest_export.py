@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+import PubPy_benchmarks
+
+
+def export_table(n_authors=5, n_papers=30, n_snapshots=3):
+    table = PubPy_benchmarks.synthetic_dataset(n_authors, n_papers, n_snapshots).table
+    return table.rename(columns={'Author':'author_id', 'Snapshot':'export_date', 'Year':'pub_year', 'Citations':'num_citations'})
+
+def new_stats():
+    return {'rows':0, 'dropped':0, 'missing_years':0, 'missing_citations':0, 'filled_years':0, 'duplicates':0}
+
+
+def test_header_aliases_ignore_case_spaces_and_hyphens():
+    columns = PubPy.export_columns(['Author ID', 'Export-Date', 'Publication Year', 'TITLE', 'Times Cited', 'other'])
+    assert columns == {'Author':'Author ID', 'Snapshot':'Export-Date', 'Year':'Publication Year', 'Title':'TITLE',
+                       'Citations':'Times Cited'}
+    assert PubPy.export_columns(['Cited by']) == {'Citations':'Cited by'}
+
+def test_times_cited_header_is_read(tmp_path):
+    file = str(tmp_path/'export.csv')
+    pd.DataFrame({'Author ID':['1', '1'], 'Title':['A', 'B'], 'Times Cited':[5, 7], 'Export Date':['2024-01-01']*2}).to_csv(file, index=False)
+    metrics_df, stats = PubPy.ingest_export(file)
+    assert metrics_df['h-index'].tolist() == [2]
+    assert stats['missing_citations'] == 0
+
+def test_missing_citations_column_raises():
+    with pytest.raises(ValueError, match='Citations'):
+        PubPy.normalize_export_chunk(pd.DataFrame({'author':['1'], 'title':['A']}), snapshot='20240101')
+
+def test_normalize_rules():
+    chunk = pd.DataFrame({
+        'author_id':['007', '007', None, '008', '008'],
+        'export_date':['2024-01-01', '20240101', '2024-01-01', '01/02/2024', 'not a date'],
+        'Year':[2001, 3001, 2001, 'unknown', 2001],
+        'Title':['  A   paper ', 'B', 'C', 'D', 'E'],
+        'Citations':[5, -3, 1, None, 2]
+    })
+    stats = new_stats()
+    data = PubPy.normalize_export_chunk(chunk, stats=stats)
+    assert data['Author'].tolist() == ['007', '007', '008']   #No author or no date: dropped
+    assert data['Snapshot'].tolist() == ['20240101', '20240101', '20240102']
+    assert data['Title'].tolist() == ['A paper', 'B', 'D']
+    assert data['Year'].isna().tolist() == [False, True, True]
+    assert data['Citations'].tolist() == [5, 0, 0]
+    assert stats['rows'] == 5 and stats['dropped'] == 2
+    assert stats['missing_years'] == 2 and stats['missing_citations'] == 1
+
+def test_dedupe_rules():
+    data = pd.DataFrame({
+        'Author':['a', 'a', 'a', 'a', 'b'],
+        'Snapshot':['20230101', '20230101', '20240101', '20240101', '20240101'],
+        'Year':[2001.0, 2001.0, np.nan, 2002.0, 2001.0],
+        'Journal':['J', 'J', 'J', 'J', 'J'],
+        'Title':['A Paper', 'a paper!', 'A paper', 'Other', 'A paper'],
+        'Citations':[3, 4, 6, 1, 9]
+    })
+    stats = new_stats()
+    result = PubPy.dedupe_export(data, stats=stats)
+    #Same author, date, normalized title and year: the most cited row is kept.
+    assert result[result['Snapshot'] == '20230101']['Citations'].tolist() == [4]
+    #The missing year is filled from the same paper at another date; other authors are not merged.
+    assert result[(result['Author'] == 'a') & (result['Title'] == 'A paper')]['Year'].tolist() == [2001.0]
+    assert len(result[result['Author'] == 'b']) == 1
+    assert stats['duplicates'] == 1 and stats['filled_years'] == 1
+
+def test_metrics_do_not_depend_on_chunks_or_buckets(tmp_path):
+    table = export_table()
+    file = str(tmp_path/'export.csv')
+    table.to_csv(file, index=False)
+    expected = PubPy.PublicationDataset(table.rename(columns={'author_id':'Author', 'export_date':'Snapshot', 'pub_year':'Year',
+                                                              'num_citations':'Citations'})).metrics_table()
+    for chunk_rows, buckets in [(10**6, 1), (37, 3)]:
+        metrics_df, stats = PubPy.ingest_export(file, chunk_rows=chunk_rows, buckets=buckets)
+        assert stats['rows'] == len(table) and stats['duplicates'] == 0
+        pd.testing.assert_frame_equal(metrics_df[['Author', 'Snapshot', 'h-index', 'g-index']],
+                                      expected[['Author', 'Snapshot', 'h-index', 'g-index']], check_dtype=False)
+
+def test_json_lines_into_snapshot_stores(tmp_path):
+    table = export_table(n_authors=2)
+    file = str(tmp_path/'export.jsonl')
+    table.to_json(file, orient='records', lines=True)
+    metrics_df, stats = PubPy.ingest_export(file, output_dir=str(tmp_path/'stores'), chunk_rows=50)
+    assert stats['snapshots_written'] == len(metrics_df) == 6
+    for author, rows in table.groupby('author_id'):
+        store = PubPy.SnapshotStore(str(tmp_path/'stores'/author))
+        assert list(store) == sorted(rows['export_date'].unique())
+        for snap, sheet in rows.groupby('export_date'):
+            assert sorted(store[snap]['Citations']) == sorted(sheet['num_citations'])
+
+    #A second run of the same export adds nothing to the stores.
+    _, stats = PubPy.ingest_export(file, output_dir=str(tmp_path/'stores'), metrics=False)
+    assert stats['snapshots_written'] == 0 and not stats['errors']
+
+def test_older_export_dates_are_skipped(tmp_path):
+    file = str(tmp_path/'export.csv')
+    rows = lambda date, citations: pd.DataFrame({'author_id':'a', 'title':['A', 'B'], 'year':[2010, 2012],
+                                                 'citations':citations, 'export_date':date})
+    output_dir = str(tmp_path/'stores')
+    rows('2024-03-01', [5, 2]).to_csv(file, index=False)
+    PubPy.ingest_export(file, output_dir=output_dir, metrics=False)
+
+    pd.concat([rows('2024-02-01', [4, 2]), rows('2024-04-01', [6, 3])]).to_csv(file, index=False)
+    _, stats = PubPy.ingest_export(file, output_dir=output_dir, metrics=False)
+    assert stats['snapshots_written'] == 1 and stats['snapshots_skipped'] == 1 and not stats['errors']
+    assert list(PubPy.SnapshotStore(os.path.join(output_dir, 'a'))) == ['20240301', '20240401']
+
+def test_authors_with_the_same_safe_name_get_their_own_store(tmp_path):
+    file = str(tmp_path/'export.csv')
+    pd.DataFrame({'author_id':['Smith J', 'Smith/J', 'Smith_J'], 'title':['A', 'B', 'C'], 'year':2010,
+                  'citations':[1, 2, 3], 'export_date':'2024-01-01'}).to_csv(file, index=False)
+    _, stats = PubPy.ingest_export(file, output_dir=str(tmp_path/'stores'), metrics=False)
+    assert stats['snapshots_written'] == 3 and not stats['errors']
+    names = {author:PubPy.author_file_name(author) for author in ['Smith J', 'Smith/J', 'Smith_J']}
+    assert len(set(names.values())) == 3 and names['Smith_J'] == 'Smith_J'
+    for author, title in [('Smith J', 'A'), ('Smith/J', 'B'), ('Smith_J', 'C')]:
+        assert PubPy.SnapshotStore(str(tmp_path/'stores'/names[author]))['20240101']['Title'].tolist() == [title]
@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+import PubPy
+
+
+def profile(name, publications):
+    return {'name':name, 'publications':[{'bib':bib, 'num_citations':citations} for bib, citations in publications]}
+
+@pytest.fixture
+def fixtures(tmp_path):
+    folder = tmp_path/'profiles'
+    folder.mkdir()
+    profiles = {
+        'abcDEF123456':profile('First Author', [({'title':'Paper A', 'pub_year':'2015', 'journal':'Nature'}, 12),
+                                                ({'title':'Paper B', 'citation':'Some Journal 4, 2018'}, 30),
+                                                ({'title':'Paper C', 'pub_year':'2019'}, None)]),
+        'xyzXYZ987654':profile('Second Author', [({'title':'Only paper', 'pub_year':'2020', 'venue':'Conf'}, '3')]),
+    }
+    for author_id, raw in profiles.items():
+        (folder/(author_id+'.json')).write_text(json.dumps(raw))
+    return str(folder)
+
+
+def test_profiles_become_snapshot_sheets(fixtures, tmp_path, capsys):
+    authors = {'first':'abcDEF123456', 'second':'xyzXYZ987654', 'missing':'nobody000000'}
+    pubs_dicts, errors = PubPy.ingest_scholar(authors, snapshot='20240101', transport=PubPy.FixtureTransport(fixtures),
+                                              rate=1000, output_dir=str(tmp_path/'workbooks'))
+    assert list(pubs_dicts) == ['first', 'second']
+    assert list(errors) == ['missing'] and errors['missing'].startswith('LookupError')
+    assert capsys.readouterr().out == ''   #Library calls report through log, not stdout
+
+    first = pubs_dicts['first']['20240101']
+    assert first.to_dict('list') == {'Year':[2018, 2015, 2019], 'Journal':['Some Journal 4, 2018', 'Nature', ''],
+                                     'Title':['Paper B', 'Paper A', 'Paper C'], 'Citations':[30, 12, 0]}
+    assert pubs_dicts['second']['20240101']['Citations'].tolist() == [3]
+
+    workbook = pd.read_excel(tmp_path/'workbooks'/'first.xlsx', sheet_name=None)
+    assert list(workbook) == ['20240101']
+    assert workbook['20240101']['Title'].tolist() == ['Paper B', 'Paper A', 'Paper C']
+
+def test_failed_requests_are_retried_and_cached(tmp_path):
+    calls = []
+    def flaky(author_id):
+        calls.append(author_id)
+        if len(calls) < 3:
+            raise ConnectionError('temporary failure')
+        return profile('Name', [({'title':'T', 'pub_year':'2001'}, 5)])
+
+    kwargs = {'snapshot':'20240101', 'transport':flaky, 'rate':1000, 'backoff':0.001, 'cache_dir':str(tmp_path/'cache')}
+    pubs_dicts, errors = PubPy.ingest_scholar(['someone'], **kwargs)
+    assert errors == {} and len(calls) == 3
+    again, _ = PubPy.ingest_scholar(['someone'], **kwargs)   #Read from the cache, no new request
+    assert len(calls) == 3
+    pd.testing.assert_frame_equal(again['someone']['20240101'], pubs_dicts['someone']['20240101'])
+
+    failing, errors = PubPy.ingest_scholar(['other'], snapshot='20240101', transport=lambda author_id: 1/0, rate=1000,
+                                           retries=1, backoff=0.001)
+    assert failing == {} and errors['other'].startswith('ZeroDivisionError')
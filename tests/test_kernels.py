@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+
+import PubPy
+
+
+def loop_metrics(citations, first_year=None, snapshot_year=None):
+    '''
+    Reference metrics from the textbook definitions, one publication at a time.
+    '''
+    ranked = sorted((0 if math.isnan(c) else c for c in citations), reverse=True)
+    h = 0
+    for rank, c in enumerate(ranked, start=1):
+        if c >= rank:
+            h = rank
+    g, total = 0, 0
+    for rank, c in enumerate(ranked, start=1):
+        total += c
+        if total >= rank**2:
+            g = rank
+    i10 = sum(1 for c in ranked if c >= 10)
+    h_core = sum(1 for c in ranked if c >= h) if h else 0
+    e = math.sqrt(sum(ranked[:h]) - h**2) if h else 0.0
+    m = h/(snapshot_year - first_year + 1) if first_year is not None else math.nan
+    return {'h-index':h, 'g-index':g, 'i10-index':i10, 'm-quotient':m, 'e-index':e, 'h-core':h_core}
+
+cases = {
+    'empty':[],
+    'all zero':[0, 0, 0, 0],
+    'single':[7],
+    'ties at h':[5, 3, 3, 3, 3, 1],
+    'all equal to n':[4, 4, 4, 4],
+    'with nan':[12, np.nan, 3, 2, np.nan],
+    'fractional':[2.5, 2.5, 1.9],
+    'large':list(np.random.default_rng(0).integers(0, 200, 300)),
+}
+
+
+@pytest.mark.parametrize('citations', cases.values(), ids=cases.keys())
+def test_h_index_kernel_matches_loop(citations):
+    shuffled = np.random.default_rng(1).permutation(np.asarray(citations, dtype=float))
+    assert PubPy.h_index_kernel(shuffled) == loop_metrics(citations)['h-index']
+
+@pytest.mark.parametrize('citations', cases.values(), ids=cases.keys())
+def test_metrics_kernel_matches_loop(citations):
+    ordered = sorted(np.nan_to_num(np.asarray(citations, dtype=float)), reverse=True)
+    result = PubPy.metrics_kernel(ordered, first_year=2000, snapshot_year=2019)
+    expected = loop_metrics(citations, first_year=2000, snapshot_year=2019)
+    assert result == pytest.approx(expected)
+
+def ragged(snapshots):
+    flat = np.concatenate([np.asarray(s, dtype=float) for s in snapshots]) if snapshots else np.zeros(0)
+    offsets = np.concatenate([[0], np.cumsum([len(s) for s in snapshots])]).astype(np.int64)
+    return flat, offsets
+
+def test_batches_match_loop_on_ragged_offsets():
+    snapshots = list(cases.values())
+    snapshots.insert(1, [])   #Empty segments between and at the ends of others
+    snapshots.append([])
+    flat, offsets = ragged(snapshots)
+    first_years = np.arange(len(snapshots)) + 1990
+    snapshot_years = np.full(len(snapshots), 2020)
+
+    h = PubPy.h_index_batch(flat, offsets)
+    metrics = PubPy.metrics_batch(flat, offsets, first_years=first_years, snapshot_years=snapshot_years)
+    for i, snapshot in enumerate(snapshots):
+        expected = loop_metrics(snapshot, first_year=first_years[i], snapshot_year=2020)
+        assert h[i] == expected['h-index']
+        assert {column:metrics[column][i] for column in PubPy.metric_columns} == pytest.approx(expected)
+
+def test_h_index_batch_padded_matches_ragged():
+    snapshots = [[3, 3, 3], [10, 9, 1, 0, 0], [], [1]]
+    width = max(len(s) for s in snapshots)
+    padded = np.full((len(snapshots), width), np.nan)
+    for i, s in enumerate(snapshots):
+        padded[i, :len(s)] = s
+    flat, offsets = ragged(snapshots)
+    expected = [loop_metrics(s)['h-index'] for s in snapshots]
+    assert PubPy.h_index_batch(padded).tolist() == expected
+    assert PubPy.h_index_batch(flat, offsets).tolist() == expected
+
+def test_batches_of_no_snapshots():
+    flat, offsets = ragged([])
+    assert PubPy.h_index_batch(flat, offsets).size == 0
+    assert all(len(values) == 0 for values in PubPy.metrics_batch(flat, offsets).values())
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+
+
+@pytest.fixture
+def pubs_dicts():
+    rng = np.random.default_rng(3)
+    pubs_dicts = {}
+    for author, n_snapshots in [('b author', 3), ('a author', 2)]:   #Not in sorted order
+        pubs_dicts[author] = {}
+        for j in range(n_snapshots):
+            n = 10 + 4*j
+            pubs_dicts[author][str(2018 + j)+'0601'] = pd.DataFrame({
+                'Year':rng.integers(2005, 2018, n), 'Journal':['J'+str(i % 4) for i in range(n)],
+                'Title':[author+' paper '+str(i) for i in range(n)], 'Citations':rng.integers(0, 40, n)})
+    return pubs_dicts
+
+
+def test_author_views_round_trip(pubs_dicts):
+    dataset = PubPy.PublicationDataset.from_pubs_dicts(pubs_dicts)
+    assert dataset.authors == ['a author', 'b author']
+    assert dataset.snapshots == ['20180601', '20190601', '20200601']
+    assert len(dataset) == 2 and 'a author' in dataset
+    for author, pubs_dict in pubs_dicts.items():
+        view = dataset.author(author)
+        assert list(view) == list(pubs_dict)
+        for snap, data in pubs_dict.items():
+            pd.testing.assert_frame_equal(view[snap], data[view[snap].columns], check_dtype=False)
+
+def test_metrics_table_matches_per_snapshot_metrics(pubs_dicts):
+    metrics_df = PubPy.PublicationDataset.from_pubs_dicts(pubs_dicts).metrics_table()
+    assert len(metrics_df) == 5
+    for record in metrics_df.to_dict('records'):
+        expected = PubPy.calculate_metrics(pubs_dicts[record['Author']][record['Snapshot']], snapshot=record['Snapshot'])
+        assert {column:record[column] for column in PubPy.metric_columns} == pytest.approx(expected)
+
+def test_snapshot_rows_of_every_author(pubs_dicts):
+    dataset = PubPy.PublicationDataset.from_pubs_dicts(pubs_dicts)
+    rows = dataset.snapshot('20190601')
+    assert sorted(rows['Author'].unique()) == ['a author', 'b author']
+    assert len(rows) == 2*14
+    assert len(dataset.snapshot('20200601')) == 18
+    assert len(dataset.snapshot('19990101')) == 0
+
+def test_empty_dataset():
+    dataset = PubPy.PublicationDataset.from_pubs_dicts({})
+    assert dataset.authors == [] and dataset.snapshots == []
+    assert len(dataset.metrics_table()) == 0
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import PubPy
+
+
+def sheet(rows):
+    return pd.DataFrame(rows, columns=['Title', 'Year', 'Citations'])
+
+def pubs_dict():
+    return {
+        '20200101':sheet([('Deep sea sediment records: a review', 2015, 10),
+                          ('Carbon isotopes of marine carbonate', 2018, 4)]),
+        '20210101':sheet([('Carbon isotopes of marine carbonate', 2018, 9),
+                          ('Deep-sea sediment records - a review', 2015, 14),   #Punctuation changed
+                          ('Radiocarbon dating of estuarine shells', 2020, 1)]),
+        '20220101':sheet([('Radiocarbon dating of estuarine shell', 2020, 6),   #Fuzzy match
+                          ('A review: deep sea sediment records', 2015, 20)]),  #Word order changed
+    }
+
+
+def test_papers_are_tracked_across_snapshots():
+    index = PubPy.PublicationIndex(pubs_dict())
+    assert index.snapshots == ['20200101', '20210101', '20220101']
+    assert len(index.papers) == 3
+    review, isotopes = index.row_ids['20200101']
+    radiocarbon = index.row_ids['20210101'][2]
+    assert index.row_ids['20210101'].tolist() == [isotopes, review, radiocarbon]
+    assert index.row_ids['20220101'].tolist() == [radiocarbon, review]
+    np.testing.assert_array_equal(index.trajectories.loc[review], [10, 14, 20])
+    np.testing.assert_array_equal(index.trajectories.loc[isotopes], [4, 9, np.nan])
+    assert index.lookup(['Carbon isotopes of marine carbonate', 'Unknown paper']).tolist() == [isotopes, -1]
+
+def test_velocity_from_consecutive_snapshots():
+    index = PubPy.PublicationIndex(pubs_dict())
+    review = index.row_ids['20200101'][0]
+    velocity = index.velocity()
+    days = [366, 365]   #2020 is a leap year
+    np.testing.assert_allclose(velocity.loc[review], [10/6, 4/(days[0]/365.25), 6/(days[1]/365.25)])
+    data = pubs_dict()['20220101']
+    np.testing.assert_allclose(index.velocity_for(data, '20220101'), velocity['20220101'].to_numpy()[index.row_ids['20220101']])
+
+def test_numbered_parts_and_untitled_rows_stay_apart():
+    assert PubPy.title_keys('Sediment cores, Part 1')[1] != PubPy.title_keys('Sediment cores, Part 2')[1]
+    assert PubPy.title_keys('The sediment cores of a fjord')[1] == PubPy.title_keys('Sediment cores: fjord')[1]
+    assert PubPy.title_keys(np.nan) == PubPy.title_keys('') == (None, None)
+
+    index = PubPy.PublicationIndex({
+        '20200101':sheet([('Sediment cores, Part 1', 2019, 5), ('Sediment cores, Part 2', 2019, 3), (np.nan, 2019, 1)]),
+        '20210101':sheet([('Sediment cores, Part 2', 2019, 6), ('Sediment cores, Part 1', 2019, 8), ('', 2019, 2),
+                          (np.nan, 2019, 0)]),
+    })
+    part_1, part_2, untitled = index.row_ids['20200101']
+    assert index.row_ids['20210101'][:2].tolist() == [part_2, part_1]
+    assert len(set(index.row_ids['20210101'][2:]) | {untitled}) == 3   #Every untitled row is a paper of its own
+    assert index.lookup([np.nan, '']).tolist() == [-1, -1]
+
+def test_velocity_is_computed_once(monkeypatch):
+    index = PubPy.PublicationIndex(pubs_dict())
+    calls = []
+    velocity_matrix = index.velocity_matrix
+    monkeypatch.setattr(index, 'velocity_matrix', lambda: calls.append(1) or velocity_matrix())
+    data = pubs_dict()['20220101']
+    first = index.velocity_for(data, '20220101')
+    np.testing.assert_array_equal(index.velocity_for(data, '20220101'), first)
+    velocity = index.velocity()
+    velocity.loc[:, :] = 0   #Changing the returned copy does not change the index
+    np.testing.assert_array_equal(index.velocity_for(data, '20220101'), first)
+    assert len(calls) == 1
@@ -0,0 +1,22 @@
+import os
+
+import PubPy
+import PubPy_benchmarks
+
+
+def test_spilled_entries_keep_their_own_format(tmp_path):
+    dataset = PubPy_benchmarks.synthetic_dataset(1, 30, 2)
+    pubs_dict = dataset.author(dataset.authors[0])
+    disk_dir = str(tmp_path/'disk')
+    cache = PubPy.RenderCache(max_bytes=1, disk_dir=disk_dir)   #Every put evicts the previous entry
+    png = cache.render(pubs_dict, kind='time_series', format='png', width=3, height=3)
+    svg = cache.render(pubs_dict, kind='time_series', format='svg', width=3, height=3)
+    pdf = cache.render(pubs_dict, kind='time_series', format='pdf', width=3, height=3)
+    files = sorted(os.listdir(disk_dir))
+    assert sorted(os.path.splitext(file)[1] for file in files) == ['.png', '.svg']
+
+    cache.clear()
+    assert cache.render(pubs_dict, kind='time_series', format='png', width=3, height=3) == png
+    assert cache.render(pubs_dict, kind='time_series', format='svg', width=3, height=3) == svg
+    assert png.startswith(b'\x89PNG') and b'<svg' in svg and pdf.startswith(b'%PDF')
+    assert cache.stats()['disk_hits'] == 2
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+
+
+def write_workbook(file, pubs_dict):
+    with pd.ExcelWriter(file, engine='openpyxl') as writer:
+        for name, data in pubs_dict.items():
+            data.to_excel(writer, sheet_name=name, index=False)
+
+@pytest.fixture
+def pubs_dict():
+    rng = np.random.default_rng(0)
+    sheets = {}
+    for j, snap in enumerate(['20190101', '20200101', '20210101']):
+        n = 20 + 5*j
+        sheets[snap] = pd.DataFrame({'Year':rng.integers(2000, 2019, n), 'Journal':['J'+str(i % 3) for i in range(n)],
+                                     'Title':['Paper '+str(i) for i in range(n)],
+                                     'Citations':np.sort(rng.integers(0, 60, n))[::-1]})
+    return sheets
+
+
+def test_editing_one_tab_reparses_only_that_tab(pubs_dict, tmp_path, monkeypatch):
+    file, cache_dir = str(tmp_path/'pubs.xlsx'), str(tmp_path/'cache')
+    write_workbook(file, pubs_dict)
+    first = PubPy.load_sheets_with_cache(file, cache_dir)
+    assert list(first) == list(pubs_dict)
+
+    pubs_dict['20200101'].loc[0, 'Citations'] += 100
+    write_workbook(file, pubs_dict)
+    stat = os.stat(file)
+    os.utime(file, (stat.st_atime, stat.st_mtime + 10))   #A new mtime even on coarse file system clocks
+
+    parsed = []
+    read_excel = pd.read_excel
+    def recording_read_excel(io, sheet_name=0, **kwargs):
+        parsed.extend(sheet_name)
+        return read_excel(io, sheet_name=sheet_name, **kwargs)
+    monkeypatch.setattr(PubPy.pd, 'read_excel', recording_read_excel)
+    sink = PubPy.MemorySink()
+    with PubPy.instrument(sink):
+        second = PubPy.load_sheets_with_cache(file, cache_dir)
+    assert parsed == ['20200101']
+    assert sink.counters['sheets_parsed'] == 1
+    for snap in pubs_dict:
+        pd.testing.assert_frame_equal(second[snap], pubs_dict[snap], check_dtype=False)
+
+    parsed.clear()
+    third = PubPy.load_sheets_with_cache(file, cache_dir)   #Untouched since: nothing is parsed
+    assert parsed == []
+    pd.testing.assert_frame_equal(third['20200101'], second['20200101'])
+
+def test_incremental_time_series_is_identical(pubs_dict, monkeypatch):
+    previous = PubPy.snapshot_time_series(pubs_dict, metrics=True)
+    pubs_dict['20210101'] = pubs_dict['20210101'].assign(Citations=pubs_dict['20210101']['Citations'] + 7)
+    pubs_dict['20220101'] = pubs_dict['20190101'].copy()
+
+    computed = []
+    calculate_metrics = PubPy.calculate_metrics
+    def recording_calculate_metrics(data, snapshot=None):
+        computed.append(snapshot)
+        return calculate_metrics(data, snapshot=snapshot)
+    monkeypatch.setattr(PubPy, 'calculate_metrics', recording_calculate_metrics)
+    incremental = PubPy.snapshot_time_series(pubs_dict, previous=previous, metrics=True)
+    assert computed == ['20210101', '20220101']
+
+    monkeypatch.setattr(PubPy, 'calculate_metrics', calculate_metrics)
+    full = PubPy.snapshot_time_series(pubs_dict, metrics=True)
+    pd.testing.assert_frame_equal(incremental, full)
+
+def test_time_series_read_back_from_csv(pubs_dict, tmp_path):
+    full = PubPy.snapshot_time_series(pubs_dict)
+    full.to_csv(tmp_path/'ts.csv', index=False)
+    previous = pd.read_csv(tmp_path/'ts.csv', dtype={'Snapshot':str})
+    pd.testing.assert_frame_equal(PubPy.snapshot_time_series(pubs_dict, previous=previous), full, check_dtype=False)
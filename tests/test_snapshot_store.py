@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import PubPy
+import PubPy_benchmarks
+
+
+def same_rows(a, b):
+    columns = ['Citations', 'Year', 'Title']
+    a = a.sort_values(columns, ignore_index=True)
+    b = b.sort_values(columns, ignore_index=True)[a.columns]
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
+
+def sheet(rows):
+    return pd.DataFrame(rows, columns=['Year', 'Journal', 'Title', 'Citations'])
+
+
+def test_round_trip_through_checkpoints_and_deltas(tmp_path):
+    pubs_dict = PubPy_benchmarks.synthetic_pubs_dict(80, 15)
+    store = PubPy.SnapshotStore(str(tmp_path/'store'), checkpoint_every=4)
+    for snap, data in pubs_dict.items():
+        store.append(snap, data)
+
+    reopened = PubPy.SnapshotStore(str(tmp_path/'store'), max_sheets=2)
+    assert list(reopened) == list(pubs_dict)
+    for snap, data in pubs_dict.items():
+        rebuilt = reopened[snap]
+        assert list(rebuilt.columns) == list(data.columns)
+        assert rebuilt['Citations'].is_monotonic_decreasing
+        same_rows(rebuilt, data)
+
+def test_small_changes_are_stored_as_deltas(tmp_path):
+    unchanged = [[1990 + j, 'J0', 'Unchanged paper '+str(j), 0] for j in range(10)]
+    first = sheet([[2001, 'J1', 'Paper A', 10], [2002, 'J2', 'Paper B', 5], [2003, 'J3', 'Paper C', 1]] + unchanged)
+    #More citations for A, B removed, C's journal edited, D added.
+    second = sheet([[2001, 'J1', 'Paper A', 12], [2003, 'J3 edited', 'Paper C', 1], [2010, 'J9', 'Paper D', 2]] + unchanged)
+    store = PubPy.SnapshotStore(str(tmp_path/'store'))
+    store.append('20200101', first)
+    store.append('20210101', second)
+
+    assert [entry['kind'] for entry in store.manifest['snapshots']] == ['checkpoint', 'delta']
+    assert store.manifest['snapshots'][1]['stored_rows'] < len(second)
+    reopened = PubPy.SnapshotStore(str(tmp_path/'store'))
+    same_rows(reopened['20200101'], first)
+    same_rows(reopened['20210101'], second)
+
+def test_duplicate_titles_stay_apart(tmp_path):
+    first = sheet([[2001, 'J1', 'Introduction', 3], [2001, 'J2', 'Introduction', 1], [2002, 'J1', 'Other', 4]])
+    second = sheet([[2001, 'J1', 'Introduction', 5], [2001, 'J2', 'Introduction', 1], [2002, 'J1', 'Other', 4]])
+    store = PubPy.SnapshotStore(str(tmp_path/'store'))
+    store.append('20200101', first)
+    store.append('20210101', second)
+    same_rows(PubPy.SnapshotStore(str(tmp_path/'store'))['20210101'], second)
+
+def test_snapshots_are_append_only(tmp_path):
+    store = PubPy.SnapshotStore(str(tmp_path/'store'))
+    store.append('20210101', sheet([[2001, 'J1', 'Paper A', 1]]))
+    with pytest.raises(ValueError):
+        store.append('20200101', sheet([[2001, 'J1', 'Paper A', 1]]))
+
+def test_missing_years_round_trip(tmp_path):
+    data = sheet([[2001, 'J1', 'Paper A', 3], [np.nan, 'J2', 'Paper B', 2]])
+    store = PubPy.SnapshotStore(str(tmp_path/'store'))
+    store.append('20200101', data)
+    rebuilt = PubPy.SnapshotStore(str(tmp_path/'store'))['20200101']
+    assert rebuilt['Year'].isna().sum() == 1
+    same_rows(rebuilt, data)
+
+def test_from_workbook_and_get_publication_data(tmp_path):
+    pubs_dict = PubPy_benchmarks.synthetic_pubs_dict(30, 4)
+    workbook = str(tmp_path/'author.xlsx')
+    PubPy_benchmarks.write_workbook(pubs_dict, workbook)
+    PubPy.SnapshotStore.from_workbook(workbook, str(tmp_path/'store'))
+
+    loaded, snapshots = PubPy.get_publication_data(str(tmp_path/'store'))
+    assert isinstance(loaded, PubPy.SnapshotStore)
+    assert snapshots == sorted(pubs_dict)
+    for snap, data in pubs_dict.items():
+        same_rows(loaded[snap], data)
+        assert PubPy.calculate_H_index(loaded[snap])[0] == PubPy.calculate_H_index(data)[0]